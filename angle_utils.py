@@ -1,26 +1,63 @@
-import math
-
-def calculate_angle(a, b, c):
-    
-    a = (a.x, a.y)
-    b = (b.x, b.y)
-    c = (c.x, c.y)
-
-
-    ab = (a[0] - b[0], a[1] - b[1])
-    cb = (c[0] - b[0], c[1] - b[1])
-
-
-    dot_product = ab[0] * cb[0] + ab[1] * cb[1]
-    mag_ab = math.sqrt(ab[0]**2 + ab[1]**2)
-    mag_cb = math.sqrt(cb[0]**2 + cb[1]**2)
-
-    if mag_ab == 0 or mag_cb == 0:
-        return 0
-
-   
-    cos_angle = max(min(dot_product / (mag_ab * mag_cb), 1.0), -1.0)
-
-    angle = math.degrees(math.acos(cos_angle))
-    return angle
-
+import math
+from itertools import chain
+import numpy as np
+
+def calculate_angle(a, b, c):
+    
+    a = (a.x, a.y)
+    b = (b.x, b.y)
+    c = (c.x, c.y)
+
+
+    ab = (a[0] - b[0], a[1] - b[1])
+    cb = (c[0] - b[0], c[1] - b[1])
+
+
+    dot_product = ab[0] * cb[0] + ab[1] * cb[1]
+    mag_ab = math.sqrt(ab[0]**2 + ab[1]**2)
+    mag_cb = math.sqrt(cb[0]**2 + cb[1]**2)
+
+    if mag_ab == 0 or mag_cb == 0:
+        return 0
+
+   
+    cos_angle = max(min(dot_product / (mag_ab * mag_cb), 1.0), -1.0)
+
+    angle = math.degrees(math.acos(cos_angle))
+    return angle
+
+
+# ===== BATCHED ANGLES =====
+# Pack the landmark list once per frame and compute every joint angle in one pass.
+
+def landmarks_to_array(landmarks, with_visibility=False):
+    """Pack a MediaPipe landmark list into a (33, 3) float32 array of x, y, z
+
+    With with_visibility the array is (33, 4) with each landmark's visibility last.
+    """
+    if with_visibility:
+        coords = chain.from_iterable((lm.x, lm.y, lm.z, lm.visibility) for lm in landmarks)
+        return np.fromiter(coords, dtype=np.float32, count=4 * len(landmarks)).reshape(-1, 4)
+    coords = chain.from_iterable((lm.x, lm.y, lm.z) for lm in landmarks)
+    return np.fromiter(coords, dtype=np.float32, count=3 * len(landmarks)).reshape(-1, 3)
+
+
+def calculate_angles(points, triplets):
+    """Vectorized calculate_angle.
+
+    points is a (33, C) array or an (N, 33, C) stack of landmarks (only x and y
+    are used), triplets is a (K, 3) array of (a, b, c) landmark indices with the
+    angle measured at b. Returns a (K,) or (N, K) float64 array in degrees.
+    """
+    # (..., K, 3, 2) -> ab and cb vectors as (..., K, 2, 2); landmarks are float32,
+    # do the math in float64 like calculate_angle
+    p = np.asarray(points)[..., triplets, :2].astype(np.float64)
+    v = p[..., ::2, :] - p[..., 1:2, :]
+
+    # atan2(|ab x cb|, ab . cb) is the same angle as acos of the normalized dot
+    # product in fewer array operations, and atan2(0, 0) = 0 covers a zero-length
+    # vector without a separate mask (+ 0.0 turns a -0.0 dot product, which
+    # atan2 would read as 180 degrees, into 0.0)
+    dot_product = v[..., 0, 0] * v[..., 1, 0] + v[..., 0, 1] * v[..., 1, 1] + 0.0
+    cross_product = v[..., 0, 0] * v[..., 1, 1] - v[..., 0, 1] * v[..., 1, 0]
+    return np.degrees(np.abs(np.arctan2(cross_product, dot_product)))
@@ -1,290 +1,612 @@
-from flask import Flask, render_template, request, url_for, redirect, flash, session
-import sqlite3
-import mediapipe as mp
-import numpy as np
-import time
-import threading
-from werkzeug.security import generate_password_hash
-
-from datetime import datetime
-from utils.exercise_logic import get_exercise_function, ExerciseState
-import secrets
-from flask import jsonify  
-import cv2
-from flask import Response
-
-mp_pose=mp.solutions.pose
-mp_draw=mp.solutions.drawing_utils
-
-count=0
-direction=None
-feedback="start position"
-
-app = Flask(__name__)
-app.secret_key = secrets.token_hex(32)
-
-
-exercise_states = {}
-exercise_states_lock = threading.Lock()
-
-def get_db_connection():
-    conn = sqlite3.connect('database.db')
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
-@app.route("/")
-def home():
-    return render_template('home.html')
-
-
-@app.route('/register', methods=['GET', 'POST'])
-def register():
-    if request.method == 'POST':
-        username = request.form['username'].strip()
-        number = request.form['number'].strip()
-        password = request.form['password']
-        weight = request.form.get('weight')
-
-        if not username or not number or not password:
-            flash('All fields except weight are required.', 'error')
-            return redirect(url_for('register'))
-
-        weight = float(weight) if weight else None
-        hashed_password = generate_password_hash(password)
-
-        con = get_db_connection()
-        cursor = con.cursor()
-        try:
-            cursor.execute('INSERT INTO users (username, number, password, weight) VALUES (?, ?, ?, ?)',
-                           (username, number, hashed_password, weight))
-            con.commit()
-            flash('Registered successfully! Please login.', 'success')
-            return redirect(url_for('login'))
-        except sqlite3.IntegrityError:
-            flash('Username already exists.', 'error')
-        finally:
-            con.close()
-    return render_template('register.html')
-
-
-from werkzeug.security import check_password_hash
-
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    if request.method == 'POST':
-        username = request.form['username'].strip()
-        password = request.form['password']
-
-        con = get_db_connection()
-        user = con.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
-        con.close()
-
-        if user and check_password_hash(user['password'], password):
-            session['user'] = user['username']
-            session['user_id'] = user['id']  
-            session['session_id'] = secrets.token_hex(16) 
-            flash('Login successful!', 'success')
-            return redirect(url_for('dashboard'))
-        else:
-            flash('Invalid username or password.', 'error')
-
-    return render_template('login.html')
-
-@app.route('/dashboard')
-def dashboard():
-    if 'user' not in session:
-        flash('Please login first.', 'error')
-        return redirect(url_for('login'))
-    return render_template('dashboard.html', user=session['user'])
-
-@app.route('/exercise/<exercise>')
-def exercise(exercise):
-    
-    session_id = session.get('session_id')
-    if session_id:
-        with exercise_states_lock:
-            exercise_states[session_id] = ExerciseState()
-            exercise_states[session_id].start_time = time.time()
-    
-    return render_template('exercise.html', exercise=exercise, session_id=session.get('session_id'))
-
-@app.route('/video_feed/<exercise>/<session_id>')
-def video_feed(exercise, session_id):
-    logic_function = get_exercise_function(exercise)
-    if not logic_function:
-        return "Exercise not found", 404
-    
-    def generate():
-        if not session_id or session_id not in exercise_states:
-          
-            error_frame = np.zeros((480, 640, 3), dtype=np.uint8)
-            cv2.putText(error_frame, "Session Error", (150, 240), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-            ret, buffer = cv2.imencode('.jpg', error_frame)
-            if ret:
-                frame_bytes = buffer.tobytes()
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            return
-        
-       
-        with exercise_states_lock:
-            if session_id not in exercise_states:
-                exercise_states[session_id] = ExerciseState()
-                exercise_states[session_id].start_time = time.time()
-            
-            state = exercise_states[session_id]
-
-        cap = None
-        for camera_index in [0, 1, 2]:
-            cap = cv2.VideoCapture(camera_index)
-            if cap.isOpened():
-                
-                break
-            if cap:
-                cap.release()
-        
-        if not cap or not cap.isOpened():
-            
-            error_frame = np.zeros((480, 640, 3), dtype=np.uint8)
-            cv2.putText(error_frame, "Camera Not Available", (150, 240), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-            cv2.putText(error_frame, "Please check camera connection", (100, 280), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-            ret, buffer = cv2.imencode('.jpg', error_frame)
-            if ret:
-                frame_bytes = buffer.tobytes()
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            return
-
-        pose = mp_pose.Pose()
-        
-        try:
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    
-                    break
-
-                
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                results = pose.process(frame_rgb)
-
-                if results.pose_landmarks:
-                    try:
-                        
-                        with exercise_states_lock:
-                            state = logic_function(results.pose_landmarks.landmark, state)
-                            exercise_states[session_id] = state
-                            
-                        mp_draw.draw_landmarks(
-                            frame,
-                            results.pose_landmarks,
-                            mp_pose.POSE_CONNECTIONS,
-                            mp_draw.DrawingSpec(color=(245,117,66), thickness=2, circle_radius=2),
-                            mp_draw.DrawingSpec(color=(245,66,230), thickness=2, circle_radius=2)
-                        )
-                    except Exception as e:
-                        print(f"Error in exercise logic: {e}")
-                        state.feedback = f"Error: {str(e)}"
-                        state.feedback_class = "error"
-
-                cv2.putText(frame, f"Reps: {state.reps}", (10, 30),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-                cv2.putText(frame, f"Time: {int(state.current_time)}s", (10, 70),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-                
-   
-                if state.feedback_class == "correct":
-                    color = (0, 255, 0)
-                elif state.feedback_class == "warning":
-                    color = (0, 165, 255)
-                elif state.feedback_class == "error":
-                    color = (0, 0, 255)
-                else:
-                    color = (255, 255, 255)
-                
-                cv2.putText(frame, state.feedback, (10, 110),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-
-               
-                ret, buffer = cv2.imencode('.jpg', frame)
-                if ret:
-                    frame_bytes = buffer.tobytes()
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-                else:
-                    print("❌ Failed to encode frame")
-
-        except Exception as e:
-            print(f"❌ Error in video generation: {e}")
-            
-        finally:
-            if cap:
-                cap.release()
-            pose.close()
-
-    return Response(generate(),
-                    mimetype='multipart/x-mixed-replace; boundary=frame')
-
-@app.route('/get_stats')
-def get_stats():
-    session_id = session.get('session_id')
-    if not session_id or session_id not in exercise_states:
-        return jsonify({
-            "reps": 0,
-            "time": 0,
-            "feedback": "Start position",
-            "feedback_class": "neutral"
-        })
-    
-    with exercise_states_lock:
-        state = exercise_states[session_id]
-    
-    return jsonify({
-        "reps": state.reps,
-        "time": state.current_time,
-        "feedback": state.feedback,
-        "feedback_class": state.feedback_class
-    })
-
-@app.route('/complete_workout/<exercise>')
-def complete_workout(exercise):
-    if 'user' not in session:
-        return redirect(url_for('login'))
-
-    session_id = session.get('session_id')
-    state = ExerciseState()
-    
-    if session_id and session_id in exercise_states:
-        with exercise_states_lock:
-            state = exercise_states[session_id]
-           
-            del exercise_states[session_id]
-
-    stats = {
-        "reps": state.reps,
-        "time_minutes": int(state.current_time) // 60,
-        "time_seconds": int(state.current_time) % 60,
-        "feedback": state.feedback
-    }
-    
-    return render_template("complete_workout.html", exercise=exercise, stats=stats)
-
-@app.route('/logout')
-def logout():
-    session_id = session.get('session_id')
-    if session_id and session_id in exercise_states:
-        with exercise_states_lock:
-            del exercise_states[session_id]
-    
-    session.pop('user', None)
-    session.pop('session_id', None)
-    flash('Logged out successfully.', 'info')
-    return redirect(url_for('login'))
-
-if __name__ == "__main__":
-
-    app.run(debug=True)
+from flask import Flask, render_template, request, url_for, redirect, flash, session
+import sqlite3
+import json
+import os
+import time
+import atexit
+import threading
+
+from datetime import datetime
+from utils.exercise_logic import get_exercise_function, ExerciseState
+from utils.landmark_trace import TraceWriter, decode_records
+from utils.capture import StageTimer
+from utils.metrics import REGISTRY, CONTENT_TYPE, Counter, Gauge, Histogram
+from utils.session_store import AFFINITY_COOKIE, SessionStore, make_backend, snapshot_delta
+from utils.workout_writer import WorkoutWriter
+from utils.workout_history import history_page, trends
+from utils.db import Database
+from utils.password_hasher import PasswordHasher, HasherBusy
+import secrets
+from flask import jsonify  
+from flask import Response
+
+try:
+    from flask_sock import Sock  # Optional: WebSocket landmark uploads
+except ImportError:
+    Sock = None
+
+count=0
+direction=None
+feedback="start position"
+
+app = Flask(__name__)
+# Every worker process must sign sessions with the same key (serve.py passes one in)
+app.secret_key = os.environ.get('SECRET_KEY') or secrets.token_hex(32)
+
+
+# Per-session exercise state; abandoned sessions expire after EXERCISE_STATE_TTL seconds.
+# SESSION_STORE=sqlite:<path> shares it between worker processes (see serve.py)
+exercise_states = SessionStore(ExerciseState, ttl=float(os.environ.get('EXERCISE_STATE_TTL', 1800)),
+                               backend=make_backend(os.environ.get('SESSION_STORE', 'memory')))
+
+# The video path (cv2, mediapipe, cameras, pose models) is built on first use;
+# see video_stack(). POSE_WARMUP=1 builds it and loads the models at boot.
+_video_stack = None
+_video_stack_lock = threading.Lock()
+
+DATABASE_PATH = os.environ.get('DATABASE_PATH', 'database.db')
+
+# Pooled connections for request handlers
+db = Database(DATABASE_PATH, max_idle=int(os.environ.get('DB_POOL_SIZE', 8)))
+
+# Password hashing runs on a small pool so login bursts can't take every core
+password_hasher = PasswordHasher(
+    max_workers=int(os.environ.get('PASSWORD_HASH_WORKERS', 1)),
+    max_pending=int(os.environ.get('PASSWORD_HASH_PENDING', 32)),
+)
+
+# Completed workouts are saved by a background thread in batches
+workout_writer = WorkoutWriter(DATABASE_PATH, max_queue=int(os.environ.get('WORKOUT_QUEUE_SIZE', 1000)))
+atexit.register(workout_writer.close)
+atexit.register(exercise_states.backend.close)  # Sessions still queued for the shared store
+
+# TRACE_DIR=<dir> records every stream's landmarks for offline replay
+trace_dir = os.environ.get('TRACE_DIR')
+
+# Per-stage timings of every live stream, keyed by stream id
+pipeline_timers = {}
+
+def video_stack():
+    """The shared VideoStack, importing cv2 / mediapipe the first time it is needed"""
+    global _video_stack
+    if _video_stack is None:
+        with _video_stack_lock:
+            if _video_stack is None:
+                from utils.video_stack import VideoStack
+                _video_stack = VideoStack()
+    return _video_stack
+
+def _pose_pool_stat(name):
+    # Pool gauges read 0 until the video path has been loaded
+    return _video_stack.pose_pool.stats()[name] if _video_stack else 0
+
+if os.environ.get('POSE_WARMUP', '0') == '1':
+    threading.Thread(target=lambda: video_stack().warm_up(), name="pose-warmup", daemon=True).start()
+
+# Most people one multi-person stream follows (?people=auto or ?people=N)
+MAX_TRACKS = int(os.environ.get('MAX_TRACKS', 6))
+
+# Live multi-person stages, keyed by session id (for /get_track_stats)
+group_streams = {}
+
+# Most landmark records accepted in one upload (about 4s of frames at 30 fps)
+MAX_UPLOAD_RECORDS = int(os.environ.get('MAX_UPLOAD_RECORDS', 120))
+
+# Metrics scraped from /metrics
+ACTIVE_STREAMS = Gauge('pose_active_streams', 'Live video_feed streams', ['exercise'])
+FRAMES_STREAMED = Counter('pose_frames_streamed_total', 'MJPEG frames sent to clients', ['exercise'])
+BYTES_STREAMED = Counter('pose_stream_bytes_total', 'MJPEG bytes sent to clients', ['exercise'])
+FRAMES_SKIPPED = Counter('pose_frames_skipped_total', 'Frames not sent because the client was slow', ['exercise'])
+LOGIC_FRAMES = Counter('pose_logic_frames_total', 'Frames with landmarks run through the exercise logic', ['exercise'])
+STAGE_SECONDS = Histogram('pose_stage_seconds', 'Per-frame time spent in each pipeline stage', ['stage', 'exercise'])
+LOCK_WAIT_SECONDS = Histogram('pose_state_lock_wait_seconds', "Time waiting for the session's state lock in the logic stage",
+                              ['exercise'], buckets=(0.00001, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1))
+UPLOADED_FRAMES = Counter('pose_uploaded_frames_total', 'Client-side landmark frames received', ['exercise'])
+ENCODER_FAILURES = Counter('pose_encoder_failures_total', 'Frames that failed JPEG encoding', ['exercise'])
+LOGIC_ERRORS = Counter('pose_logic_errors_total', 'Exceptions raised by exercise logic functions', ['exercise'])
+STREAM_ERRORS = Counter('pose_stream_errors_total', 'Streams ended by an unexpected error', ['exercise'])
+Gauge('pose_pool_backlog', 'Streams waiting for a pose worker').set_function(lambda: _pose_pool_stat('backlog'))
+Gauge('pose_pool_streams', 'Streams registered with the pose pool').set_function(lambda: _pose_pool_stat('streams'))
+Gauge('pose_pool_workers', 'Pose worker threads').set_function(lambda: _pose_pool_stat('workers'))
+Gauge('pose_tracked_people', 'People followed by multi-person streams').set_function(
+    lambda: sum(len(stage.published) for stage in list(group_streams.values())))
+Gauge('pose_workouts_queued', 'Completed workouts waiting to be written').set_function(workout_writer.backlog)
+Gauge('pose_workouts_written', 'Workouts saved since startup').set_function(lambda: workout_writer.written)
+Gauge('pose_workouts_dropped', 'Workouts dropped because the write queue was full').set_function(lambda: workout_writer.dropped)
+Gauge('pose_workouts_failed', 'Workouts that failed to save').set_function(lambda: workout_writer.failed)
+Gauge('pose_db_connections_idle', 'Pooled database connections not in use').set_function(lambda: db.stats()['idle'])
+Gauge('pose_password_hashes_refused', 'Logins / registrations turned away while hashing was saturated').set_function(
+    lambda: password_hasher.refused)
+
+
+@app.route("/")
+def home():
+    return render_template('home.html')
+
+
+@app.route('/register', methods=['GET', 'POST'])
+def register():
+    if request.method == 'POST':
+        username = request.form['username'].strip()
+        number = request.form['number'].strip()
+        password = request.form['password']
+        weight = request.form.get('weight')
+
+        if not username or not number or not password:
+            flash('All fields except weight are required.', 'error')
+            return redirect(url_for('register'))
+
+        weight = float(weight) if weight else None
+
+        with db.connection() as con:
+            taken = con.execute('SELECT 1 FROM users WHERE username = ?', (username,)).fetchone()
+        if taken:  # Checked first so a taken name costs no hashing
+            flash('Username already exists.', 'error')
+            return render_template('register.html')
+
+        try:
+            hashed_password = password_hasher.hash(password)
+            with db.connection() as con:
+                con.execute('INSERT INTO users (username, number, password, weight) VALUES (?, ?, ?, ?)',
+                            (username, number, hashed_password, weight))
+            flash('Registered successfully! Please login.', 'success')
+            return redirect(url_for('login'))
+        except sqlite3.IntegrityError:
+            flash('Username already exists.', 'error')
+        except (HasherBusy, TimeoutError):
+            flash('Server busy, please try again in a moment.', 'error')
+            return render_template('register.html'), 503
+    return render_template('register.html')
+
+
+@app.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        username = request.form['username'].strip()
+        password = request.form['password']
+
+        with db.connection() as con:
+            user = con.execute("SELECT id, username, password FROM users WHERE username = ?",
+                               (username,)).fetchone()
+
+        try:
+            valid = user is not None and password_hasher.verify(user['password'], password)
+        except (HasherBusy, TimeoutError):
+            flash('Server busy, please try again in a moment.', 'error')
+            return render_template('login.html'), 503
+
+        if valid:
+            session['user'] = user['username']
+            session['user_id'] = user['id']  
+            session['session_id'] = secrets.token_hex(16) 
+            flash('Login successful!', 'success')
+            response = redirect(url_for('dashboard'))
+            # Lets serve.py send this session's requests to the same worker process
+            response.set_cookie(AFFINITY_COOKIE, session['session_id'], httponly=True, samesite='Lax')
+            return response
+        else:
+            flash('Invalid username or password.', 'error')
+
+    return render_template('login.html')
+
+@app.route('/dashboard')
+def dashboard():
+    if 'user' not in session:
+        flash('Please login first.', 'error')
+        return redirect(url_for('login'))
+    return render_template('dashboard.html', user=session['user'])
+
+@app.route('/exercise/<exercise>')
+def exercise(exercise):
+    
+    session_id = session.get('session_id')
+    if session_id:
+        exercise_states.create(session_id)
+    
+    return render_template('exercise.html', exercise=exercise, session_id=session.get('session_id'))
+
+def parse_people(value):
+    """The ?people= of a video_feed request: None, 'auto' or a count as a string"""
+    if value is not None and value != 'auto' and not (value.isdigit() and 1 <= int(value) <= MAX_TRACKS):
+        raise ValueError(f"people must be 'auto' or 1-{MAX_TRACKS}")
+    return value
+
+
+class VideoStream:
+    """The pipeline behind one video_feed stream: camera, inference, overlay, encoder, metrics.
+
+    Whoever serves the stream reads frames from `ring` and sends what render()
+    returns; the WSGI generator below does it on its request thread, asgi.py
+    from the event loop. When the session or the camera is missing, `error`
+    holds a frame to send instead.
+    """
+
+    def __init__(self, exercise, session_id, logic_function, draw_overlay=True, people=None):
+        self.video = video_stack()
+        self.encoder = self.video.make_encoder()
+        self.session_id = session_id
+        self.draw_overlay = draw_overlay
+        self.people = people
+        self.camera = None
+        self.error = None
+        self.entry = exercise_states.get(session_id)
+        if self.entry is None:
+            self.error = self.video.error_frame("Session Error")
+            return
+
+        self.camera = self.video.camera_registry.acquire()
+        if self.camera is None:
+            self.error = self.video.error_frame("Camera Not Available", "Please check camera connection")
+            return
+
+        capture = self.camera.capture
+        self.ring = capture.ring
+        self.exercise_label = exercise_label = exercise.lower()
+        self.frames_streamed = FRAMES_STREAMED.labels(exercise=exercise_label)
+        self.bytes_streamed = BYTES_STREAMED.labels(exercise=exercise_label)
+        self.frames_skipped = FRAMES_SKIPPED.labels(exercise=exercise_label)
+        logic_frames = LOGIC_FRAMES.labels(exercise=exercise_label)
+        lock_wait = LOCK_WAIT_SECONDS.labels(exercise=exercise_label)
+        entry = self.entry
+
+        # Unique per stream so two tabs of one session don't share a queue
+        self.stream_id = f"{session_id}/{secrets.token_hex(4)}"
+
+        self.trace = trace = None
+        if trace_dir:
+            os.makedirs(trace_dir, exist_ok=True)
+            self.trace = trace = TraceWriter(os.path.join(
+                trace_dir, f"{exercise}_{session_id[:8]}_{int(time.time())}.ptr"))
+
+        def on_landmarks(points, captured_at):
+            if trace:
+                trace.write(points, captured_at)
+            try:
+                wait_start = time.perf_counter()
+                with entry.lock:
+                    lock_wait.observe(time.perf_counter() - wait_start)
+                    entry.state.frame_time = captured_at
+                    entry.state = logic_function(points, entry.state)
+                    entry.publish()
+                logic_frames.inc()
+            except Exception as e:
+                LOGIC_ERRORS.labels(exercise=exercise_label).inc()
+                print(f"Error in exercise logic: {e}")
+                with entry.lock:
+                    entry.state.feedback = f"Error: {str(e)}"
+                    entry.state.feedback_class = "error"
+                    entry.publish()
+
+        def on_track_landmarks(track, points, captured_at):
+            # Each person's state belongs to the stream's inference thread alone
+            track.state.frame_time = captured_at
+            try:
+                track.state = logic_function(points, track.state)
+                logic_frames.inc()
+            except Exception as e:
+                LOGIC_ERRORS.labels(exercise=exercise_label).inc()
+                print(f"Error in exercise logic (person {track.id}): {e}")
+
+        # Capture, inference and encoding each run at their own pace off the
+        # camera's ring buffer; whoever calls render() is the encoding stage.
+        if people:
+            self.inference = self.video.multi_person_stage(
+                capture.ring, self.stream_id, on_track_landmarks, ExerciseState, people=people,
+                max_tracks=MAX_TRACKS, stage_histogram=STAGE_SECONDS, metric_labels={"exercise": exercise_label})
+            group_streams[session_id] = self.inference
+        else:
+            self.inference = self.video.inference_stage(capture.ring, self.stream_id, on_landmarks,
+                                                        stage_histogram=STAGE_SECONDS,
+                                                        metric_labels={"exercise": exercise_label})
+        self.timers = {"capture": capture.timer, **self.inference.timers,
+                       "draw": StageTimer(histogram=STAGE_SECONDS.labels(stage="draw", exercise=exercise_label)),
+                       "encode": StageTimer(histogram=STAGE_SECONDS.labels(stage="encode", exercise=exercise_label)),
+                       "scheduler": self.inference.scheduler, "encoder": self.encoder}
+        pipeline_timers[self.stream_id] = self.timers
+        self.inference.start()
+        ACTIVE_STREAMS.labels(exercise=exercise_label).inc()
+
+    def error_chunk(self):
+        return self.encoder.encode(self.error)
+
+    def render(self, seq, captured_at, frame):
+        """Draw on and encode a camera frame (in place); None when it is skipped or fails"""
+        self.entry.touch()  # A live stream keeps its session from expiring
+        if not self.encoder.should_send(seq, captured_at):
+            self.frames_skipped.inc()
+            return None
+
+        start = time.perf_counter()
+        if self.draw_overlay and self.people:
+            self.video.overlay_renderer.draw_tracks(frame, self.inference.published)
+        elif self.draw_overlay:
+            self.video.overlay_renderer.draw(frame, self.inference.points, self.entry.snapshot)
+        self.timers["draw"].record(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        chunk = self.encoder.encode(frame)
+        self.timers["encode"].record(time.perf_counter() - start)
+        if not chunk:
+            ENCODER_FAILURES.labels(exercise=self.exercise_label).inc()
+            print("❌ Failed to encode frame")
+            return None
+        self.frames_streamed.inc()
+        self.bytes_streamed.inc(len(chunk))
+        return chunk
+
+    def sent(self, seconds):
+        """Report how long the last chunk took to go out (slow clients get every Nth frame)"""
+        self.encoder.sent(seconds)
+
+    def close(self):
+        if self.camera is None:
+            return
+        ACTIVE_STREAMS.labels(exercise=self.exercise_label).dec()
+        self.inference.stop()
+        if self.trace:
+            self.trace.close()
+        self.video.camera_registry.release(self.camera)
+        self.video.pose_pool.close_stream(self.stream_id)
+        if group_streams.get(self.session_id) is self.inference:
+            del group_streams[self.session_id]
+        pipeline_timers.pop(self.stream_id, None)
+        self.camera = None
+
+
+@app.route('/video_feed/<exercise>/<session_id>')
+def video_feed(exercise, session_id):
+    logic_function = get_exercise_function(exercise)
+    if not logic_function:
+        return "Exercise not found", 404
+    # ?overlay=0 streams the bare video for clients that draw their own HUD
+    draw_overlay = request.args.get('overlay', '1') != '0'
+    # ?people=N scores N people standing side by side (one column of the frame
+    # each), ?people=auto detects and tracks people; stats per person come
+    # from /get_track_stats
+    try:
+        people = parse_people(request.args.get('people'))
+    except ValueError as e:
+        return str(e), 400
+    
+    def generate():
+        stream = VideoStream(exercise, session_id, logic_function, draw_overlay, people)
+        if stream.error is not None:
+            chunk = stream.error_chunk()
+            if chunk:
+                yield chunk
+            return
+        
+        try:
+            last_seq = 0
+            frame = None
+            while True:
+                latest = stream.ring.latest(frame, after_seq=last_seq, timeout=1.0)
+                if latest is None:
+                    if stream.ring.closed:
+                        break
+                    continue
+                last_seq, captured_at, frame = latest
+                chunk = stream.render(last_seq, captured_at, frame)
+                if chunk is None:
+                    continue
+                start = time.perf_counter()
+                yield chunk
+                # Resumes once the server has written the chunk out
+                stream.sent(time.perf_counter() - start)
+
+        except Exception as e:
+            STREAM_ERRORS.labels(exercise=stream.exercise_label).inc()
+            print(f"❌ Error in video generation: {e}")
+            
+        finally:
+            stream.close()
+
+    return Response(generate(),
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
+
+def apply_uploaded_landmarks(entry, logic_function, payload, exercise_label):
+    """Run uploaded landmark records through the logic; returns the stats delta"""
+    records = decode_records(payload)
+    if len(records) > MAX_UPLOAD_RECORDS:
+        raise ValueError(f"at most {MAX_UPLOAD_RECORDS} records per upload")
+
+    entry.touch()
+    with entry.lock:
+        before = entry.snapshot
+        try:
+            for record in records:
+                captured_at = float(record["timestamp"])
+                # Clients without a capture clock send 0
+                entry.state.frame_time = captured_at if captured_at > 0 else time.time()
+                entry.state = logic_function(record["landmarks"], entry.state)
+        except Exception as e:
+            LOGIC_ERRORS.labels(exercise=exercise_label).inc()
+            print(f"Error in exercise logic: {e}")
+            entry.state.feedback = f"Error: {str(e)}"
+            entry.state.feedback_class = "error"
+        entry.publish()
+        after = entry.snapshot
+    UPLOADED_FRAMES.labels(exercise=exercise_label).inc(len(records))
+    LOGIC_FRAMES.labels(exercise=exercise_label).inc(len(records))
+    return snapshot_delta(before, after)
+
+@app.route('/landmarks/<exercise>', methods=['POST'])
+def upload_landmarks(exercise):
+    """Landmark upload mode for clients that run pose estimation themselves.
+
+    The body is one or more packed landmark_trace records (float64 capture
+    timestamp + float32[33][4] x, y, z, visibility, little endian). Only the
+    exercise logic runs here; the response is the stats that changed.
+    """
+    logic_function = get_exercise_function(exercise)
+    if not logic_function:
+        return jsonify({"error": "Exercise not found"}), 404
+    entry = exercise_states.get(session.get('session_id'))
+    if entry is None:
+        return jsonify({"error": "No active exercise session"}), 409
+
+    try:
+        delta = apply_uploaded_landmarks(entry, logic_function, request.get_data(cache=False),
+                                         exercise.lower())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(delta)
+
+if Sock is not None:
+    sock = Sock(app)
+
+    @sock.route('/ws/landmarks/<exercise>')
+    def landmarks_socket(ws, exercise):
+        """WebSocket version of /landmarks: binary messages in, JSON stats deltas out"""
+        logic_function = get_exercise_function(exercise)
+        session_id = session.get('session_id')
+        if not logic_function:
+            ws.close(reason=1008, message="Exercise not found")
+            return
+
+        while True:
+            payload = ws.receive()
+            if not isinstance(payload, bytes):
+                continue  # Text frames carry nothing for us
+            # Looked up per message: the session may be restarted or completed meanwhile
+            entry = exercise_states.get(session_id)
+            if entry is None:
+                ws.close(reason=1008, message="No active exercise session")
+                return
+            try:
+                delta = apply_uploaded_landmarks(entry, logic_function, payload, exercise.lower())
+            except ValueError as e:
+                ws.send(json.dumps({"error": str(e)}))
+                continue
+            if delta:
+                ws.send(json.dumps(delta))
+
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), mimetype=CONTENT_TYPE)
+
+@app.route('/pipeline_timings')
+def pipeline_timings():
+    return jsonify({
+        stream_id: {stage: timer.snapshot() for stage, timer in timers.items()}
+        for stream_id, timers in list(pipeline_timers.items())
+    })
+
+@app.route('/get_stats')
+def get_stats():
+    # Lock-free: the logic stage publishes a fresh snapshot after every update
+    stats = exercise_states.snapshot(session.get('session_id'))
+    if stats is None:
+        return jsonify({
+            "reps": 0,
+            "time": 0,
+            "feedback": "Start position",
+            "feedback_class": "neutral"
+        })
+    
+    return jsonify(stats)
+
+@app.route('/get_track_stats')
+def get_track_stats():
+    """Per-person stats of the session's multi-person stream (empty without one)"""
+    stage = group_streams.get(session.get('session_id'))
+    return jsonify({"tracks": stage.stats() if stage else []})
+
+@app.route('/stats_stream')
+def stats_stream():
+    """Server-Sent Events: pushes the session's stats only when they visibly change"""
+    session_id = session.get('session_id')
+
+    def events():
+        yield "retry: 3000\n\n"
+        sent = None
+        version = -1
+        while True:
+            entry = exercise_states.get(session_id)
+            if entry is None:
+                yield "data: " + json.dumps({
+                    "reps": 0,
+                    "time": 0,
+                    "feedback": "Start position",
+                    "feedback_class": "neutral"
+                }) + "\n\n"
+                yield "event: end\ndata: {}\n\n"  # Tells the page not to reconnect
+                return
+
+            version, stats = entry.wait_for_change(version, timeout=15)
+            # By content: publish() swaps in a new snapshot object every frame
+            if sent is not None and not snapshot_delta(sent, stats):
+                yield ": keepalive\n\n"  # Also notices clients that went away
+                continue
+            sent = stats
+            yield "data: " + json.dumps(stats) + "\n\n"
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/complete_workout/<exercise>')
+def complete_workout(exercise):
+    if 'user' not in session:
+        return redirect(url_for('login'))
+
+    session_id = session.get('session_id')
+    state = ExerciseState()
+    
+    entry = exercise_states.pop(session_id)
+    if entry is not None:
+        with entry.lock:
+            state = entry.state
+        # Queued, never waits on the database; skips reloads of an empty session
+        if session.get('user_id') is not None and (state.reps or state.current_time >= 1):
+            workout_writer.submit(session['user_id'], exercise.lower(), state.current_time, state.reps,
+                                  performed_at=time.time())
+
+    stats = {
+        "reps": state.reps,
+        "time_minutes": int(state.current_time) // 60,
+        "time_seconds": int(state.current_time) % 60,
+        "feedback": state.feedback
+    }
+    
+    return render_template("complete_workout.html", exercise=exercise, stats=stats)
+
+@app.route('/api/history')
+def api_history():
+    """The logged-in user's workouts, newest first: ?limit=20&cursor=<next_cursor>"""
+    if 'user' not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    try:
+        with db.connection() as con:
+            return jsonify(history_page(con, session['user_id'], request.args.get('limit'),
+                                        request.args.get('cursor')))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/trends')
+def api_trends():
+    """Daily / weekly totals: ?period=day|week&exercise=all&limit=30&before=<next_before>"""
+    if 'user' not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    try:
+        with db.connection() as con:
+            return jsonify(trends(con, session['user_id'], request.args.get('period', 'day'),
+                                  request.args.get('exercise', 'all'), request.args.get('limit'),
+                                  request.args.get('before')))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/logout')
+def logout():
+    exercise_states.pop(session.get('session_id'))
+    
+    session.pop('user', None)
+    session.pop('user_id', None)
+    session.pop('session_id', None)
+    flash('Logged out successfully.', 'info')
+    response = redirect(url_for('login'))
+    response.delete_cookie(AFFINITY_COOKIE)
+    return response
+
+if __name__ == "__main__":
+
+    app.run(debug=True)
@@ -0,0 +1,625 @@
+"""Asynchronous serving path: video and stats streams on an asyncio event loop.
+
+Under app.py / serve.py every MJPEG or SSE stream holds a server thread for
+its whole life, so concurrent viewers are capped by the thread count. Here
+the long-lived responses are served from the event loop instead:
+  - /video_feed/<exercise>/<session_id>: one VideoStream per stream, shared
+    by every connection watching it. Frames are drawn and JPEG-encoded once,
+    in a small thread pool, and offered to each connection; a connection
+    still sending the previous frame gets the newer one instead (per-client
+    backpressure with frame dropping, slow clients never hold up the others)
+  - /stats_stream: waits for the session's stats to change without a thread
+Every other route runs the Flask app unchanged, in a thread pool (only for
+as long as the request takes). Idle stream connections cost a coroutine
+and a socket, not a thread.
+
+    python asgi.py --port 8000              # built-in HTTP/1.1 server
+    uvicorn asgi:application --port 8000    # or any ASGI server
+
+WebSocket landmark uploads (/ws/landmarks) still need app.py or serve.py.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import signal
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs, unquote
+
+from itsdangerous import BadSignature
+
+import app as pose_app
+from utils.exercise_logic import get_exercise_function
+from utils.session_store import snapshot_delta
+
+MAX_HEAD_BYTES = 64 * 1024
+MAX_BODY_BYTES = 16 * 1024 * 1024
+SSE_KEEPALIVE = 15.0  # Seconds between keepalive comments on an idle stats stream
+DEFAULT_STATS = {"reps": 0, "time": 0, "feedback": "Start position", "feedback_class": "neutral"}
+
+
+# ===== VIDEO STREAMS =====
+
+class CameraFeed:
+    """A camera's newest frame for the event loop.
+
+    One thread waits on the camera's ring and hands every new frame to the
+    loop; coroutines await the next one. Frames are shared: don't draw on them.
+    """
+
+    def __init__(self, ring, loop):
+        self.ring = ring
+        self.loop = loop
+        self.seq = 0
+        self.captured_at = None
+        self.frame = None
+        self.closed = False
+        self.users = 0
+        self._waiters = []
+        self._stop = threading.Event()
+        threading.Thread(target=self._watch, name="camera-feed", daemon=True).start()
+
+    def _watch(self):
+        seq = 0
+        try:
+            while not self._stop.is_set():
+                latest = self.ring.latest(None, after_seq=seq, timeout=1.0)
+                if latest is None:
+                    if self.ring.closed:
+                        break
+                    continue
+                seq = latest[0]
+                self.loop.call_soon_threadsafe(self._publish, *latest)
+            self.loop.call_soon_threadsafe(self._close)
+        except RuntimeError:
+            pass  # The loop has shut down
+
+    def _wake(self):
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _publish(self, seq, captured_at, frame):
+        self.seq, self.captured_at, self.frame = seq, captured_at, frame
+        self._wake()
+
+    def _close(self):
+        self.closed = True
+        self._wake()
+
+    async def next(self, after_seq):
+        """(seq, captured_at, frame) newer than after_seq, or None once the camera is gone"""
+        while self.seq <= after_seq:
+            if self.closed:
+                return None
+            waiter = self.loop.create_future()
+            self._waiters.append(waiter)
+            await waiter
+        return self.seq, self.captured_at, self.frame
+
+    def stop(self):
+        self._stop.set()
+
+
+class Viewer:
+    """One connection's mailbox: holds at most one chunk, newer chunks replace it"""
+
+    def __init__(self, hub):
+        self.hub = hub
+        self.chunk = None
+        self.ended = False
+        self.dropped = 0
+        self._ready = asyncio.Event()
+
+    def offer(self, chunk):
+        if self.chunk is not None:
+            self.dropped += 1  # Still sending the one before; it never sees this one
+        self.chunk = chunk
+        self._ready.set()
+
+    def end(self):
+        self.ended = True
+        self._ready.set()
+
+    async def take(self):
+        """The newest chunk not sent yet, or None when the stream has ended"""
+        if self.chunk is None:
+            self.hub.wanted.set()
+        while self.chunk is None and not self.ended:
+            self._ready.clear()
+            await self._ready.wait()
+        chunk, self.chunk = self.chunk, None
+        return chunk
+
+
+class StreamHub:
+    """One VideoStream shared by every connection watching the same stream.
+
+    A frame is only drawn and encoded once some connection is ready for it,
+    so the stream runs at the pace of its fastest viewer.
+    """
+
+    def __init__(self, server, key, exercise, session_id, logic_function, draw_overlay, people):
+        self.server = server
+        self.key = key
+        self.args = (exercise, session_id, logic_function, draw_overlay, people)
+        self.viewers = set()
+        self.wanted = asyncio.Event()
+        self.task = asyncio.ensure_future(self._run())
+
+    def join(self):
+        viewer = Viewer(self)
+        self.viewers.add(viewer)
+        return viewer
+
+    def leave(self, viewer):
+        self.viewers.discard(viewer)
+        self.wanted.set()  # Lets the producer notice when nobody is left
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stream = feed = None
+        try:
+            stream = await loop.run_in_executor(self.server.render_executor, pose_app.VideoStream, *self.args)
+            if stream.error is not None:
+                chunk = await loop.run_in_executor(self.server.render_executor, stream.error_chunk)
+                for viewer in self.viewers:
+                    if chunk:
+                        viewer.offer(chunk)
+                return
+            feed = self.server.camera_feed(stream.ring)
+            seq = 0
+            while self.viewers:
+                await self.wanted.wait()
+                self.wanted.clear()
+                if not self.viewers:
+                    break
+                latest = await feed.next(seq)
+                if latest is None:
+                    break
+                seq, captured_at, frame = latest
+                chunk = await loop.run_in_executor(self.server.render_executor, self._render,
+                                                   stream, seq, captured_at, frame)
+                if chunk is None:
+                    self.wanted.set()  # Skipped; try the next frame
+                    continue
+                for viewer in self.viewers:
+                    viewer.offer(chunk)
+        except Exception as e:
+            label = self.args[0].lower()
+            pose_app.STREAM_ERRORS.labels(exercise=label).inc()
+            print(f"❌ Error in video generation: {e}")
+        finally:
+            for viewer in self.viewers:
+                viewer.end()
+            if self.server.hubs.get(self.key) is self:
+                del self.server.hubs[self.key]
+            if feed is not None:
+                self.server.release_feed(feed)
+            if stream is not None:
+                await loop.run_in_executor(self.server.render_executor, stream.close)
+
+    @staticmethod
+    def _render(stream, seq, captured_at, frame):
+        return stream.render(seq, captured_at, frame.copy())
+
+
+# ===== ASGI APPLICATION =====
+
+def _header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def _wait_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+class PoseASGI:
+    def __init__(self, flask_app, wsgi_threads=32, render_threads=None):
+        """
+        flask_app:      the Flask app serving every route that isn't a stream
+        wsgi_threads:   Flask requests handled at the same time
+        render_threads: frames drawn / encoded at the same time (default: one per core)
+        """
+        self.flask_app = flask_app
+        self.wsgi_executor = ThreadPoolExecutor(wsgi_threads, thread_name_prefix="asgi-wsgi")
+        self.render_executor = ThreadPoolExecutor(render_threads or os.cpu_count() or 1,
+                                                  thread_name_prefix="asgi-render")
+        self.hubs = {}
+        self.feeds = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            await send({"type": "websocket.close", "code": 1000})  # WebSockets: use app.py / serve.py
+            return
+        path = scope["path"]
+        parts = path.split("/")
+        if len(parts) == 4 and parts[1] == "video_feed" and scope["method"] == "GET":
+            return await self.video_feed(scope, receive, send, parts[2], parts[3])
+        if path == "/stats_stream" and scope["method"] == "GET":
+            return await self.stats_stream(scope, receive, send)
+        return await self.wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.wsgi_executor.shutdown(wait=False)
+                self.render_executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def session_id(self, scope):
+        """The session_id in the request's Flask session cookie, or None"""
+        cookie = SimpleCookie()
+        try:
+            cookie.load(_header(scope, b"cookie") or "")
+        except Exception:
+            return None
+        name = self.flask_app.config["SESSION_COOKIE_NAME"]
+        if name not in cookie:
+            return None
+        serializer = self.flask_app.session_interface.get_signing_serializer(self.flask_app)
+        try:
+            data = serializer.loads(cookie[name].value,
+                                    max_age=int(self.flask_app.permanent_session_lifetime.total_seconds()))
+        except BadSignature:
+            return None
+        return data.get("session_id")
+
+    def camera_feed(self, ring):
+        feed = self.feeds.get(ring)
+        if feed is None:
+            feed = self.feeds[ring] = CameraFeed(ring, asyncio.get_running_loop())
+        feed.users += 1
+        return feed
+
+    def release_feed(self, feed):
+        feed.users -= 1
+        if feed.users == 0:
+            feed.stop()
+            self.feeds.pop(feed.ring, None)
+
+    async def _plain(self, send, status, text):
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"text/plain; charset=utf-8")]})
+        await send({"type": "http.response.body", "body": text.encode()})
+
+    async def _until_disconnect(self, receive, coroutine):
+        """Run coroutine until it returns or the client goes away"""
+        task = asyncio.ensure_future(coroutine)
+        watcher = asyncio.ensure_future(_wait_disconnect(receive))
+        try:
+            await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for future in (task, watcher):
+                future.cancel()
+            await asyncio.gather(task, watcher, return_exceptions=True)
+
+    async def video_feed(self, scope, receive, send, exercise, session_id):
+        logic_function = get_exercise_function(exercise)
+        if not logic_function:
+            return await self._plain(send, 404, "Exercise not found")
+        query = parse_qs(scope["query_string"].decode("latin-1"))
+        draw_overlay = query.get("overlay", ["1"])[0] != "0"
+        try:
+            people = pose_app.parse_people(query.get("people", [None])[0])
+        except ValueError as e:
+            return await self._plain(send, 400, str(e))
+
+        key = (exercise.lower(), session_id, draw_overlay, people)
+        hub = self.hubs.get(key)
+        if hub is None:
+            hub = self.hubs[key] = StreamHub(self, key, exercise, session_id, logic_function,
+                                             draw_overlay, people)
+        viewer = hub.join()
+
+        async def stream():
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", b"multipart/x-mixed-replace; boundary=frame")]})
+            while True:
+                chunk = await viewer.take()
+                if chunk is None:
+                    break
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+
+        try:
+            await self._until_disconnect(receive, stream())
+        finally:
+            hub.leave(viewer)
+
+    async def stats_stream(self, scope, receive, send):
+        """Server-Sent Events, as /stats_stream in app.py, without holding a thread"""
+        loop = asyncio.get_running_loop()
+        session_id = self.session_id(scope)
+        changed = asyncio.Event()
+
+        def listener():
+            try:
+                loop.call_soon_threadsafe(changed.set)
+            except RuntimeError:
+                pass  # The loop has shut down
+
+        async def events():
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", b"text/event-stream; charset=utf-8"),
+                                    (b"cache-control", b"no-cache"), (b"x-accel-buffering", b"no")]})
+            await send({"type": "http.response.body", "body": b"retry: 3000\n\n", "more_body": True})
+            entry = sent = None
+            try:
+                while True:
+                    current = await loop.run_in_executor(self.wsgi_executor, pose_app.exercise_states.get,
+                                                         session_id)
+                    if current is None:
+                        await send({"type": "http.response.body", "more_body": True,
+                                    "body": f"data: {json.dumps(DEFAULT_STATS)}\n\n".encode()})
+                        await send({"type": "http.response.body", "body": b"event: end\ndata: {}\n\n"})
+                        return
+                    if current is not entry:  # A new workout replaced the session's state
+                        # listen / unlisten take the entry's lock, which publishers hold on their threads
+                        if entry is not None:
+                            await loop.run_in_executor(self.wsgi_executor, entry.unlisten, listener)
+                        entry = current
+                        await loop.run_in_executor(self.wsgi_executor, entry.listen, listener)
+
+                    stats = entry.snapshot
+                    # By content: publish() swaps in a new snapshot object every frame
+                    if sent is None or snapshot_delta(sent, stats):
+                        sent = stats
+                        await send({"type": "http.response.body", "more_body": True,
+                                    "body": f"data: {json.dumps(stats)}\n\n".encode()})
+                    try:
+                        await asyncio.wait_for(changed.wait(), SSE_KEEPALIVE)
+                        changed.clear()
+                    except asyncio.TimeoutError:
+                        await send({"type": "http.response.body", "body": b": keepalive\n\n", "more_body": True})
+            finally:
+                if entry is not None:
+                    await loop.run_in_executor(self.wsgi_executor, entry.unlisten, listener)
+
+        await self._until_disconnect(receive, events())
+
+    def _environ(self, scope, body):
+        server = scope.get("server") or ("localhost", 80)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", ""),
+            "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope["query_string"].decode("latin-1"),
+            "SERVER_NAME": str(server[0]),
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": "HTTP/" + scope.get("http_version", "1.1"),
+            "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+            "CONTENT_LENGTH": str(len(body)),
+        }
+        for name, value in scope["headers"]:
+            name = name.decode("latin-1").upper().replace("-", "_")
+            value = value.decode("latin-1")
+            if name == "CONTENT_TYPE":
+                environ["CONTENT_TYPE"] = value
+            elif name != "CONTENT_LENGTH":
+                key = "HTTP_" + name
+                environ[key] = environ[key] + "," + value if key in environ else value
+        return environ
+
+    async def wsgi(self, scope, receive, send):
+        """Run the Flask app for one request on the thread pool"""
+        body = b""
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if len(body) > MAX_BODY_BYTES:
+                return await self._plain(send, 413, "Request body too large")
+            if not message.get("more_body"):
+                break
+
+        loop = asyncio.get_running_loop()
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                                   for name, value in headers]
+
+        iterable = await loop.run_in_executor(self.wsgi_executor, self.flask_app, self._environ(scope, body),
+                                              start_response)
+        try:
+            chunks = iter(iterable)
+            started = False
+            while True:
+                chunk = await loop.run_in_executor(self.wsgi_executor, next, chunks, None)
+                if not started:
+                    await send({"type": "http.response.start", "status": response["status"],
+                                "headers": response["headers"]})
+                    started = True
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(iterable, "close"):
+                await loop.run_in_executor(self.wsgi_executor, iterable.close)
+
+
+# ===== BUILT-IN HTTP SERVER =====
+# Just enough HTTP/1.1 to run the ASGI app without an ASGI server installed:
+# keep-alive, Content-Length request bodies, chunked streaming responses.
+# Writes wait for the socket to drain, which is what makes a slow client's
+# stream fall behind (and drop frames) instead of buffering them.
+
+class HTTPServer:
+    def __init__(self, application, host, port):
+        self.application = application
+        self.host = host
+        self.port = port
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle, self.host, self.port, limit=MAX_HEAD_BYTES,
+                                            backlog=1024)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        # Stop on terminate too, so queued workouts are still written (atexit)
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        async with server:
+            await stop.wait()
+
+    async def handle(self, reader, writer):
+        try:
+            while await self._request(reader, writer):
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        except asyncio.CancelledError:
+            pass  # Server shutting down
+        finally:
+            writer.close()
+
+    async def _request(self, reader, writer):
+        """Serve one request; True if the connection can take another"""
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return False
+        lines = head[:-4].decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            return _refuse(writer, 400)
+        headers = []
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers.append((name.strip().lower().encode("latin-1"), value.strip().encode("latin-1")))
+        fields = dict(headers)
+        if b"transfer-encoding" in fields:
+            return _refuse(writer, 501)
+        length = fields.get(b"content-length", b"0")
+        if not length.isdigit():
+            return _refuse(writer, 400)
+        length = int(length)
+        if length > MAX_BODY_BYTES:
+            return _refuse(writer, 413)
+        body = await reader.readexactly(length) if length else b""
+
+        path, _, query = target.partition("?")
+        peer = writer.get_extra_info("peername") or ("", 0)
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": version[5:], "method": method,
+            "scheme": "http", "path": unquote(path), "raw_path": path.encode("latin-1"),
+            "query_string": query.encode("latin-1"), "root_path": "", "headers": headers,
+            "client": tuple(peer[:2]), "server": (self.host, self.port),
+        }
+        state = {"keep_alive": version == "HTTP/1.1" and fields.get(b"connection", b"").lower() != b"close",
+                 "started": False, "chunked": False, "finished": False, "body_read": False}
+        disconnected = asyncio.get_running_loop().create_future()
+
+        async def watch_eof():
+            try:
+                while await reader.read(65536):
+                    pass  # Nothing more is expected on a connection that waits for disconnect
+            except ConnectionError:
+                pass
+            if not disconnected.done():
+                disconnected.set_result(None)
+
+        async def receive():
+            if not state["body_read"]:
+                state["body_read"] = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            if state["keep_alive"]:
+                state["keep_alive"] = False  # Reading ahead for EOF uses up the connection
+                asyncio.ensure_future(watch_eof())
+            await disconnected
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if disconnected.done():
+                raise ConnectionResetError("client went away")
+            if message["type"] == "http.response.start":
+                names = {name.lower() for name, _ in message.get("headers", [])}
+                state["chunked"] = b"content-length" not in names and version == "HTTP/1.1"
+                if b"content-length" not in names and not state["chunked"]:
+                    state["keep_alive"] = False
+                lines = [f"HTTP/1.1 {message['status']} {_reason(message['status'])}".encode()]
+                lines += [name + b": " + value for name, value in message.get("headers", [])]
+                if state["chunked"]:
+                    lines.append(b"Transfer-Encoding: chunked")
+                lines.append(b"Connection: " + (b"keep-alive" if state["keep_alive"] else b"close"))
+                writer.write(b"\r\n".join(lines) + b"\r\n\r\n")
+                state["started"] = True
+            elif message["type"] == "http.response.body":
+                data = message.get("body", b"")
+                if state["chunked"] and data:
+                    writer.write(b"%x\r\n" % len(data) + data + b"\r\n")
+                elif data:
+                    writer.write(data)
+                if not message.get("more_body"):
+                    if state["chunked"]:
+                        writer.write(b"0\r\n\r\n")
+                    state["finished"] = True
+            await writer.drain()
+
+        try:
+            await self.application(scope, receive, send)
+        except Exception as e:
+            print(f"❌ Error handling {method} {path}: {e}")
+            if not state["started"]:
+                _refuse(writer, 500)
+            return False
+        return state["finished"] and state["keep_alive"]
+
+
+def _refuse(writer, status):
+    """Answer with an empty error response and close; returns False for _request"""
+    head = f"HTTP/1.1 {status} {_reason(status)}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+    writer.write(head.encode())
+    return False
+
+
+def _reason(status):
+    from http import HTTPStatus
+    try:
+        return HTTPStatus(status).phrase
+    except ValueError:
+        return ""
+
+
+application = PoseASGI(pose_app.app, wsgi_threads=int(os.environ.get('ASGI_THREADS', 32)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"✅ ASGI server on {args.host}:{args.port}")
+    asyncio.run(HTTPServer(application, args.host, args.port).serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Re-score recorded workout videos offline with the live exercise logic.
+
+Each video is decoded as a stream and run through MediaPipe Pose and its
+exercise's logic function in its own worker process. Writes one summary row
+per video plus a feedback timeline.
+
+    python batch_score.py recordings/ --exercise squat --output results.csv
+    python batch_score.py recordings/ --format parquet --workers 8
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv", ".webm", ".m4v"}
+
+SUMMARY_FIELDS = ["video", "exercise", "duration_seconds", "frames", "sampled_frames",
+                  "detected_frames", "reps", "active_seconds", "perfect_seconds",
+                  "final_feedback", "process_seconds", "error"]
+TIMELINE_FIELDS = ["video", "timestamp", "reps", "feedback", "feedback_class"]
+
+
+def find_videos(directory, recursive=False):
+    videos = []
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in VIDEO_EXTENSIONS:
+                videos.append(os.path.join(root, name))
+        if not recursive:
+            break
+    return sorted(videos)
+
+
+def guess_exercise(path, exercise_names):
+    """Pick the exercise whose name appears in the file name (e.g. squat_0042.mp4)"""
+    stem = os.path.basename(path).lower()
+    for name in sorted(exercise_names, key=len, reverse=True):
+        if name in stem:
+            return name
+    return None
+
+
+def _init_worker():
+    # One video per process: keep OpenCV from spawning its own thread pool in each
+    import cv2
+    cv2.setNumThreads(1)
+
+
+def score_video(path, exercise, sample_hz=15.0, width=640, model_complexity=1):
+    """Run pose + exercise logic over one video; returns (summary, timeline)"""
+    import cv2
+    import mediapipe as mp
+    from utils.exercise_logic import ExerciseState, get_exercise_function
+
+    summary = dict.fromkeys(SUMMARY_FIELDS)
+    summary.update(video=path, exercise=exercise, frames=0, sampled_frames=0, detected_frames=0)
+    timeline = []
+    started = time.perf_counter()
+
+    logic_function = get_exercise_function(exercise) if exercise else None
+    if logic_function is None:
+        summary["error"] = f"unknown exercise: {exercise}"
+        return summary, timeline
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        summary["error"] = "could not open video"
+        return summary, timeline
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    interval = 1.0 / sample_hz if sample_hz else 0.0
+    next_sample_at = 0.0
+    timestamp = 0.0
+
+    state = ExerciseState()
+    state.start_time = 0.0
+    last_event = None
+
+    pose = mp.solutions.pose.Pose(model_complexity=model_complexity)
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            timestamp = summary["frames"] / fps
+            summary["frames"] += 1
+            if timestamp + 1e-6 < next_sample_at:
+                continue
+            next_sample_at = timestamp + interval
+            summary["sampled_frames"] += 1
+
+            height, frame_width = frame.shape[:2]
+            if width and frame_width > width:
+                frame = cv2.resize(frame, (width, max(1, round(height * width / frame_width))),
+                                   interpolation=cv2.INTER_AREA)
+            results = pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            if not results.pose_landmarks:
+                continue
+            summary["detected_frames"] += 1
+
+            state.frame_time = timestamp
+            state = logic_function(results.pose_landmarks.landmark, state)
+
+            event = (state.reps, state.feedback, state.feedback_class)
+            if event != last_event:
+                timeline.append({"video": path, "timestamp": round(timestamp, 3), "reps": state.reps,
+                                 "feedback": state.feedback, "feedback_class": state.feedback_class})
+                last_event = event
+    except Exception as e:
+        summary["error"] = str(e)
+    finally:
+        pose.close()
+        cap.release()
+
+    summary.update(
+        duration_seconds=round(summary["frames"] / fps, 3),
+        reps=state.reps,
+        active_seconds=round(state.current_time, 3),
+        perfect_seconds=round(state.perfect_time, 3),
+        final_feedback=state.feedback,
+        process_seconds=round(time.perf_counter() - started, 3),
+    )
+    return summary, timeline
+
+
+def write_rows(path, rows, fields, fmt):
+    if fmt == "parquet":
+        import pandas as pd
+        pd.DataFrame(rows, columns=fields).to_parquet(path, index=False)
+        return
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    from utils.exercise_logic import EXERCISE_FUNCTIONS
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory", help="directory of recorded videos")
+    parser.add_argument("--exercise", choices=sorted(EXERCISE_FUNCTIONS),
+                        help="exercise for every video (default: guessed from each file name)")
+    parser.add_argument("--output", default="scores.csv", help="summary file (timeline goes next to it)")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--sample-hz", type=float, default=15.0,
+                        help="pose samples per second of video (0 = every frame)")
+    parser.add_argument("--width", type=int, default=640, help="max inference frame width (0 = full size)")
+    parser.add_argument("--model-complexity", type=int, choices=[0, 1, 2], default=1)
+    parser.add_argument("--recursive", action="store_true", help="also search subdirectories")
+    args = parser.parse_args(argv)
+
+    if args.format == "parquet":
+        try:
+            import pandas  # noqa: F401
+        except ImportError:
+            parser.error("--format parquet needs pandas and pyarrow installed")
+
+    videos = find_videos(args.directory, args.recursive)
+    if not videos:
+        print(f"❌ No videos found in {args.directory}")
+        return 1
+
+    summaries, timeline = [], []
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as pool:
+        futures = {
+            pool.submit(score_video, path, args.exercise or guess_exercise(path, EXERCISE_FUNCTIONS),
+                        args.sample_hz, args.width, args.model_complexity): path
+            for path in videos
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                summary, events = future.result()
+            except Exception as e:
+                summary, events = dict.fromkeys(SUMMARY_FIELDS), []
+                summary.update(video=futures[future], error=str(e))
+            summaries.append(summary)
+            timeline.extend(events)
+            status = f"error: {summary['error']}" if summary["error"] else f"{summary['reps']} reps"
+            print(f"[{done}/{len(videos)}] {summary['video']}: {status}")
+
+    summaries.sort(key=lambda row: row["video"])
+    timeline.sort(key=lambda row: (row["video"], row["timestamp"]))
+
+    stem, ext = os.path.splitext(args.output)
+    ext = ext or (".parquet" if args.format == "parquet" else ".csv")
+    write_rows(stem + ext, summaries, SUMMARY_FIELDS, args.format)
+    write_rows(f"{stem}_timeline{ext}", timeline, TIMELINE_FIELDS, args.format)
+
+    print(f"✅ Scored {len(videos)} videos in {time.perf_counter() - started:.1f}s "
+          f"-> {stem + ext}, {stem}_timeline{ext}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
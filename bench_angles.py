@@ -0,0 +1,156 @@
+"""Micro-benchmark: scalar calculate_angle vs the batched calculate_angles path.
+
+Run with: python bench_angles.py [--frames 2000] [--stack 10000]
+"""
+import argparse
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from utils.angle_utils import calculate_angle, calculate_angles, landmarks_to_array
+from utils.exercise_logic import (ANGLE_TRIPLETS, EXERCISE_FUNCTIONS, ExerciseState, compute_angles,
+                                  get_exercise_function)
+from utils.pose_landmarks import PoseLandmark
+
+
+def make_frames(n, seed=0):
+    """Random 33-landmark frames, with a few collapsed joints to hit the zero-magnitude case"""
+    rng = np.random.default_rng(seed)
+    points = rng.random((n, 33, 3)).astype(np.float32)
+    points[::50, 25] = points[::50, 23]  # left knee on top of left hip
+    return points
+
+
+def squat_frames(reps, fps=30):
+    """(33, 4) frames of squats seen from the right: the right knee goes
+    175 -> 90 -> 175 degrees every 2 s, the hidden left side stays at (0, 0)"""
+    knee_angles = np.tile(np.concatenate([np.linspace(175, 90, fps), np.linspace(90, 175, fps)]), reps)
+    frames = np.zeros((len(knee_angles), 33, 4), dtype=np.float32)
+    frames[..., 3] = [0.1 if lm.name.startswith("LEFT") else 0.95 for lm in PoseLandmark]
+    bend = np.radians(180 - knee_angles)
+    frames[:, PoseLandmark.RIGHT_SHOULDER, :2] = (0.5, 0.3)
+    frames[:, PoseLandmark.RIGHT_HIP, :2] = (0.5, 0.5)
+    frames[:, PoseLandmark.RIGHT_KNEE, :2] = (0.5, 0.7)
+    frames[:, PoseLandmark.RIGHT_ANKLE, 0] = 0.5 + 0.2 * np.sin(bend)
+    frames[:, PoseLandmark.RIGHT_ANKLE, 1] = 0.7 + 0.2 * np.cos(bend)
+    return frames
+
+
+def to_landmarks(frame):
+    return [SimpleNamespace(x=float(p[0]), y=float(p[1]), z=float(p[2]),
+                            visibility=float(p[3]) if len(p) > 3 else 1.0) for p in frame]
+
+
+def scalar_angles(landmarks, triplets):
+    return [calculate_angle(landmarks[a], landmarks[b], landmarks[c]) for a, b, c in triplets]
+
+
+def check_equal(frames, triplets):
+    """Batched results must match calculate_angle, including the zero-magnitude case"""
+    batched = calculate_angles(frames, triplets)
+    worst = 0.0
+    for i, frame in enumerate(frames):
+        expected = np.array(scalar_angles(to_landmarks(frame), triplets))
+        worst = max(worst, float(np.max(np.abs(batched[i] - expected))))
+    if worst > 1e-9:
+        raise AssertionError(f"batched angles differ from calculate_angle by {worst}")
+    return worst
+
+
+def check_input_forms(reps=5):
+    """A landmark list must score like the (33, 4) array it packs into, visibility included"""
+    logic_function = get_exercise_function("squat")
+    frames = squat_frames(reps)
+    counted = []
+    for as_list in (False, True):
+        state = ExerciseState()
+        for i, frame in enumerate(frames):
+            state.frame_time = i / 30
+            state = logic_function(to_landmarks(frame) if as_list else frame, state)
+        counted.append(state.reps)
+    if counted[0] != counted[1]:
+        raise AssertionError(f"squat reps: {counted[0]} from arrays, {counted[1]} from landmark lists")
+    return counted[0]
+
+
+def bench(label, fn, repeat, quiet=False):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = time.perf_counter() - start
+    if not quiet:
+        print(f"{label:<40} {elapsed / repeat * 1e6:10.2f} us")
+    return elapsed / repeat
+
+
+def speedup(scalar_t, batched_t):
+    ratio = scalar_t / batched_t
+    return f"{ratio:.2f}x" if ratio >= 1 else f"{ratio:.2f}x (slower than scalar)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=2000, help="frames for the per-frame benchmark")
+    parser.add_argument("--stack", type=int, default=10000, help="frames in the (N, 33, 3) bulk benchmark")
+    args = parser.parse_args()
+
+    triplets = np.array(list(ANGLE_TRIPLETS.values()), dtype=np.intp)
+    frames = make_frames(args.frames)
+    landmark_frames = [to_landmarks(frame) for frame in frames]
+
+    worst = check_equal(frames[:500], triplets)
+    print(f"max abs difference vs calculate_angle: {worst:.3g} deg")
+    print(f"squat reps from arrays and landmark lists: {check_input_forms()} each")
+    print(f"{len(triplets)} angles per frame\n")
+
+    it = iter(range(10**12))
+
+    def scalar():
+        scalar_angles(landmark_frames[next(it) % len(landmark_frames)], triplets)
+
+    def batched():
+        lms = landmark_frames[next(it) % len(landmark_frames)]
+        calculate_angles(landmarks_to_array(lms), triplets)
+
+    def batched_packed():
+        calculate_angles(frames[next(it) % len(frames)], triplets)
+
+    scalar_t = bench("scalar calculate_angle per frame", scalar, args.frames)
+    batched_t = bench("pack + calculate_angles per frame", batched, args.frames)
+    bench("calculate_angles on packed frame", batched_packed, args.frames)
+
+    stack = make_frames(args.stack, seed=1)
+    start = time.perf_counter()
+    calculate_angles(stack, triplets)
+    stack_t = (time.perf_counter() - start) / args.stack
+    print(f"{'calculate_angles on (N, 33, 3) stack':<40} {stack_t * 1e6:10.2f} us/frame")
+    print(f"\nspeedup per frame: {speedup(scalar_t, batched_t)}, bulk: {scalar_t / stack_t:.1f}x")
+
+    # What a live frame actually costs: each exercise computes only the angle
+    # columns it reads, and the batched side also packs the (33, 4) array the
+    # rule engine needs anyway for side selection and landmark features
+    def pack():
+        landmarks_to_array(landmark_frames[next(it) % len(landmark_frames)], with_visibility=True)
+
+    print()
+    bench("of which packing (33, 4)", pack, args.frames)
+    print(f"per exercise, live frame ({'angles':>6} {'scalar':>9} {'batched':>9})")
+    for name, logic_function in EXERCISE_FUNCTIONS.items():
+        columns = logic_function.angle_columns
+        exercise_triplets = triplets[columns]
+
+        def scalar_exercise():
+            scalar_angles(landmark_frames[next(it) % len(landmark_frames)], exercise_triplets)
+
+        def batched_exercise():
+            compute_angles(landmark_frames[next(it) % len(landmark_frames)], columns)
+
+        exercise_scalar_t = bench(name, scalar_exercise, args.frames, quiet=True)
+        exercise_batched_t = bench(name, batched_exercise, args.frames, quiet=True)
+        print(f"  {name:<24} {len(columns):>6} {exercise_scalar_t * 1e6:6.2f} us {exercise_batched_t * 1e6:6.2f} us"
+              f"  {speedup(exercise_scalar_t, exercise_batched_t)}")
+
+
+if __name__ == "__main__":
+    main()
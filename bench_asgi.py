@@ -0,0 +1,228 @@
+"""Load test: hundreds of concurrent video and stats streams on one server.
+
+Starts the server on a scratch database, logs in --sessions users and starts
+an exercise for each, then holds open at the same time:
+  - --streams /video_feed connections spread over the sessions; --slow of
+    them read a little and then stall, like viewers on a bad network
+  - --sse /stats_stream connections
+  - one /get_stats request after another, timed
+for --duration seconds, and reports how many connections were served, the
+frames per second fast and slow viewers got, SSE events, /get_stats latency
+and the server's threads and memory (from /proc).
+
+    python bench_asgi.py --source recordings/squat.mp4
+    python bench_asgi.py --source clip.avi --streams 300 --sse 300
+    python bench_asgi.py --source clip.avi --server wsgi    # the threaded server, for comparison
+"""
+import argparse
+import asyncio
+import http.client
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+
+import numpy as np
+
+from init_db import init_db
+
+SERVERS = {
+    "asgi": ["asgi.py", "--host", "127.0.0.1", "--port"],
+    "wsgi": ["serve.py", "--worker", "--port"],  # One threaded app process, as run by serve.py
+}
+
+
+def request(port, method, path, form=None, cookies=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    headers = {}
+    if cookies:
+        headers["Cookie"] = "; ".join(f"{name}={value}" for name, value in cookies.items())
+    body = None
+    if form is not None:
+        body = urllib.parse.urlencode(form)
+        headers["Content-Type"] = "application/x-www-form-urlencoded"
+    connection.request(method, path, body, headers)
+    response = connection.getresponse()
+    data = response.read()
+    if cookies is not None:
+        for name, value in response.getheaders():
+            if name.lower() == "set-cookie":
+                cookie = value.split(";", 1)[0]
+                cookies[cookie.split("=", 1)[0]] = cookie.split("=", 1)[1]
+    connection.close()
+    return response.status, data
+
+
+def start_session(port, index):
+    """Register and log in a user, start a squat; (cookie header, session id)"""
+    cookies = {}
+    form = {"username": f"bench{index}", "number": str(index), "password": "bench", "weight": "70"}
+    request(port, "POST", "/register", form)
+    request(port, "POST", "/login", {"username": form["username"], "password": "bench"}, cookies)
+    page = request(port, "GET", "/exercise/squat", cookies=cookies)[1].decode()
+    session_id = re.search(r"/video_feed/squat/([\w-]+)", page).group(1)
+    return "; ".join(f"{name}={value}" for name, value in cookies.items()), session_id
+
+
+async def open_stream(port, path, cookie=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    head = f"GET {path} HTTP/1.1\r\nHost: bench\r\n"
+    if cookie:
+        head += f"Cookie: {cookie}\r\n"
+    writer.write((head + "\r\n").encode())
+    status = await reader.readuntil(b"\r\n\r\n")
+    if b" 200 " not in status.split(b"\r\n", 1)[0]:
+        raise ConnectionError(status.split(b"\r\n", 1)[0].decode())
+    return reader, writer
+
+
+async def video_client(port, path, stop, result, slow):
+    """Count MJPEG parts; a slow client reads 16 KB every half second"""
+    try:
+        reader, writer = await open_stream(port, path)
+    except (OSError, asyncio.IncompleteReadError):
+        return
+    result["open"] = True
+    tail = b""
+    try:
+        while not stop.is_set():
+            data = await asyncio.wait_for(reader.read(16384 if slow else 1 << 20), 5)
+            if not data:
+                break
+            result["frames"] += (tail + data).count(b"--frame")
+            tail = data[-8:]
+            if slow:
+                await asyncio.sleep(0.5)
+    except (OSError, asyncio.TimeoutError):
+        pass
+    finally:
+        writer.close()
+
+
+async def sse_client(port, cookie, stop, result):
+    try:
+        reader, writer = await open_stream(port, "/stats_stream", cookie)
+    except (OSError, asyncio.IncompleteReadError):
+        return
+    result["open"] = True
+    try:
+        while not stop.is_set():
+            try:
+                data = await asyncio.wait_for(reader.read(65536), 1)
+            except asyncio.TimeoutError:
+                continue
+            if not data:
+                break
+            result["events"] += data.count(b"data: ")
+    except OSError:
+        pass
+    finally:
+        writer.close()
+
+
+async def stats_probe(port, cookie, stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"GET /get_stats HTTP/1.0\r\nHost: bench\r\nCookie: {cookie}\r\n\r\n".encode())
+            await asyncio.wait_for(reader.read(), 30)
+            writer.close()
+            latencies.append(time.perf_counter() - start)
+        except (OSError, asyncio.TimeoutError):
+            latencies.append(float("inf"))
+        await asyncio.sleep(0.2)
+
+
+def server_usage(pid):
+    fields = {}
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            name, _, value = line.partition(":")
+            fields[name] = value.split()
+    return int(fields["Threads"][0]), int(fields["VmRSS"][0]) / 1024
+
+
+async def load(port, sessions, args, pid):
+    stop = asyncio.Event()
+    videos = [{"open": False, "frames": 0, "slow": i < args.streams * args.slow} for i in range(args.streams)]
+    sses = [{"open": False, "events": 0} for _ in range(args.sse)]
+    latencies = []
+    tasks = [asyncio.ensure_future(stats_probe(port, sessions[0][0], stop, latencies))]
+    for i, result in enumerate(videos):
+        path = f"/video_feed/squat/{sessions[i % len(sessions)][1]}"
+        tasks.append(asyncio.ensure_future(video_client(port, path, stop, result, result["slow"])))
+    for i, result in enumerate(sses):
+        tasks.append(asyncio.ensure_future(sse_client(port, sessions[i % len(sessions)][0], stop, result)))
+
+    start = time.perf_counter()
+    peak_threads = peak_rss = 0
+    while time.perf_counter() - start < args.duration:
+        await asyncio.sleep(1)
+        threads, rss = server_usage(pid)
+        peak_threads, peak_rss = max(peak_threads, threads), max(peak_rss, rss)
+    for result in videos:
+        result["frames_at_stop"] = result["frames"]
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await asyncio.wait(tasks, timeout=10)
+    return videos, sses, latencies, elapsed, peak_threads, peak_rss
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", required=True, help="video file standing in for the camera")
+    parser.add_argument("--server", choices=list(SERVERS), default="asgi")
+    parser.add_argument("--port", type=int, default=5700)
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--streams", type=int, default=200, help="video_feed connections")
+    parser.add_argument("--slow", type=float, default=0.25, help="share of video connections that stall")
+    parser.add_argument("--sse", type=int, default=200, help="stats_stream connections")
+    parser.add_argument("--duration", type=float, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        database = os.path.join(workdir, "bench.db")
+        init_db(database)
+        env = dict(os.environ, DATABASE_PATH=database, CAMERA_SOURCE=os.path.abspath(args.source),
+                   SESSION_STORE=f"sqlite:{os.path.join(workdir, 'sessions.db')}")
+        server = subprocess.Popen([sys.executable, *SERVERS[args.server], str(args.port)], env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            for _ in range(100):
+                try:
+                    request(args.port, "GET", "/login")
+                    break
+                except OSError:
+                    time.sleep(0.2)
+            sessions = [start_session(args.port, i) for i in range(args.sessions)]
+            idle_threads, idle_rss = server_usage(server.pid)
+            videos, sses, latencies, elapsed, threads, rss = asyncio.run(load(args.port, sessions, args, server.pid))
+        finally:
+            server.terminate()
+            server.wait(20)
+
+    fast = [v["frames_at_stop"] / elapsed for v in videos if v["open"] and not v["slow"]]
+    slow = [v["frames_at_stop"] / elapsed for v in videos if v["open"] and v["slow"]]
+    served = [v for v in videos if v["open"] and v["frames_at_stop"]]
+    print(f"{args.server}: {args.sessions} sessions, {args.streams} video + {args.sse} SSE connections, "
+          f"{elapsed:.0f}s, {os.cpu_count()} CPUs")
+    print(f"  video: {sum(v['open'] for v in videos)}/{args.streams} open, {len(served)} got frames; "
+          f"fps per connection fast {np.median(fast) if fast else 0:.1f} (min {min(fast, default=0):.1f}), "
+          f"slow {np.median(slow) if slow else 0:.1f}")
+    print(f"  sse:   {sum(s['open'] for s in sses)}/{args.sse} open, "
+          f"{sum(s['events'] > 0 for s in sses)} got events, {sum(s['events'] for s in sses)} events")
+    finite = [t for t in latencies if t != float("inf")]
+    if finite:
+        print(f"  /get_stats: {len(finite)}/{len(latencies)} answered, p50 {np.percentile(finite, 50) * 1000:.0f} ms, "
+              f"p95 {np.percentile(finite, 95) * 1000:.0f} ms")
+    else:
+        print(f"  /get_stats: 0/{len(latencies)} answered")
+    print(f"  server: {idle_threads} -> {threads} threads, {idle_rss:.0f} -> {rss:.0f} MB RSS")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Load test for concurrent logins.
+
+Serves the app from a scratch database and hammers /login from many client
+threads while a probe thread runs a fixed per-frame image workload, standing
+in for a video stream. Runs it twice:
+  baseline: a new connection per request and hashing on the request thread
+  pooled:   the connection pool and the bounded password hasher
+and reports login throughput / latency and the probe's frame times.
+Also times the user lookup alone (connect + SELECT * + close vs pooled).
+
+    python bench_auth.py
+    python bench_auth.py --clients 32 --seconds 10
+"""
+import argparse
+import http.client
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.parse
+
+import cv2
+import numpy as np
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_PATH"] = os.path.join(_tmp.name, "bench.db")
+
+from init_db import init_db
+import app as app_module
+from utils.db import Database
+from utils.password_hasher import PasswordHasher
+from werkzeug.serving import make_server
+
+USERS = 50
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else float("nan")
+
+
+def login(port, username):
+    body = urllib.parse.urlencode({"username": username, "password": "secret"})
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    conn.request("POST", "/login", body, {"Content-Type": "application/x-www-form-urlencoded"})
+    status = conn.getresponse().status
+    conn.close()
+    return status
+
+
+def probe(stop, frame_times):
+    """Blur + JPEG encode of a 640x480 frame, about what a stream does per frame"""
+    frame = np.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    while not stop.is_set():
+        start = time.perf_counter()
+        cv2.imencode(".jpg", cv2.GaussianBlur(frame, (9, 9), 0))
+        frame_times.append(time.perf_counter() - start)
+        time.sleep(1 / 30)
+
+
+def storm(port, clients, seconds):
+    latencies, statuses = [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(i):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            status = login(port, f"user{(i * 7 + len(latencies)) % USERS}")
+            with lock:
+                latencies.append(time.perf_counter() - start)
+                statuses.append(status)
+
+    stop, frame_times = threading.Event(), []
+    probe_thread = threading.Thread(target=probe, args=(stop, frame_times))
+    probe_thread.start()
+    time.sleep(0.5)
+    idle_frames = list(frame_times)
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stop.set()
+    probe_thread.join()
+    return latencies, statuses, frame_times[len(idle_frames):], idle_frames
+
+
+def lookup_cost(path, count=2000):
+    start = time.perf_counter()
+    for i in range(count):
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        conn.execute("SELECT * FROM users WHERE username = ?", (f"user{i % USERS}",)).fetchone()
+        conn.close()
+    fresh = (time.perf_counter() - start) / count
+    db = Database(path)
+    start = time.perf_counter()
+    for i in range(count):
+        with db.connection() as conn:
+            conn.execute("SELECT id, username, password FROM users WHERE username = ?",
+                         (f"user{i % USERS}",)).fetchone()
+    pooled = (time.perf_counter() - start) / count
+    db.close()
+    return fresh * 1e6, pooled * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=8)
+    parser.add_argument("--hash-workers", type=int, default=1)
+    args = parser.parse_args()
+
+    path = os.environ["DATABASE_PATH"]
+    init_db(path)
+    setup = PasswordHasher(max_workers=0)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany("INSERT INTO users (username, number, password) VALUES (?, ?, ?)",
+                         [(f"user{i}", "0", setup.hash("secret")) for i in range(USERS)])
+    conn.close()
+
+    fresh_us, pooled_us = lookup_cost(path)
+    print(f"user lookup: {fresh_us:.0f} us connect + SELECT * + close, {pooled_us:.0f} us pooled "
+          f"({fresh_us / pooled_us:.1f}x)\n")
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # No per-request log lines
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    modes = [
+        ("baseline", Database(path, max_idle=0, pragmas=()), PasswordHasher(max_workers=0)),
+        ("pooled", Database(path), PasswordHasher(max_workers=args.hash_workers,
+                                                  max_pending=args.clients * 2)),
+    ]
+    print(f"{args.clients} clients for {args.seconds:.0f}s on {os.cpu_count()} CPUs")
+    print(f"{'mode':<10}{'logins/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'errors':>8}"
+          f"{'frame p50':>11}{'frame p95':>11}{'idle p95':>10}")
+    for name, db, hasher in modes:
+        app_module.db, app_module.password_hasher = db, hasher
+        latencies, statuses, frames, idle = storm(server.server_port, args.clients, args.seconds)
+        errors = sum(status >= 400 for status in statuses)
+        print(f"{name:<10}{len(latencies) / args.seconds:>10.1f}{percentile(latencies, 50):>9.0f}"
+              f"{percentile(latencies, 95):>9.0f}{errors:>8}{percentile(frames, 50):>11.1f}"
+              f"{percentile(frames, 95):>11.1f}{percentile(idle, 95):>10.1f}")
+        hasher.shutdown()
+        db.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
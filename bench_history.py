@@ -0,0 +1,130 @@
+"""Benchmark the workout history / trends queries as the workouts table grows.
+
+Seeds temporary databases with synthetic workouts spread over many users and
+two years, then times, per user:
+  - the indexed queries behind /api/history and /api/trends
+  - the same questions against the plain schema (no index, no rollups):
+    ORDER BY ... LIMIT and GROUP BY over the user's rows
+
+    python bench_history.py
+    python bench_history.py --rows 10000 100000 1000000 --users 2000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from init_db import init_db
+from utils.workout_history import history_page, trends
+from utils.workout_writer import EXERCISE_METS
+
+PLAIN_SCHEMA = """
+    CREATE TABLE workouts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        exercise_type TEXT NOT NULL,
+        duration_seconds INTEGER,
+        reps_completed INTEGER,
+        calories_burned REAL,
+        performed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def synthetic_rows(count, users, seed=0):
+    rng = random.Random(seed)
+    exercises = list(EXERCISE_METS)
+    start = time.mktime((2024, 1, 1, 0, 0, 0, 0, 0, -1))
+    for _ in range(count):
+        performed_at = start + rng.random() * 730 * 86400
+        duration = rng.randint(30, 1800)
+        yield (rng.randint(1, users), rng.choice(exercises), duration, rng.randint(0, 60),
+               duration * 0.1, time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(performed_at)))
+
+
+def seed(path, count, users, indexed):
+    if indexed:
+        init_db(path)
+    conn = sqlite3.connect(path)
+    if not indexed:
+        conn.execute(PLAIN_SCHEMA)
+    with conn:
+        conn.executemany(
+            "INSERT INTO workouts (user_id, exercise_type, duration_seconds, reps_completed, "
+            "calories_burned, performed_at) VALUES (?, ?, ?, ?, ?, ?)",
+            synthetic_rows(count, users))
+    return conn
+
+
+def plain_history(conn, user_id, page):
+    return conn.execute(
+        "SELECT id, exercise_type, duration_seconds, reps_completed, calories_burned, performed_at "
+        "FROM workouts WHERE user_id = ? ORDER BY performed_at DESC, id DESC LIMIT 20 OFFSET ?",
+        (user_id, page * 20)).fetchall()
+
+
+def plain_trends(conn, user_id, period):
+    start = "date(performed_at)" if period == "day" else "date(performed_at, 'weekday 0', '-6 days')"
+    return conn.execute(
+        f"SELECT {start} AS s, COUNT(*), SUM(reps_completed), SUM(duration_seconds), "
+        "SUM(calories_burned) FROM workouts WHERE user_id = ? GROUP BY s ORDER BY s DESC LIMIT 30",
+        (user_id,)).fetchall()
+
+
+def indexed_deep_page(conn, user_id, page):
+    result = history_page(conn, user_id)
+    for _ in range(page):
+        if not result["next_cursor"]:
+            break
+        result = history_page(conn, user_id, cursor=result["next_cursor"])
+    return result
+
+
+def measure(query, user_ids):
+    start = time.perf_counter()
+    for user_id in user_ids:
+        query(user_id)
+    return (time.perf_counter() - start) / len(user_ids) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 500000])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    cases = [
+        ("history, first page", lambda c, u: history_page(c, u), lambda c, u: plain_history(c, u, 0)),
+        ("history, 5th page", lambda c, u: indexed_deep_page(c, u, 4), lambda c, u: plain_history(c, u, 4)),
+        ("trends, 30 days", lambda c, u: trends(c, u, "day"), lambda c, u: plain_trends(c, u, "day")),
+        ("trends, 30 weeks", lambda c, u: trends(c, u, "week"), lambda c, u: plain_trends(c, u, "week")),
+    ]
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in args.rows:
+            indexed_path = os.path.join(tmp, f"indexed-{count}.db")
+            plain_path = os.path.join(tmp, f"plain-{count}.db")
+            start = time.perf_counter()
+            indexed = seed(indexed_path, count, args.users, indexed=True)
+            seed_indexed = time.perf_counter() - start
+            start = time.perf_counter()
+            plain = seed(plain_path, count, args.users, indexed=False)
+            seed_plain = time.perf_counter() - start
+            user_ids = [rng.randint(1, args.users) for _ in range(args.queries)]
+
+            print(f"\n{count} workouts, {args.users} users (insert: {seed_plain / count * 1e6:.1f} us/row plain, "
+                  f"{seed_indexed / count * 1e6:.1f} us/row with index + rollups)")
+            print(f"{'query':<22}{'plain ms':>10}{'indexed ms':>12}{'speedup':>9}")
+            for name, fast, slow in cases:
+                slow_ms = measure(lambda u: slow(plain, u), user_ids)
+                fast_ms = measure(lambda u: fast(indexed, u), user_ids)
+                print(f"{name:<22}{slow_ms:>10.3f}{fast_ms:>12.3f}{slow_ms / fast_ms:>8.0f}x")
+            indexed.close()
+            plain.close()
+
+
+if __name__ == "__main__":
+    main()
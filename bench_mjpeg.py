@@ -0,0 +1,98 @@
+"""Benchmark the MJPEG encoding path of video_feed.
+
+Compares the old path (cv2.imencode at default quality, tobytes() and `+`
+concatenation) with MJPEGEncoder at a few quality / width settings, and
+reports encode time per frame and bytes per frame.
+
+    python bench_mjpeg.py
+    python bench_mjpeg.py --clip recordings/squat.mp4 --frames 300
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from utils.camera_registry import VideoFileSource
+from utils.mjpeg import MJPEGEncoder
+
+
+def synthetic_frames(count, width=640, height=480):
+    """Smooth gradient with a moving figure, roughly as compressible as a webcam image"""
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    background = np.dstack([(x + y) / 2, np.broadcast_to(x, (height, width)),
+                            np.broadcast_to(y, (height, width))]).astype(np.uint8)
+    rng = np.random.default_rng(0)
+    frames = []
+    for i in range(count):
+        frame = background.copy()
+        cx = 150 + (i * 5) % 340
+        cv2.circle(frame, (cx, 140), 35, (40, 60, 200), -1)
+        cv2.rectangle(frame, (cx - 40, 180), (cx + 40, 380), (90, 90, 90), -1)
+        noise = rng.integers(-6, 7, frame.shape, dtype=np.int16)  # Sensor noise
+        frames.append(np.clip(frame + noise, 0, 255).astype(np.uint8))
+    return frames
+
+
+def clip_frames(path, count):
+    source = VideoFileSource(path, realtime=False)
+    frames = []
+    while len(frames) < count:
+        ret, frame = source.read()
+        if not ret:
+            break
+        frames.append(frame)
+    source.release()
+    return frames
+
+
+def baseline_chunk(frame):
+    ret, buffer = cv2.imencode('.jpg', frame)
+    frame_bytes = buffer.tobytes()
+    return (b'--frame\r\n'
+            b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+
+
+def measure(encode, frames, repeat):
+    total_bytes = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for frame in frames:
+            total_bytes += len(encode(frame))
+    elapsed = time.perf_counter() - start
+    count = len(frames) * repeat
+    return elapsed / count * 1000, total_bytes / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clip", help="recorded video to use instead of synthetic frames")
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    frames = clip_frames(args.clip, args.frames) if args.clip else synthetic_frames(args.frames)
+    if not frames:
+        print("❌ No frames to encode")
+        return
+    height, width = frames[0].shape[:2]
+    print(f"{len(frames)} frames of {width}x{height}, {args.repeat} passes\n")
+
+    cases = [("baseline (q95, tobytes + concat)", baseline_chunk)]
+    for quality, out_width in [(95, None), (80, None), (70, None), (80, 480), (70, 320)]:
+        encoder = MJPEGEncoder(quality=quality, width=out_width)
+        cases.append((f"MJPEGEncoder q{quality} {out_width or width}px", encoder.encode))
+
+    base_ms = base_bytes = None
+    print(f"{'path':<36}{'ms/frame':>10}{'KB/frame':>10}{'CPU':>8}{'bytes':>8}")
+    for name, encode in cases:
+        encode(frames[0])  # Warm up
+        ms, size = measure(encode, frames, args.repeat)
+        if base_ms is None:
+            base_ms, base_bytes = ms, size
+        print(f"{name:<36}{ms:>10.2f}{size / 1024:>10.1f}{ms / base_ms - 1:>+8.0%}{size / base_bytes - 1:>+8.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Cost per person: one multi-person stream vs a separate stream per person.
+
+Replays a clip through both setups for 1, 2, 4 ... people and reports the
+processing time per frame and per person:
+  separate: every person has their own stream, so each frame is converted,
+            run through Pose, drawn and JPEG-encoded once per person
+  shared:   one MultiPersonStage with a zone per person; each frame is cut
+            into one crop per zone, the crops go through the pool together,
+            and the frame is drawn and encoded once
+Use a recording of the group (people side by side) for realistic numbers;
+on a clip with nobody in it Pose stops at its detector and the model cost
+is understated for both setups.
+
+    python bench_multi_person.py --clip recordings/group.mp4
+    python bench_multi_person.py --clip class.avi --people 1 3 6 --frames 60
+"""
+import argparse
+import time
+
+import cv2
+
+from utils.camera_registry import VideoFileSource
+from utils.exercise_logic import ExerciseState
+from utils.mjpeg import MJPEGEncoder
+from utils.multi_person import MultiPersonStage, column_zones
+from utils.overlay import OverlayRenderer
+from utils.pose_pool import PosePool
+
+STATS = {"reps": 0, "time": 0, "feedback": "Start position", "feedback_class": "neutral"}
+
+
+def clip_frames(path, count, width):
+    source = VideoFileSource(path, realtime=False)
+    frames = []
+    while len(frames) < count:
+        ok, frame = source.read()
+        if not ok:
+            break
+        height = round(frame.shape[0] * width / frame.shape[1])
+        frames.append(cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA))
+    source.release()
+    return frames
+
+
+def separate(frames, people, pool, renderer):
+    encoders = [MJPEGEncoder() for _ in range(people)]
+    start = time.perf_counter()
+    for i, frame in enumerate(frames):
+        for person, encoder in enumerate(encoders):
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            pool.process(f"separate-{person}", rgb, i / 30)
+            encoder.encode(renderer.draw(frame.copy(), None, STATS))
+    return time.perf_counter() - start
+
+
+def shared(frames, people, pool, renderer):
+    stage = MultiPersonStage(None, pool, "shared", lambda track, points, timestamp: None, ExerciseState,
+                             zones=column_zones(people))
+    encoder = MJPEGEncoder()
+    start = time.perf_counter()
+    for i, frame in enumerate(frames):
+        stage.step(frame, i / 30)
+        encoder.encode(renderer.draw_tracks(frame.copy(), stage.published))
+    elapsed = time.perf_counter() - start
+    stage.stop()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clip", required=True)
+    parser.add_argument("--people", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--frames", type=int, default=60)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--workers", type=int, default=1, help="pose pool workers")
+    args = parser.parse_args()
+
+    frames = clip_frames(args.clip, args.frames, args.width)
+    pool = PosePool(num_workers=args.workers, fallback_complexity=1)
+    pool.warm_up()
+    renderer = OverlayRenderer()
+    separate(frames[:5], 1, pool, renderer)  # Warm the caches
+
+    print(f"{len(frames)} frames at {frames[0].shape[1]}x{frames[0].shape[0]}, {args.workers} pose workers")
+    print(f"{'people':>6}{'separate ms/frame':>19}{'shared ms/frame':>17}{'ms/person':>11}{'shared / separate':>19}")
+    for people in args.people:
+        apart = separate(frames, people, pool, renderer) / len(frames)
+        together = shared(frames, people, pool, renderer) / len(frames)
+        print(f"{people:>6}{apart * 1000:>19.1f}{together * 1000:>17.1f}"
+              f"{together * 1000 / people:>11.1f}{together / apart:>18.2f}x")
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""Per-stage latency benchmark for the video_feed pipeline.
+
+Runs the per-frame stages (capture, BGR->RGB, pose.process, exercise logic
+under a shared lock, skeleton overlay, stats text, imencode) for 1, 4 and 16
+concurrent sessions, headless on CPU, and reports p50/p95/p99 latency per
+stage plus frames per second. Results are saved as JSON so runs from
+different commits can be compared.
+
+    python bench_pipeline.py --output bench.json
+    python bench_pipeline.py --clip recordings/squat.mp4 --sessions 1 4 --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+
+import cv2
+import mediapipe as mp
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+
+from utils.camera_registry import VideoFileSource
+from utils.exercise_logic import ExerciseState, get_exercise_function
+from utils.angle_utils import landmarks_to_array
+from utils.overlay import OverlayRenderer
+from utils.pose_pool import PosePool
+
+STAGES = ["capture", "bgr2rgb", "pose_process", "lock_wait", "logic",
+          "draw_landmarks", "put_text", "imencode", "total"]
+
+# Roughly a person standing side-on, used when pose finds nobody in the frame
+# so the logic and drawing stages still get measured on synthetic input
+STANDING_POSE = {
+    11: (0.50, 0.30), 12: (0.52, 0.30), 13: (0.50, 0.45), 14: (0.52, 0.45),
+    15: (0.50, 0.58), 16: (0.52, 0.58), 23: (0.50, 0.60), 24: (0.52, 0.60),
+    25: (0.50, 0.75), 26: (0.52, 0.75), 27: (0.50, 0.90), 28: (0.52, 0.90),
+}
+
+
+def standing_landmarks():
+    landmarks = landmark_pb2.NormalizedLandmarkList()
+    for i in range(33):
+        x, y = STANDING_POSE.get(i, (0.5, 0.2))
+        landmarks.landmark.add(x=x, y=y, z=0.0, visibility=1.0)
+    return landmarks
+
+
+class SyntheticSource:
+    """Endless moving test pattern frames at a fixed size"""
+
+    def __init__(self, width=640, height=480, seed=0):
+        rng = np.random.default_rng(seed)
+        self.background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+        self.count = 0
+
+    def read(self):
+        frame = self.background.copy()
+        x = 100 + (self.count * 7) % 400
+        cv2.circle(frame, (x, 240), 60, (0, 0, 255), -1)
+        self.count += 1
+        return True, frame
+
+    def release(self):
+        pass
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    values = np.array(samples) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3),
+            "p99_ms": round(float(p99), 3), "mean_ms": round(float(values.mean()), 3),
+            "n": len(samples)}
+
+
+def run_session(source, pool, stream_id, logic_function, lock, frames, samples, counters):
+    renderer = OverlayRenderer()
+    state = ExerciseState()
+    fallback = standing_landmarks()
+    timings = {stage: [] for stage in STAGES}
+    detected = 0
+
+    for _ in range(frames):
+        frame_start = t = time.perf_counter()
+        ret, frame = source.read()
+        if not ret:
+            break
+        now = time.perf_counter(); timings["capture"].append(now - t); t = now
+
+        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        now = time.perf_counter(); timings["bgr2rgb"].append(now - t); t = now
+
+        results = pool.process(stream_id, frame_rgb, timeout=10)
+        now = time.perf_counter(); timings["pose_process"].append(now - t); t = now
+
+        if results is not None and results.pose_landmarks:
+            pose_landmarks = results.pose_landmarks
+            detected += 1
+        else:
+            pose_landmarks = fallback
+
+        points = landmarks_to_array(pose_landmarks.landmark, with_visibility=True)
+        lock.acquire()
+        now = time.perf_counter(); timings["lock_wait"].append(now - t); t = now
+        try:
+            state = logic_function(points, state)
+        finally:
+            lock.release()
+        now = time.perf_counter(); timings["logic"].append(now - t); t = now
+
+        renderer.draw_skeleton(frame, points)
+        now = time.perf_counter(); timings["draw_landmarks"].append(now - t); t = now
+
+        renderer.draw_stats(frame, state.snapshot())
+        now = time.perf_counter(); timings["put_text"].append(now - t); t = now
+
+        cv2.imencode('.jpg', frame)
+        now = time.perf_counter(); timings["imencode"].append(now - t)
+        timings["total"].append(now - frame_start)
+
+    pool.close_stream(stream_id)
+    with lock:
+        for stage, values in timings.items():
+            samples[stage].extend(values)
+        counters["frames"] += len(timings["total"])
+        counters["detected"] += detected
+
+
+def run(sessions, args):
+    make_source = (lambda i: VideoFileSource(args.clip, realtime=False)) if args.clip \
+        else (lambda i: SyntheticSource(args.width, args.height, seed=i))
+    logic_function = get_exercise_function(args.exercise)
+    pool = PosePool(num_workers=args.workers, model_complexity=args.model_complexity,
+                    fallback_complexity=args.model_complexity)
+    lock = threading.Lock()  # Stands in for exercise_states_lock
+    samples = {stage: [] for stage in STAGES}
+    counters = {"frames": 0, "detected": 0}
+
+    # Warm up the pool's models outside the measurement
+    pool.process("warmup", cv2.cvtColor(SyntheticSource(args.width, args.height).read()[1],
+                                        cv2.COLOR_BGR2RGB), timeout=60)
+    pool.close_stream("warmup")
+
+    sources = [make_source(i) for i in range(sessions)]
+    threads = [threading.Thread(target=run_session,
+                                args=(sources[i], pool, f"bench-{i}", logic_function, lock,
+                                      args.frames, samples, counters))
+               for i in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    pool.shutdown()
+    for source in sources:
+        source.release()
+
+    return {
+        "sessions": sessions,
+        "frames": counters["frames"],
+        "detection_rate": round(counters["detected"] / max(1, counters["frames"]), 3),
+        "seconds": round(elapsed, 3),
+        "fps_total": round(counters["frames"] / elapsed, 2),
+        "fps_per_session": round(counters["frames"] / elapsed / sessions, 2),
+        "stages": {stage: percentiles(values) for stage, values in samples.items()},
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_run(result, baseline=None):
+    print(f"\n== {result['sessions']} session(s): {result['fps_total']} fps total, "
+          f"{result['fps_per_session']} fps/session, detection {result['detection_rate']:.0%}")
+    print(f"{'stage':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}" + ("   p50 vs baseline" if baseline else ""))
+    for stage, stats in result["stages"].items():
+        if stats is None:
+            continue
+        line = f"{stage:<16}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+        old = baseline and baseline["stages"].get(stage)
+        if old and old["p50_ms"]:
+            line += f"   {(stats['p50_ms'] / old['p50_ms'] - 1) * 100:+.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--frames", type=int, default=100, help="frames per session")
+    parser.add_argument("--clip", help="recorded video to use instead of synthetic frames")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--exercise", default="squat")
+    parser.add_argument("--workers", type=int, default=None, help="PosePool workers (default: per core)")
+    parser.add_argument("--model-complexity", type=int, choices=[0, 1, 2], default=1)
+    parser.add_argument("--output", default="bench_pipeline.json", help="where to save JSON results")
+    parser.add_argument("--compare", help="previous results JSON to compare p50s against")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {run["sessions"]: run for run in json.load(f)["runs"]}
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "opencv": cv2.__version__,
+            "mediapipe": getattr(mp, "__version__", None),
+            "source": args.clip or f"synthetic {args.width}x{args.height}",
+            "frames_per_session": args.frames,
+            "exercise": args.exercise,
+        },
+        "runs": [],
+    }
+    for sessions in args.sessions:
+        result = run(sessions, args)
+        results["runs"].append(result)
+        print_run(result, baseline.get(sessions))
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Throughput of serve.py as worker processes are added.
+
+Starts serve.py with 1, 2, ... workers on a scratch database, logs in one
+user per client, and has every client upload batches of landmark records
+to /landmarks/squat (the exercise logic is the CPU-bound part of a request)
+through the affinity proxy. Reports uploads and frames per second per
+worker count; on N free cores N workers should approach N times one.
+
+    python bench_serve.py
+    python bench_serve.py --workers 1 2 4 8 --clients 32
+"""
+import argparse
+import http.client
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+from werkzeug.security import generate_password_hash
+
+from init_db import init_db
+
+RECORD = np.dtype([("captured_at", "<f8"), ("landmarks", "<f4", (33, 4))])
+
+
+class Client:
+    def __init__(self, port):
+        self.port = port
+        self.cookies = {}
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{name}={value}" for name, value in self.cookies.items())
+        if isinstance(body, dict):
+            body = urllib.parse.urlencode(body)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=120)
+        conn.request(method, path, body, headers)
+        response = conn.getresponse()
+        response.read()
+        for name, value in response.getheaders():
+            if name.lower() == "set-cookie":
+                key, _, rest = value.partition("=")
+                self.cookies[key] = rest.split(";", 1)[0]
+        conn.close()
+        return response.status
+
+
+def wait_until_up(port, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if Client(port).request("GET", "/login") == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def run(workers, clients, seconds, batch, port, workdir):
+    env = dict(os.environ, DATABASE_PATH=os.path.join(workdir, "bench.db"),
+               SESSION_STORE="sqlite:" + os.path.join(workdir, f"sessions-{workers}.db"))
+    server = subprocess.Popen([sys.executable, "serve.py", "--workers", str(workers), "--host", "127.0.0.1",
+                               "--port", str(port)], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        # Every worker has to be up, not just the first one to answer
+        for _ in range(workers * 2):
+            if not wait_until_up(port):
+                print("❌ serve.py did not come up")
+                return None
+        sessions = []
+        for i in range(clients):
+            client = Client(port)
+            client.request("POST", "/login", {"username": f"bench{i}", "password": "secret"})
+            client.request("GET", "/exercise/squat")
+            sessions.append(client)
+
+        rng = np.random.default_rng(0)
+        records = np.zeros(batch, dtype=RECORD)
+        records["landmarks"] = rng.random((batch, 33, 4), dtype=np.float32)
+        counts = [0] * clients
+        deadline = time.perf_counter() + seconds
+
+        def upload(i):
+            payload = records.copy()
+            while time.perf_counter() < deadline:
+                payload["captured_at"] = time.time() + np.arange(batch) / 30
+                if sessions[i].request("POST", "/landmarks/squat", payload.tobytes(),
+                                       {"Content-Type": "application/octet-stream"}) == 200:
+                    counts[i] += 1
+
+        threads = [threading.Thread(target=upload, args=(i,)) for i in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        return sum(counts) / elapsed
+    finally:
+        server.terminate()
+        server.wait(30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--batch", type=int, default=60, help="landmark records per upload")
+    parser.add_argument("--port", type=int, default=5700)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "bench.db")
+        init_db(path)
+        password = generate_password_hash("secret")
+        conn = sqlite3.connect(path)
+        with conn:
+            conn.executemany("INSERT INTO users (username, number, password) VALUES (?, ?, ?)",
+                             [(f"bench{i}", "0", password) for i in range(args.clients)])
+        conn.close()
+
+        print(f"{args.clients} clients, {args.batch} frames per upload, {os.cpu_count()} CPUs")
+        print(f"{'workers':>8}{'uploads/s':>11}{'frames/s':>10}{'scaling':>9}")
+        base = None
+        for workers in args.workers:
+            rate = run(workers, args.clients, args.seconds, args.batch, args.port, workdir)
+            if rate is None:
+                return
+            base = base or rate
+            print(f"{workers:>8}{rate:>11.1f}{rate * args.batch:>10.0f}{rate / base:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Startup time and time to first frame of the app.
+
+Boots the app in a fresh process per run, on a scratch database, in three modes:
+  eager: cv2 / mediapipe and the video stack loaded at import (the old behaviour)
+  lazy:  the video stack loaded by the first video_feed request
+  warm:  lazy, plus POSE_WARMUP=1 loading and running the pose models at boot
+and reports how long `import app` takes, whether cv2 / mediapipe got loaded
+by it, and, for a stream opened --idle seconds after boot, the time from the
+request to its first MJPEG chunk and to its first pose result.
+
+    python bench_startup.py --source recordings/squat.mp4
+    python bench_startup.py --source clip.avi --runs 5 --idle 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from init_db import init_db
+
+CHILD = r"""
+import json, sys, time
+start = time.perf_counter()
+eager, idle = sys.argv[1] == "1", float(sys.argv[2])
+
+def emit(event, **extra):
+    print(json.dumps(dict(extra, event=event, at=time.perf_counter() - start)), flush=True)
+
+import app
+emit("imported", cv2="cv2" in sys.modules, mediapipe="mediapipe" in sys.modules)
+if eager:
+    import cv2, mediapipe
+    app.video_stack()
+    emit("loaded")
+
+from utils.pose_pool import PosePool
+process = PosePool.process
+def first_result(self, *args, **kwargs):
+    result = process(self, *args, **kwargs)
+    if result is not None and not getattr(first_result, "seen", False):
+        first_result.seen = True
+        emit("first_result")
+    return result
+PosePool.process = first_result
+
+time.sleep(idle)
+client = app.app.test_client()
+with client.session_transaction() as s:
+    s["user"], s["user_id"], s["session_id"] = "bench", 1, "bench"
+client.get("/exercise/squat")
+emit("request")
+response = client.get("/video_feed/squat/bench", buffered=False)
+for i, chunk in enumerate(response.response):
+    if i == 0:
+        emit("first_chunk")
+    if getattr(first_result, "seen", False) or time.perf_counter() - start > idle + 120:
+        break
+response.close()
+emit("done")
+"""
+
+MODES = {
+    "eager": {"eager": "1"},
+    "lazy": {"eager": "0"},
+    "warm": {"eager": "0", "POSE_WARMUP": "1"},
+}
+
+
+def run(mode, source, idle, workdir):
+    settings = dict(MODES[mode])
+    eager = settings.pop("eager")
+    env = dict(os.environ, DATABASE_PATH=os.path.join(workdir, "bench.db"), CAMERA_SOURCE=source,
+               POSE_WORKERS="1", **settings)
+    output = subprocess.run([sys.executable, "-c", CHILD, eager, str(idle)], env=env,
+                            capture_output=True, text=True, timeout=idle + 300).stdout
+    events = {}
+    for line in output.splitlines():
+        if line.startswith("{"):
+            event = json.loads(line)
+            events[event["event"]] = event
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", required=True, help="video file standing in for the camera")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--idle", type=float, default=5, help="seconds between boot and the first stream")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        init_db(os.path.join(workdir, "bench.db"))
+        print(f"median of {args.runs} runs, first stream {args.idle:.0f}s after boot, {os.cpu_count()} CPUs")
+        print(f"{'mode':<7}{'import ms':>10}{'cv2/mp':>8}{'boot ms':>9}{'1st chunk ms':>14}{'1st pose ms':>13}")
+        for mode in args.modes:
+            rows = []
+            for _ in range(args.runs):
+                events = run(mode, os.path.abspath(args.source), args.idle, workdir)
+                if "request" not in events or "first_result" not in events:
+                    print(f"❌ {mode}: the stream produced no pose result")
+                    return
+                request = events["request"]["at"]
+                rows.append((events["imported"]["at"], events.get("loaded", events["imported"])["at"],
+                             events["first_chunk"]["at"] - request, events["first_result"]["at"] - request))
+            imported = events["imported"]
+            heavy = f"{'y' if imported['cv2'] else 'n'}/{'y' if imported['mediapipe'] else 'n'}"
+            import_s, boot_s, chunk_s, pose_s = np.median(rows, axis=0)
+            print(f"{mode:<7}{import_s * 1000:>10.0f}{heavy:>8}{boot_s * 1000:>9.0f}"
+                  f"{chunk_s * 1000:>14.0f}{pose_s * 1000:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
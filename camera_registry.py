@@ -0,0 +1,193 @@
+import threading
+import time
+
+import cv2
+
+from utils.capture import CaptureThread
+
+
+# ===== FAKE CAMERA =====
+
+class VideoFileSource:
+    """cv2.VideoCapture stand-in that plays a video file as if it were a camera.
+
+    Loops at the end of the file and paces reads to the file's frame rate, so
+    streams, tests and benchmarks behave like they would on a real webcam.
+    """
+
+    def __init__(self, path, loop=True, realtime=True):
+        self.path = path
+        self.loop = loop
+        self.realtime = realtime
+        self._cap = cv2.VideoCapture(path)
+        fps = self._cap.get(cv2.CAP_PROP_FPS) if self._cap.isOpened() else 0
+        self.frame_interval = 1.0 / fps if fps and fps > 0 else 1.0 / 30
+        self._next_frame_at = None
+
+    def isOpened(self):
+        return self._cap.isOpened()
+
+    def read(self, image=None):
+        if self.realtime:
+            now = time.monotonic()
+            if self._next_frame_at is not None and now < self._next_frame_at:
+                time.sleep(self._next_frame_at - now)
+            self._next_frame_at = max(now, self._next_frame_at or now) + self.frame_interval
+
+        ret, frame = self._cap.read(image)
+        if not ret and self.loop:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self._cap.read(image)
+        return ret, frame
+
+    def get(self, prop):
+        return self._cap.get(prop)
+
+    def release(self):
+        self._cap.release()
+
+
+# ===== CAMERA REGISTRY =====
+# One open capture per device for the whole process. Streams subscribe to the
+# device's CaptureThread ring buffer instead of opening the camera themselves.
+
+class CameraHandle:
+    def __init__(self, index, source, capture):
+        self.index = index
+        self.source = source
+        self.capture = capture
+        self.refcount = 0
+        self.close_timer = None
+
+    @property
+    def ring(self):
+        return self.capture.ring
+
+    @property
+    def alive(self):
+        return self.capture.running
+
+
+class CameraRegistry:
+    def __init__(self, indices=(0, 1, 2), idle_timeout=30.0, source_factory=None, slots=4):
+        """
+        indices:        device indices to probe, in order
+        idle_timeout:   seconds an unused device stays open for the next stream
+        source_factory: callable(index) -> cv2.VideoCapture-like (default cv2.VideoCapture)
+        """
+        self.indices = list(indices)
+        self.idle_timeout = idle_timeout
+        self.source_factory = source_factory or cv2.VideoCapture
+        self.slots = slots
+        self._handles = {}
+        self._working_index = None  # Last index that opened, probed first next time
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()  # One device probe at a time
+
+    def acquire(self, index=None):
+        """Subscribe to a camera, opening it if needed; returns a CameraHandle or None"""
+        with self._lock:
+            handle = self._find_open(index)
+            if handle is not None:
+                return self._subscribe(handle)
+
+        # Probing can take seconds per device; only other probes wait for it,
+        # not release() / stats() or streams on cameras that are already open
+        with self._probe_lock:
+            with self._lock:
+                handle = self._find_open(index)  # Opened by the probe we waited for
+                if handle is not None:
+                    return self._subscribe(handle)
+                candidates = self._candidates(index)
+            handle = self._open(candidates)
+            with self._lock:
+                if handle is None:
+                    if index is None:
+                        self._working_index = None
+                    return None
+                self._handles[handle.index] = handle
+                self._working_index = handle.index
+                return self._subscribe(handle)
+
+    def _subscribe(self, handle):
+        handle.refcount += 1
+        if handle.close_timer is not None:
+            handle.close_timer.cancel()
+            handle.close_timer = None
+        return handle
+
+    def release(self, handle):
+        """Unsubscribe; the device closes after idle_timeout with no subscribers"""
+        with self._lock:
+            handle.refcount = max(0, handle.refcount - 1)
+            if handle.refcount > 0 or handle.close_timer is not None:
+                return
+            if self.idle_timeout <= 0:
+                self._close(handle)
+                return
+            timer = threading.Timer(self.idle_timeout, self._close_if_idle)
+            timer.args = (handle, timer)
+            timer.daemon = True
+            handle.close_timer = timer
+            timer.start()
+
+    def close_all(self):
+        with self._lock:
+            for handle in list(self._handles.values()):
+                if handle.close_timer is not None:
+                    handle.close_timer.cancel()
+                self._close(handle)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "working_index": self._working_index,
+                "open": {index: h.refcount for index, h in self._handles.items()},
+            }
+
+    def _find_open(self, index):
+        candidates = [index] if index is not None else [self._working_index] + self.indices
+        for candidate in candidates:
+            handle = self._handles.get(candidate)
+            if handle is None:
+                continue
+            if handle.alive:
+                return handle
+            # Device went away (unplugged, end of file): forget it and reprobe
+            self._close(handle)
+        return None
+
+    def _candidates(self, index):
+        if index is not None:
+            return [index]
+        candidates = [i for i in [self._working_index] + self.indices if i is not None]
+        return list(dict.fromkeys(candidates))
+
+    def _open(self, candidates):
+        """Open the first candidate device that delivers frames (called without _lock)"""
+        for candidate in candidates:
+            source = self.source_factory(candidate)
+            if not source.isOpened():
+                source.release()
+                continue
+            capture = CaptureThread(source, self.slots, name=f"camera-{candidate}")
+            if not capture.start():
+                capture.stop()
+                source.release()
+                continue
+            return CameraHandle(candidate, source, capture)
+        return None
+
+    def _close_if_idle(self, handle, timer):
+        with self._lock:
+            if handle.close_timer is not timer:
+                return  # Cancelled, and maybe replaced, while this one waited for the lock
+            handle.close_timer = None
+            if handle.refcount == 0:
+                self._close(handle)
+
+    def _close(self, handle):
+        if self._handles.get(handle.index) is handle:
+            del self._handles[handle.index]
+        handle.capture.stop()
+        handle.source.release()
@@ -0,0 +1,177 @@
+import threading
+import time
+
+import numpy as np
+
+
+# ===== STAGE TIMING =====
+
+class StageTimer:
+    """Running timing stats for one pipeline stage (seconds in, milliseconds out)
+
+    Each sample is also observed on histogram (a metrics child) when given.
+    """
+
+    def __init__(self, smoothing=0.1, histogram=None):
+        self.smoothing = smoothing
+        self.histogram = histogram
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.avg = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        self.max = max(self.max, seconds)
+        if self.count == 1:
+            self.avg = seconds
+        else:
+            self.avg += self.smoothing * (seconds - self.avg)
+        if self.histogram is not None:
+            self.histogram.observe(seconds)
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "last_ms": round(self.last * 1000, 3),
+            "avg_ms": round(self.avg * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+# ===== LATEST-FRAME RING BUFFER =====
+
+class FrameRing:
+    """Preallocated ring of frames that always exposes the newest one.
+
+    One writer fills the next slot in place and publishes it; any number of
+    readers copy out the newest frame at their own pace, so a slow reader only
+    skips frames instead of holding up the camera.
+    """
+
+    def __init__(self, shape, slots=4, dtype=np.uint8):
+        self.slots = slots
+        self._frames = np.zeros((slots,) + tuple(shape), dtype=dtype)
+        self._timestamps = np.zeros(slots)
+        self._seq = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    @property
+    def shape(self):
+        return self._frames.shape[1:]
+
+    @property
+    def seq(self):
+        return self._seq
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def write_slot(self):
+        """The slot the writer fills next (never the one readers see as newest)"""
+        return self._frames[(self._seq + 1) % self.slots]
+
+    def publish(self, timestamp=None):
+        """Make the filled write slot the newest frame"""
+        with self._cond:
+            self._seq += 1
+            self._timestamps[self._seq % self.slots] = time.time() if timestamp is None else timestamp
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def latest(self, out=None, after_seq=0, timeout=None):
+        """Copy the newest frame newer than after_seq into out.
+
+        Returns (seq, timestamp, frame), or None on timeout or once the ring is
+        closed with nothing newer to read.
+        """
+        while True:
+            with self._cond:
+                if not self._cond.wait_for(lambda: self._closed or self._seq > after_seq, timeout):
+                    return None
+                if self._seq <= after_seq:
+                    return None
+                seq = self._seq
+                timestamp = float(self._timestamps[seq % self.slots])
+
+            if out is None:
+                out = np.empty(self.shape, dtype=self._frames.dtype)
+            np.copyto(out, self._frames[seq % self.slots])
+
+            # The writer only touches the slot after the newest one, so the copy
+            # is torn only if it lapped the whole ring meanwhile; retry then.
+            if self._seq - seq < self.slots - 1:
+                return seq, timestamp, out
+
+
+# ===== CAPTURE THREAD =====
+
+class CaptureThread:
+    """Reads a cv2.VideoCapture-like source on its own thread into a FrameRing"""
+
+    def __init__(self, cap, slots=4, name="capture"):
+        self.cap = cap
+        self.slots = slots
+        self.name = name
+        self.ring = None
+        self.timer = StageTimer()
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, timeout=5.0):
+        """Start reading; returns False if the source produced no first frame"""
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout)
+        return self.ring is not None and not self.ring.closed
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        if self.ring is not None:
+            self.ring.close()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        try:
+            start = time.perf_counter()
+            ret, frame = self.cap.read()
+            if not ret:
+                return
+            self.ring = FrameRing(frame.shape, self.slots, frame.dtype)
+            np.copyto(self.ring.write_slot(), frame)
+            self.ring.publish()
+            self.timer.record(time.perf_counter() - start)
+            self._ready.set()
+
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                slot = self.ring.write_slot()
+                ret, frame = self.cap.read(slot)
+                if not ret:
+                    break
+                if frame.ctypes.data != slot.ctypes.data:
+                    # Source allocated its own buffer (e.g. first read after a reopen)
+                    np.copyto(slot, frame)
+                self.ring.publish()
+                self.timer.record(time.perf_counter() - start)
+        except Exception as e:
+            print(f"❌ Error in camera capture: {e}")
+        finally:
+            if self.ring is not None:
+                self.ring.close()
+            self._ready.set()
@@ -0,0 +1,87 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+# ===== DATABASE CONNECTION POOL =====
+# Opening a SQLite connection means opening the file, reading and parsing the
+# schema and losing every prepared statement, so connections are kept open
+# and lent out instead. A request borrows one for the length of a `with`
+# block (one thread at a time, so sqlite3's thread check can be off) and
+# gives it back; each connection keeps its own prepared-statement cache and
+# page cache warm across requests. PRAGMAs are set once per connection.
+
+PRAGMAS = (
+    ("journal_mode", "WAL"),      # Readers don't block the writer or each other
+    ("synchronous", "NORMAL"),    # Safe with WAL, no fsync per commit
+    ("foreign_keys", "ON"),
+    ("busy_timeout", "5000"),     # Wait for a writer's lock instead of failing at once
+    ("cache_size", "-8000"),      # 8 MB page cache per connection
+    ("temp_store", "MEMORY"),
+    ("mmap_size", str(64 * 1024 * 1024)),
+)
+
+
+class Database:
+    def __init__(self, path, max_idle=8, cached_statements=256, pragmas=PRAGMAS):
+        """
+        path:              SQLite database file
+        max_idle:          connections kept open while nobody uses them
+        cached_statements: prepared statements cached per connection
+        """
+        self.path = path
+        self.max_idle = max_idle
+        self.cached_statements = cached_statements
+        self.pragmas = pragmas
+        self._idle = []
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas:
+            conn.execute(f"PRAGMA {name} = {value}")
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection: commits when the block succeeds, rolls back when it raises"""
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._open()
+        healthy = True
+        try:
+            with conn:
+                yield conn
+        except sqlite3.IntegrityError:
+            raise  # A constraint violation; the connection itself is fine
+        except sqlite3.Error:
+            healthy = False  # Don't hand a connection in an unknown state to the next request
+            raise
+        finally:
+            if healthy:
+                self._release(conn)
+            else:
+                conn.close()
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            return {"idle": len(self._idle), "opened": self.opened}
@@ -1,334 +1,355 @@
-import mediapipe as mp
-from utils.angle_utils import calculate_angle
-import time
-
-mp_pose = mp.solutions.pose
-
-# Shared variables (reps, feedback, etc.) for thread-safe usage (simplified for demo)
-import time
-
-class ExerciseState:
-    def __init__(self):
-        self.reps = 0
-        self.direction = None
-        self.feedback = "Start position"
-        self.feedback_class = "neutral"
-        self.current_time = 0
-        self.start_time = None
-        self.is_exercising = False  # Track if user is actively exercising
-        self.last_update_time = time.time()
-        self.prev_angle = None
-        self.prev_arm_angle = None
-        self.prev_left_angle = None
-        self.perfect_time = 0
-    
-    def update_time(self, is_active):
-        """Update the exercise duration timer only when actively exercising"""
-        current_time = time.time()
-        
-        if self.start_time is None:
-            self.start_time = current_time
-        
-        # Only count time when actively exercising
-        if is_active:
-            if not self.is_exercising:
-                # Just started exercising
-                self.is_exercising = True
-                self.last_update_time = current_time
-            else:
-                # Continue counting exercise time
-                elapsed = current_time - self.last_update_time
-                self.current_time += elapsed
-                self.last_update_time = current_time
-        else:
-            # Not actively exercising
-            self.is_exercising = False
-        
-        return self
-    
-    def reset(self):
-        """Reset all state variables"""
-        self.__init__()
-# ===== EXERCISE LOGIC FUNCTIONS =====
-# Each function takes (landmarks, state) and returns updated state.
-def squat_logic(landmarks, state):
-    hip = landmarks[mp_pose.PoseLandmark.LEFT_HIP.value]
-    knee = landmarks[mp_pose.PoseLandmark.LEFT_KNEE.value]
-    ankle = landmarks[mp_pose.PoseLandmark.LEFT_ANKLE.value]
-    
-    angle = calculate_angle(hip, knee, ankle)
-    
-    # Detect if user is actively exercising (knee bent - not standing straight)
-    is_active = angle < 160  # Considered active when not standing straight
-    
-    # Update time only when active
-    state.update_time(is_active)
-    
-    # Initialize prev_angle if None
-    if state.prev_angle is None:
-        state.prev_angle = angle
-    
-    # Squat rules
-    if angle > 160:
-        state.direction = "down"
-        state.feedback = "Stand straight. Ready to squat!"
-        state.feedback_class = "neutral"
-    
-    elif 130 < angle <= 160:
-        state.feedback = "Start lowering (aim for 90°)"
-        state.feedback_class = "warning"
-    
-    elif 80 <= angle <= 100:  # Ideal squat range
-        if state.direction == "down":
-            state.feedback = "Perfect depth! Push up now."
-            state.feedback_class = "correct"
-        else:
-            state.feedback = "Good form! Return to start."
-            state.feedback_class = "correct"
-    
-    elif angle < 80:  # Too deep
-        state.feedback = "Too deep! Raise slightly."
-        state.feedback_class = "error"
-    
-    else:  # Partial squat
-        state.feedback = "Go deeper! Aim for 90°."
-        state.feedback_class = "warning"
-    
-    # Count reps only when returning to standing after a good squat
-    if (angle > 160 and state.direction == "down" and 
-        state.prev_angle is not None and 80 <= state.prev_angle <= 100):
-        state.reps += 1
-        state.direction = "up"
-    
-    state.prev_angle = angle  # Store for next frame
-    return state
-
-
-
-def pushup_logic(landmarks, state):
-    # Key landmarks (using left side; mirror for right)
-    shoulder = landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value]
-    elbow = landmarks[mp_pose.PoseLandmark.LEFT_ELBOW.value]
-    wrist = landmarks[mp_pose.PoseLandmark.LEFT_WRIST.value]
-    hip = landmarks[mp_pose.PoseLandmark.LEFT_HIP.value]
-    
-    # Calculate angles
-    arm_angle = calculate_angle(shoulder, elbow, wrist)  # Elbow bend
-    body_angle = calculate_angle(shoulder, hip, wrist)   # Body alignment
-    
-    # Detect if user is actively exercising (elbow bent - not at top position)
-    is_active = arm_angle < 160  # Considered active when not at top position
-    
-    # Update time only when active
-    state.update_time(is_active)
-    
-    # Push-up rules
-    if arm_angle > 160:
-        state.direction = "down"
-        state.feedback = "Ready to lower (keep body straight!)"
-        state.feedback_class = "neutral"
-    
-    elif 90 <= arm_angle <= 120:  # Ideal lowering phase
-        if body_angle > 160:  # Body straight
-            state.feedback = "Lower slowly (good form!)"
-            state.feedback_class = "correct"
-        else:  # Sagging hips/arched back
-            state.feedback = "Keep body straight! Engage core."
-            state.feedback_class = "warning"
-    
-    elif arm_angle < 90:  # Push-up depth
-        if body_angle > 160:
-            state.feedback = "Perfect depth! Push up now."
-            state.feedback_class = "correct"
-        else:
-            state.feedback = "Fix posture before pushing up!"
-            state.feedback_class = "error"
-    
-    # Count reps only when returning to top with good form
-    if arm_angle > 160 and state.direction == "up" and state.prev_arm_angle < 90:
-        if body_angle > 160:  # Only count if body was straight
-            state.reps += 1
-        else:
-            state.feedback = "Rep discarded! Keep body straight."
-            state.feedback_class = "error"
-    
-    # Update state
-    state.prev_arm_angle = arm_angle
-    state.direction = "up" if arm_angle > 140 else "down"
-    return state
-
-
-
-
-
-def plank_logic(landmarks, state):
-    # Key landmarks (mid-shoulder, hip, and ankle for alignment)
-    shoulder = landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value]
-    hip = landmarks[mp_pose.PoseLandmark.LEFT_HIP.value]
-    ankle = landmarks[mp_pose.PoseLandmark.LEFT_ANKLE.value]
-    elbow = landmarks[mp_pose.PoseLandmark.LEFT_ELBOW.value]
-    
-    # Calculate alignment angles
-    body_angle = calculate_angle(shoulder, hip, ankle)  # Straight-line target: ~180°
-    hip_shoulder_dist = abs(hip.y - shoulder.y)         # Vertical alignment
-    
-    # For plank, consider active when in reasonable position (not standing)
-    # A body angle significantly different from standing (which would be close to 180°)
-    # and elbow position indicating a plank position
-    is_plank_position = (body_angle < 170 or body_angle > 190) and elbow.y > hip.y
-    is_active = is_plank_position
-    
-    # Update time only when active
-    state.update_time(is_active)
-    
-    # Plank rules
-    if 170 <= body_angle <= 190:  # Ideal straight line (±10° tolerance)
-        state.feedback = "Perfect plank! Hold steady."
-        state.feedback_class = "correct"
-    elif body_angle < 170:  # Hips too high (pike)
-        state.feedback = "Hips too high! Lower them."
-        state.feedback_class = "warning"
-    else:  # Hips too low (sagging)
-        state.feedback = "Hips sagging! Lift them."
-        state.feedback_class = "error"
-    
-    # Elbow alignment check (optional)
-    if elbow.x > shoulder.x + 0.05:  # Elbows too far forward
-        state.feedback = "Elbows under shoulders!"
-        state.feedback_class = "error"
-    
-    # Track time in perfect form
-    if state.feedback_class == "correct":
-        state.perfect_time += 1/30  # Assuming 30fps; adjust as needed
-    else:
-        state.perfect_time = max(0, state.perfect_time - 1/30)  # Penalize breaks
-    
-    return state
-
-
-
-
-
-
-def bicep_curl_logic(landmarks, state):
-    # Key landmarks (left side)
-    shoulder = landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value]
-    elbow    = landmarks[mp_pose.PoseLandmark.LEFT_ELBOW.value]
-    wrist    = landmarks[mp_pose.PoseLandmark.LEFT_WRIST.value]
-
-    # Calculate angle at the elbow (main focus for curls)
-    elbow_angle = calculate_angle(shoulder, elbow, wrist)
-    
-    # Detect if user is actively exercising (elbow bent between 30-160 degrees)
-    is_active = 30 < elbow_angle < 160
-    
-    # Update time only when active
-    state.update_time(is_active)
-
-    # ---------------- Bicep Curl Rules ---------------- #
-
-    # Case A: Arm straight (start position)
-    if elbow_angle > 160:
-        state.direction = "up"
-        state.feedback = "Start curling! Keep elbow fixed."
-        state.feedback_class = "neutral"
-
-    # Case B: Curling range (30°–160°)
-    elif 30 < elbow_angle <= 160:
-        if state.direction == "up":
-            state.feedback = "Curling up... Keep elbow still!"
-            state.feedback_class = "correct"
-        else:
-            state.feedback = "Lower slowly. Control the weight."
-            state.feedback_class = "correct"
-
-    # Case C: Fully contracted (≤30°)
-    elif elbow_angle <= 30:
-        state.feedback = "Hold and tighten your bicep at the top of the curl before lowering."
-        state.feedback_class = "correct"
-        if state.direction == "up":
-            state.direction = "down"
-
-    # ---------------- Rep Counting ---------------- #
-    if elbow_angle > 160 and state.direction == "down" and state.prev_angle <= 30:
-        state.reps += 1
-
-    # Save current angle for next frame
-    state.prev_angle = elbow_angle
-    return state
-
-
-
-
-
-
-def lunge_logic(landmarks, state):
-    # Key landmarks (both legs)
-    left_hip = landmarks[mp_pose.PoseLandmark.LEFT_HIP.value]
-    left_knee = landmarks[mp_pose.PoseLandmark.LEFT_KNEE.value]
-    left_ankle = landmarks[mp_pose.PoseLandmark.LEFT_ANKLE.value]
-    right_hip = landmarks[mp_pose.PoseLandmark.RIGHT_HIP.value]
-    right_knee = landmarks[mp_pose.PoseLandmark.RIGHT_KNEE.value]
-    right_ankle = landmarks[mp_pose.PoseLandmark.RIGHT_ANKLE.value]
-    left_shoulder = landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value] 
-    
-    # Calculate angles
-    left_knee_angle = calculate_angle(left_hip, left_knee, left_ankle)  # Front leg
-    right_knee_angle = calculate_angle(right_hip, right_knee, right_ankle)  # Back leg
-    torso_angle = calculate_angle(left_shoulder, left_hip, left_knee)  # Torso alignment
-    
-    # Detect if user is actively exercising (in lunge position)
-    is_active = left_knee_angle < 160 or right_knee_angle < 160  # Knees bent
-    
-    # Update time only when active
-    state.update_time(is_active)
-    
-    # Lunge Rules
-    if left_knee_angle > 160 and right_knee_angle > 160:  # Standing
-        state.feedback = "Step forward into lunge"
-        state.feedback_class = "neutral"
-    
-    elif left_knee_angle < 90 and right_knee_angle < 90:  # Deep lunge
-        state.feedback = "Too deep! Keep front knee above ankle"
-        state.feedback_class = "error"
-    
-    elif 90 <= left_knee_angle <= 110 and right_knee_angle > 135:  # Ideal lunge
-        if torso_angle < 170:  # Leaning forward
-            state.feedback = "Keep torso upright!"
-            state.feedback_class = "warning"
-        else:
-            state.feedback = "Perfect lunge! Push through front heel"
-            state.feedback_class = "correct"
-            if state.direction == "down":
-                state.direction = "up"
-                state.reps += 1  # Count rep when returning up
-    
-    elif left_knee_angle > 110:  # Shallow lunge
-        state.feedback = "Deeper lunge! Front knee at 90°"
-        state.feedback_class = "warning"
-    
-    # Knee safety check
-    if left_knee.x < left_ankle.x:  # Knee past toes
-        state.feedback = "Front knee behind toes!"
-        state.feedback_class = "error"
-    
-    state.prev_left_angle = left_knee_angle
-    return state
-
-
-# ===== EXERCISE MAPPING =====
-# Map exercise names to their logic functions
-EXERCISE_FUNCTIONS = {
-    "squat": squat_logic,
-  
-    "pushup": pushup_logic,
-  
-    "plank": plank_logic,
-    "bicep_curl": bicep_curl_logic,
-
-    "lunges": lunge_logic
-}
-
-def get_exercise_function(exercise_name):
-    """Returns the appropriate logic function for the exercise."""
-    return EXERCISE_FUNCTIONS.get(exercise_name.lower())
\ No newline at end of file
+import numpy as np
+from utils.angle_utils import calculate_angles, landmarks_to_array
+from utils.pose_landmarks import PoseLandmark as LM
+from utils.ring_buffer import RingBuffer
+from utils.rule_engine import compile_exercises
+import time
+
+# ===== JOINT ANGLES =====
+# Every (a, b, c) angle any logic function needs, measured at b, for both
+# sides of the body. They are computed together in one vectorized pass per frame.
+ANGLE_TRIPLETS = {
+    "left_knee": (LM.LEFT_HIP.value, LM.LEFT_KNEE.value, LM.LEFT_ANKLE.value),
+    "right_knee": (LM.RIGHT_HIP.value, LM.RIGHT_KNEE.value, LM.RIGHT_ANKLE.value),
+    "left_elbow": (LM.LEFT_SHOULDER.value, LM.LEFT_ELBOW.value, LM.LEFT_WRIST.value),
+    "left_torso": (LM.LEFT_SHOULDER.value, LM.LEFT_HIP.value, LM.LEFT_KNEE.value),
+    "left_body": (LM.LEFT_SHOULDER.value, LM.LEFT_HIP.value, LM.LEFT_ANKLE.value),
+    "left_pushup_body": (LM.LEFT_SHOULDER.value, LM.LEFT_HIP.value, LM.LEFT_WRIST.value),
+    "right_elbow": (LM.RIGHT_SHOULDER.value, LM.RIGHT_ELBOW.value, LM.RIGHT_WRIST.value),
+    "right_torso": (LM.RIGHT_SHOULDER.value, LM.RIGHT_HIP.value, LM.RIGHT_KNEE.value),
+    "right_body": (LM.RIGHT_SHOULDER.value, LM.RIGHT_HIP.value, LM.RIGHT_ANKLE.value),
+    "right_pushup_body": (LM.RIGHT_SHOULDER.value, LM.RIGHT_HIP.value, LM.RIGHT_WRIST.value),
+}
+ANGLE_INDEX = {name: i for i, name in enumerate(ANGLE_TRIPLETS)}
+_TRIPLET_TABLE = np.array(list(ANGLE_TRIPLETS.values()), dtype=np.intp)
+
+
+def compute_angles(landmarks, columns=None):
+    """Returns (points, angles) for a landmark list, a (33, C) array or an (N, 33, C) stack.
+
+    angles has one column per ANGLE_TRIPLETS entry, look columns up with ANGLE_INDEX;
+    columns (ANGLE_INDEX values) computes just those, in that order.
+    Landmark lists keep their visibility, so side selection works for them too.
+    """
+    if isinstance(landmarks, np.ndarray):
+        points = landmarks
+    else:
+        points = landmarks_to_array(landmarks, with_visibility=True)
+    triplets = _TRIPLET_TABLE if columns is None else _TRIPLET_TABLE[columns]
+    return points, calculate_angles(points, triplets)
+
+# Shared variables (reps, feedback, etc.) for thread-safe usage (simplified for demo)
+import time
+
+# Longest gap between two samples that still counts as continuous (seconds)
+MAX_SAMPLE_GAP = 1.0
+
+# Per-session history: the last ANGLE_HISTORY_SIZE frames' angles (all
+# ANGLE_TRIPLETS columns, NaN where the exercise doesn't read that angle) and
+# the times of the last REP_HISTORY_SIZE reps, in preallocated ring buffers
+# (about 15 KB per session)
+ANGLE_HISTORY_SIZE = 300  # 10 s at 30 fps
+REP_HISTORY_SIZE = 100
+
+class ExerciseState:
+    # Plain values that make up the state, in to_dict() / from_dict()
+    FIELDS = ("reps", "direction", "feedback", "feedback_class", "current_time", "start_time",
+              "is_exercising", "last_update_time", "perfect_time", "frame_time", "last_frame_time",
+              "frame_dt")
+    # Slotted so thousands of sessions stay small and a typo'd attribute fails loudly
+    __slots__ = FIELDS + ("rule_state", "angle_history", "rep_history", "_recorded_reps")
+
+    def __init__(self):
+        self.angle_history = RingBuffer(ANGLE_HISTORY_SIZE, len(ANGLE_TRIPLETS))
+        self.rep_history = RingBuffer(REP_HISTORY_SIZE)
+        self.reset()
+
+    def update_time(self, is_active):
+        """Update the exercise duration timer only when actively exercising"""
+        # Prefer the frame's capture time so skipped / late frames don't skew timing
+        current_time = self.frame_time if self.frame_time is not None else time.time()
+
+        if self.last_frame_time is None:
+            self.frame_dt = 0
+        else:
+            self.frame_dt = min(max(current_time - self.last_frame_time, 0), MAX_SAMPLE_GAP)
+        self.last_frame_time = current_time
+        
+        if self.start_time is None:
+            self.start_time = current_time
+        
+        # Only count time when actively exercising
+        if is_active:
+            if not self.is_exercising:
+                # Just started exercising
+                self.is_exercising = True
+                self.last_update_time = current_time
+            else:
+                # Continue counting exercise time
+                elapsed = min(current_time - self.last_update_time, MAX_SAMPLE_GAP)
+                self.current_time += elapsed
+                self.last_update_time = current_time
+        else:
+            # Not actively exercising
+            self.is_exercising = False
+        
+        return self
+    
+    def snapshot(self):
+        """Stats shown to the browser, as a new dict (treat it as immutable)"""
+        return {
+            "reps": self.reps,
+            "time": self.current_time,
+            "feedback": self.feedback,
+            "feedback_class": self.feedback_class
+        }
+    
+    def reset(self):
+        """Reset all state variables (the history buffers are cleared, not reallocated)"""
+        self.reps = 0
+        self.direction = None
+        self.feedback = "Start position"
+        self.feedback_class = "neutral"
+        self.current_time = 0
+        self.start_time = None
+        self.is_exercising = False  # Track if user is actively exercising
+        self.last_update_time = time.time()
+        self.perfect_time = 0
+        self.frame_time = None       # Capture timestamp of the frame being evaluated
+        self.last_frame_time = None
+        self.frame_dt = 0            # Seconds since the previous evaluated frame
+        self.rule_state = None       # Rule engine's per-session latches and angle filter
+        self.angle_history.clear()
+        self.rep_history.clear()
+        self._recorded_reps = 0
+
+    def record(self, angles, columns=None):
+        """Add the evaluated frame's angles (and any new reps) to the history
+
+        columns: the ANGLE_INDEX columns angles holds, if not all of them
+        """
+        timestamp = self.last_frame_time if self.last_frame_time is not None else time.time()
+        if columns is not None:
+            row = np.full(len(ANGLE_TRIPLETS), np.nan, dtype=np.float32)
+            row[columns] = angles
+            angles = row
+        self.angle_history.append(timestamp, angles)
+        while self._recorded_reps < self.reps:
+            self.rep_history.append(timestamp)
+            self._recorded_reps += 1
+
+    def history(self):
+        """Recent angle samples and rep times, oldest first (copies)"""
+        timestamps, angles = self.angle_history.arrays()
+        rep_times, _ = self.rep_history.arrays()
+        return {"timestamps": timestamps, "angles": angles, "angle_names": list(ANGLE_TRIPLETS),
+                "rep_times": rep_times}
+
+    def to_dict(self, history=True):
+        """JSON-friendly copy of the state; the rule engine's working state is left out"""
+        data = {field: getattr(self, field) for field in self.FIELDS}
+        if history:
+            data["angle_history"] = self.angle_history.to_dict()
+            data["rep_history"] = self.rep_history.to_dict()
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls()
+        for field in cls.FIELDS:
+            if field in data:
+                setattr(state, field, data[field])
+        if "angle_history" in data:
+            state.angle_history.load(data["angle_history"])
+        if "rep_history" in data:
+            state.rep_history.load(data["rep_history"])
+        state._recorded_reps = state.reps
+        return state
+# ===== EXERCISE RULES =====
+# Each exercise is a spec for utils.rule_engine:
+#   angles / points: features read from the frame (ANGLE_TRIPLETS entries and
+#                    (landmark, axis) coordinates)
+#   memory:          state attributes set to a feature at the end of each frame
+#                    and readable by conditions on the next one
+#   hysteresis:      {feature: band} - conditions on the feature that held on
+#                    the previous frame keep holding within band of the threshold
+#   smoothing:       OneEuroFilter settings for the angles (None = raw angles)
+#   sides:           SIDE_SELECTION settings; the spec is written for the left
+#                    side and also read mirrored from the right (None = left only)
+#   blend_sides:     average both sides, weighted by visibility, when both are
+#                    clearly visible (for exercises where both sides move alike)
+#   active:          the timer runs while any of these condition lists holds
+#   phases:          rule lists checked in order; in each phase the first rule
+#                    whose "when" conditions all hold (and whose "direction",
+#                    if given, matches state.direction) applies its feedback,
+#                    set_direction and count_rep
+HOLD_MESSAGE = "Hold and tighten your bicep at the top of the curl before lowering."
+
+# Angles run through a One-Euro filter with the frame's capture timestamps,
+# so how much they are smoothed doesn't depend on the frame rate
+ANGLE_SMOOTHING = {"min_cutoff": 2.0, "beta": 0.05, "d_cutoff": 1.0}
+
+# Each frame is evaluated on the side of the body MediaPipe sees best (mean
+# landmark visibility of the joints the exercise reads); frames where neither
+# side reaches min_visibility are skipped
+SIDE_SELECTION = {
+    "min_visibility": 0.5,
+    "switch_margin": 0.15,     # Visibility lead the other side needs to take over
+    "blend_visibility": 0.8,   # Both sides at least this visible -> blend (blend_sides)
+}
+
+# Rep counting is a direction state machine (down -> bottom reached -> back up)
+# rather than a comparison with the previous frame, so skipped frames and low
+# inference rates don't lose reps. Thresholds on rep angles get a few degrees
+# of hysteresis so noise around them can't flip the direction.
+EXERCISE_SPECS = {
+    "squat": {
+        "angles": {"knee": "left_knee"},
+        "hysteresis": {"knee": 5},
+        "blend_sides": True,  # Both legs bend together; facing the camera both are visible
+        # Active when knee bent - not standing straight
+        "active": [["knee < 160"]],
+        "phases": [
+            # Count reps only when returning to standing after a good squat
+            [
+                {"when": ["knee > 160"], "direction": "up", "count_rep": True},
+            ],
+            [
+                {"when": ["knee > 160"], "set_direction": "down",
+                 "feedback": ("Stand straight. Ready to squat!", "neutral")},
+                {"when": ["130 < knee <= 160"],
+                 "feedback": ("Start lowering (aim for 90°)", "warning")},
+                {"when": ["80 <= knee <= 100"], "direction": "down",  # Ideal squat range
+                 "feedback": ("Perfect depth! Push up now.", "correct"), "set_direction": "up"},
+                {"when": ["80 <= knee <= 100"],
+                 "feedback": ("Good form! Return to start.", "correct")},
+                {"when": ["knee < 80"],
+                 "feedback": ("Too deep! Raise slightly.", "error")},
+                {"feedback": ("Go deeper! Aim for 90°.", "warning")},  # Partial squat
+            ],
+        ],
+    },
+
+    "pushup": {
+        "angles": {"arm": "left_elbow", "body": "left_pushup_body"},
+        "hysteresis": {"arm": 5},
+        "blend_sides": True,
+        # Active when elbow bent - not at top position
+        "active": [["arm < 160"]],
+        "phases": [
+            [
+                {"when": ["arm > 160"],
+                 "feedback": ("Ready to lower (keep body straight!)", "neutral")},
+                {"when": ["90 <= arm <= 120", "body > 160"],  # Ideal lowering phase
+                 "feedback": ("Lower slowly (good form!)", "correct")},
+                {"when": ["90 <= arm <= 120"],  # Sagging hips/arched back
+                 "feedback": ("Keep body straight! Engage core.", "warning")},
+                {"when": ["arm < 90", "body > 160"], "set_direction": "up",
+                 "feedback": ("Perfect depth! Push up now.", "correct")},
+                {"when": ["arm < 90"], "set_direction": "up",
+                 "feedback": ("Fix posture before pushing up!", "error")},
+            ],
+            # Count reps only when returning to top with good form
+            [
+                {"when": ["arm > 160", "body > 160"], "direction": "up",
+                 "count_rep": True, "set_direction": "down"},
+                {"when": ["arm > 160"], "direction": "up", "set_direction": "down",
+                 "feedback": ("Rep discarded! Keep body straight.", "error")},
+            ],
+        ],
+    },
+
+    "plank": {
+        "angles": {"body": "left_body"},  # Straight-line target: ~180°
+        "points": {
+            "shoulder_x": (LM.LEFT_SHOULDER, "x"),
+            "hip_y": (LM.LEFT_HIP, "y"),
+            "elbow_x": (LM.LEFT_ELBOW, "x"),
+            "elbow_y": (LM.LEFT_ELBOW, "y"),
+        },
+        # Body angle away from standing and elbows below the hips
+        "active": [["body < 170", "elbow_y > hip_y"], ["body > 190", "elbow_y > hip_y"]],
+        "phases": [
+            [
+                {"when": ["170 <= body <= 190"],  # Ideal straight line (±10° tolerance)
+                 "feedback": ("Perfect plank! Hold steady.", "correct")},
+                {"when": ["body < 170"],  # Hips too high (pike)
+                 "feedback": ("Hips too high! Lower them.", "warning")},
+                {"feedback": ("Hips sagging! Lift them.", "error")},
+            ],
+            [
+                {"when": ["elbow_x > shoulder_x + 0.05"],  # Elbows too far forward
+                 "feedback": ("Elbows under shoulders!", "error")},
+            ],
+        ],
+        # Time in perfect form grows while correct, shrinks otherwise
+        "hold_timer": ("perfect_time", "correct"),
+    },
+
+    "bicep_curl": {
+        "angles": {"elbow": "left_elbow"},
+        "hysteresis": {"elbow": 5},
+        # Active while the elbow is bent between 30-160 degrees
+        "active": [["30 < elbow < 160"]],
+        "phases": [
+            # Count a rep when the arm is straight again after a full curl
+            [
+                {"when": ["elbow > 160"], "direction": "down", "count_rep": True},
+            ],
+            [
+                {"when": ["elbow > 160"], "set_direction": "up",  # Arm straight (start position)
+                 "feedback": ("Start curling! Keep elbow fixed.", "neutral")},
+                {"when": ["30 < elbow <= 160"], "direction": "up",
+                 "feedback": ("Curling up... Keep elbow still!", "correct")},
+                {"when": ["30 < elbow <= 160"],
+                 "feedback": ("Lower slowly. Control the weight.", "correct")},
+                {"when": ["elbow <= 30"], "direction": "up", "set_direction": "down",  # Fully contracted
+                 "feedback": (HOLD_MESSAGE, "correct")},
+                {"when": ["elbow <= 30"],
+                 "feedback": (HOLD_MESSAGE, "correct")},
+            ],
+        ],
+    },
+
+    "lunges": {
+        "angles": {"front_knee": "left_knee", "back_knee": "right_knee", "torso": "left_torso"},
+        "points": {"knee_x": (LM.LEFT_KNEE, "x"), "ankle_x": (LM.LEFT_ANKLE, "x")},
+        "hysteresis": {"front_knee": 5, "back_knee": 5},
+        # Active while either knee is bent
+        "active": [["front_knee < 160"], ["back_knee < 160"]],
+        "phases": [
+            [
+                {"when": ["front_knee > 160", "back_knee > 160"], "set_direction": "down",  # Standing
+                 "feedback": ("Step forward into lunge", "neutral")},
+                {"when": ["front_knee < 90", "back_knee < 90"],  # Deep lunge
+                 "feedback": ("Too deep! Keep front knee above ankle", "error")},
+                {"when": ["90 <= front_knee <= 110", "back_knee > 135", "torso < 170"],  # Leaning forward
+                 "feedback": ("Keep torso upright!", "warning")},
+                {"when": ["90 <= front_knee <= 110", "back_knee > 135"], "direction": "down",
+                 "feedback": ("Perfect lunge! Push through front heel", "correct"),
+                 "set_direction": "up", "count_rep": True},  # Once per lunge, re-armed by standing up
+                {"when": ["90 <= front_knee <= 110", "back_knee > 135"],
+                 "feedback": ("Perfect lunge! Push through front heel", "correct")},
+                {"when": ["front_knee > 110"],  # Shallow lunge
+                 "feedback": ("Deeper lunge! Front knee at 90°", "warning")},
+            ],
+            # Knee safety check
+            [
+                {"when": ["knee_x < ankle_x"],
+                 "feedback": ("Front knee behind toes!", "error")},
+            ],
+        ],
+    },
+}
+
+
+# ===== EXERCISE MAPPING =====
+# Map exercise names to their logic functions: each compiled spec takes
+# (landmarks, state) and returns the updated state
+EXERCISE_FUNCTIONS = compile_exercises(EXERCISE_SPECS, compute_angles, ANGLE_INDEX,
+                                       defaults={"smoothing": ANGLE_SMOOTHING, "sides": SIDE_SELECTION},
+                                       angle_landmarks=ANGLE_TRIPLETS)
+
+def get_exercise_function(exercise_name):
+    """Returns the appropriate logic function for the exercise."""
+    return EXERCISE_FUNCTIONS.get(exercise_name.lower())
@@ -1,49 +1,126 @@
-import sqlite3
-from werkzeug.security import generate_password_hash
-
-def init_db():
-    try:
-        conn = sqlite3.connect('database.db')
-        cursor = conn.cursor()
-
-        # Enable foreign key constraints
-        cursor.execute("PRAGMA foreign_keys = ON")
-
-        # Create users table with improved schema
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT NOT NULL UNIQUE,
-                number TEXT NOT NULL,
-                password TEXT NOT NULL,
-                weight REAL,  
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        # Create workouts table (for exercise tracking)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS workouts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                exercise_type TEXT NOT NULL,
-                duration_seconds INTEGER,
-                reps_completed INTEGER,
-                calories_burned REAL,
-                performed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-
-        
-        conn.commit()
-        print("✅ Database initialized successfully with tables: users, workouts")
-
-    except sqlite3.Error as e:
-        print(f"❌ Database error: {e}")
-    finally:
-        if conn:
-            conn.close()
-
-if __name__ == "__main__":
+import sqlite3
+from werkzeug.security import generate_password_hash
+
+# ===== WORKOUT ROLLUPS =====
+# Per user totals per day and per week (weeks start on Monday), for every
+# exercise and for 'all' of them together. A trigger keeps them up to date
+# on every insert into workouts, so trends are read straight from here.
+ROLLUP_PERIODS = {
+    "day": "date({t})",
+    "week": "date({t}, 'weekday 0', '-6 days')",
+}
+ROLLUP_EXERCISES = ("{e}", "'all'")
+
+ROLLUP_UPSERT = """
+    INSERT INTO workout_rollups (user_id, period, exercise_type, period_start,
+                                 workouts, reps, duration_seconds, calories)
+    VALUES (NEW.user_id, '{period}', {exercise}, {start}, 1, COALESCE(NEW.reps_completed, 0),
+            COALESCE(NEW.duration_seconds, 0), COALESCE(NEW.calories_burned, 0))
+    ON CONFLICT (user_id, period, exercise_type, period_start) DO UPDATE SET
+        workouts = workouts + 1,
+        reps = reps + excluded.reps,
+        duration_seconds = duration_seconds + excluded.duration_seconds,
+        calories = calories + excluded.calories;
+"""
+
+ROLLUP_REBUILD = """
+    INSERT INTO workout_rollups (user_id, period, exercise_type, period_start,
+                                 workouts, reps, duration_seconds, calories)
+    SELECT user_id, '{period}', {exercise}, {start}, COUNT(*), COALESCE(SUM(reps_completed), 0),
+           COALESCE(SUM(duration_seconds), 0), COALESCE(SUM(calories_burned), 0)
+    FROM workouts
+    WHERE user_id IS NOT NULL AND performed_at IS NOT NULL
+    GROUP BY 1, 3, 4
+"""
+
+
+def _rollup_sql(template, row):
+    return [template.format(period=period, exercise=exercise.format(e=f"{row}exercise_type"),
+                            start=start.format(t=f"{row}performed_at"))
+            for period, start in ROLLUP_PERIODS.items() for exercise in ROLLUP_EXERCISES]
+
+
+def create_history_schema(cursor):
+    """Index, rollup table and trigger for the history / trends queries"""
+    # Every per-user history query is a range scan of this index
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_workouts_user_time
+        ON workouts (user_id, performed_at, id)
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS workout_rollups (
+            user_id INTEGER NOT NULL,
+            period TEXT NOT NULL,            -- 'day' or 'week'
+            exercise_type TEXT NOT NULL,     -- or 'all'
+            period_start TEXT NOT NULL,      -- YYYY-MM-DD
+            workouts INTEGER NOT NULL,
+            reps INTEGER NOT NULL,
+            duration_seconds INTEGER NOT NULL,
+            calories REAL NOT NULL,
+            PRIMARY KEY (user_id, period, exercise_type, period_start)
+        ) WITHOUT ROWID
+    ''')
+    trigger_exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'workouts_rollup'").fetchone()
+    if not trigger_exists:
+        cursor.execute(
+            "CREATE TRIGGER workouts_rollup AFTER INSERT ON workouts "
+            "WHEN NEW.user_id IS NOT NULL AND NEW.performed_at IS NOT NULL BEGIN"
+            + "".join(_rollup_sql(ROLLUP_UPSERT, "NEW.")) + "END")
+        # Workouts saved before the trigger existed
+        cursor.execute("DELETE FROM workout_rollups")
+        for statement in _rollup_sql(ROLLUP_REBUILD, ""):
+            cursor.execute(statement)
+
+
+def init_db(db_path='database.db'):
+    conn = None
+    try:
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+
+        # Enable foreign key constraints
+        cursor.execute("PRAGMA foreign_keys = ON")
+
+        # Write-ahead log: workout writes don't block readers (the mode persists in the file)
+        cursor.execute("PRAGMA journal_mode = WAL")
+
+        # Create users table with improved schema
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL UNIQUE,
+                number TEXT NOT NULL,
+                password TEXT NOT NULL,
+                weight REAL,  
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Create workouts table (for exercise tracking)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS workouts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER,
+                exercise_type TEXT NOT NULL,
+                duration_seconds INTEGER,
+                reps_completed INTEGER,
+                calories_burned REAL,
+                performed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+
+        create_history_schema(cursor)
+
+        conn.commit()
+        print("✅ Database initialized successfully with tables: users, workouts, workout_rollups")
+
+    except sqlite3.Error as e:
+        print(f"❌ Database error: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+if __name__ == "__main__":
     init_db()
\ No newline at end of file
@@ -0,0 +1,167 @@
+"""Record and replay pose landmark traces.
+
+A trace is the landmark stream that feeds the exercise logic, so the logic
+can be benchmarked and tested without a camera, cv2 or mediapipe.
+
+The same records are the wire format for clients that upload landmarks
+themselves (see decode_records).
+
+File layout (little endian):
+    16-byte header: magic b"POSETRC1", uint32 landmarks per frame, uint32 reserved
+    then one record per frame: float64 capture timestamp, float32[33][4] x, y, z, visibility
+
+    python landmark_trace.py info session.ptr
+    python landmark_trace.py replay session.ptr squat --repeat 1000
+"""
+import argparse
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+from utils.pose_landmarks import NUM_LANDMARKS
+
+TRACE_MAGIC = b"POSETRC1"
+HEADER = struct.Struct("<8sII")
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("landmarks", "<f4", (NUM_LANDMARKS, 4)),
+])
+
+
+def decode_records(payload):
+    """View an uploaded buffer as RECORD_DTYPE records (no copy).
+
+    Raises ValueError if the payload isn't a whole number of records.
+    """
+    if len(payload) % RECORD_DTYPE.itemsize:
+        raise ValueError(f"payload of {len(payload)} bytes is not a multiple of "
+                         f"the {RECORD_DTYPE.itemsize}-byte landmark record")
+    return np.frombuffer(payload, dtype=RECORD_DTYPE)
+
+
+class TraceWriter:
+    """Appends frames to a trace file as they arrive"""
+
+    def __init__(self, path):
+        self.path = path
+        self.frames = 0
+        self._record = np.zeros((), dtype=RECORD_DTYPE)
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(TRACE_MAGIC, NUM_LANDMARKS, 0))
+
+    def write(self, points, timestamp):
+        """points: (33, 4) array from landmarks_to_array(..., with_visibility=True)"""
+        self._record["timestamp"] = timestamp
+        self._record["landmarks"] = points
+        self._file.write(self._record.tobytes())
+        self.frames += 1
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Trace:
+    """Memory-mapped trace: .landmarks is (frames, 33, 4) float32, .timestamps is (frames,)"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError(f"{path}: not a landmark trace (file too short)")
+        magic, num_landmarks, _ = HEADER.unpack(header)
+        if magic != TRACE_MAGIC or num_landmarks != NUM_LANDMARKS:
+            raise ValueError(f"{path}: not a landmark trace")
+
+        # A recording cut off mid-write leaves a partial last record; ignore it
+        frames = (os.path.getsize(path) - HEADER.size) // RECORD_DTYPE.itemsize
+        if frames:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode="r",
+                                     offset=HEADER.size, shape=(frames,))
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+        self.landmarks = self.records["landmarks"]
+        self.timestamps = self.records["timestamp"]
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def duration(self):
+        return float(self.timestamps[-1] - self.timestamps[0]) if len(self) else 0.0
+
+
+def replay(trace, exercise, repeat=1):
+    """Feed a trace through an EXERCISE_FUNCTIONS entry.
+
+    Returns (state, seconds) with the state of the last pass.
+    """
+    from utils.exercise_logic import ExerciseState, get_exercise_function
+
+    if repeat < 1:
+        raise ValueError(f"repeat must be at least 1, got {repeat}")
+    logic_function = get_exercise_function(exercise)
+    if logic_function is None:
+        raise ValueError(f"unknown exercise: {exercise}")
+
+    landmarks = np.ascontiguousarray(trace.landmarks)  # Page in once, outside the timing
+    timestamps = trace.timestamps.tolist()
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        state = ExerciseState()
+        state.start_time = timestamps[0] if timestamps else None
+        for points, timestamp in zip(landmarks, timestamps):
+            state.frame_time = timestamp
+            state = logic_function(points, state)
+    return state, time.perf_counter() - start
+
+
+def _positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    info = commands.add_parser("info", help="show trace length and duration")
+    info.add_argument("path")
+
+    run = commands.add_parser("replay", help="run a trace through an exercise's logic")
+    run.add_argument("path")
+    run.add_argument("exercise")
+    run.add_argument("--repeat", type=_positive_int, default=1, help="passes over the trace (for benchmarking)")
+
+    args = parser.parse_args(argv)
+    trace = Trace(args.path)
+
+    if args.command == "info":
+        print(f"{args.path}: {len(trace)} frames, {trace.duration:.1f}s")
+        return 0
+
+    state, elapsed = replay(trace, args.exercise, args.repeat)
+    frames = len(trace) * args.repeat
+    print(f"reps={state.reps} active={state.current_time:.1f}s feedback={state.feedback!r}")
+    if elapsed > 0 and trace.duration > 0:
+        speedup = trace.duration * args.repeat / elapsed
+        print(f"{frames} frames in {elapsed:.3f}s ({frames / elapsed:,.0f} frames/s, "
+              f"{speedup:,.0f}x real time)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+import cv2
+import numpy as np
+
+
+# ===== MJPEG ENCODER =====
+# Encodes frames for the multipart/x-mixed-replace stream. The JPEG quality
+# and output width are configurable; the resize writes into a buffer that is
+# reused for every frame, and each multipart chunk is built with one join
+# straight from cv2's output (no tobytes() copy, no chains of `+`).
+#
+# For slow clients it can send only every Nth captured frame: the time a
+# chunk takes to leave the generator is compared with N capture intervals,
+# N grows while sending can't keep up and shrinks again once it easily can.
+# Skipped frames are neither drawn on nor encoded.
+
+class MJPEGEncoder:
+    def __init__(self, quality=80, width=None, every_nth=1, max_nth=4, boundary=b"frame",
+                 smoothing=0.2):
+        """
+        quality:   JPEG quality 0-100 (OpenCV's default is 95)
+        width:     output width in pixels, None keeps the frame's own size
+        every_nth: send at least every Nth frame (1 = all of them)
+        max_nth:   largest N the slow-client mode may back off to
+        """
+        self.quality = int(quality)
+        self.width = int(width) if width else None
+        self.min_nth = max(1, int(every_nth))
+        self.max_nth = max(self.min_nth, int(max_nth))
+        self.nth = self.min_nth
+        self.smoothing = smoothing
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        self._prefix = b"--" + boundary + b"\r\nContent-Type: image/jpeg\r\nContent-Length: "
+        self._resized = None   # Reused resize destination
+        self._last_seq = None
+        self._last_captured_at = None
+        self._frame_interval = None   # Smoothed seconds between captured frames
+        self._send_time = None
+        self.frames = 0
+        self.skipped = 0
+        self.bytes = 0
+
+    def _scale(self, frame):
+        if not self.width or frame.shape[1] <= self.width:
+            return frame
+        height = round(frame.shape[0] * self.width / frame.shape[1])
+        shape = (height, self.width) + frame.shape[2:]
+        if self._resized is None or self._resized.shape != shape:
+            self._resized = np.empty(shape, dtype=frame.dtype)
+        return cv2.resize(frame, (self.width, height), dst=self._resized,
+                          interpolation=cv2.INTER_LINEAR)
+
+    def encode(self, frame):
+        """One multipart chunk for frame as bytes, or None if encoding failed"""
+        ret, buffer = cv2.imencode('.jpg', self._scale(frame), self.params)
+        if not ret:
+            return None
+        chunk = b"".join((self._prefix, str(len(buffer)).encode(), b"\r\n\r\n", buffer, b"\r\n"))
+        self.frames += 1
+        self.bytes += len(chunk)
+        return chunk
+
+    def should_send(self, seq, captured_at):
+        """Whether captured frame number seq should be drawn, encoded and sent"""
+        if self._last_seq is not None and seq - self._last_seq < self.nth:
+            self.skipped += 1
+            return False
+
+        if self._last_seq is not None and seq > self._last_seq and captured_at > self._last_captured_at:
+            interval = (captured_at - self._last_captured_at) / (seq - self._last_seq)
+            self._frame_interval = interval if self._frame_interval is None else \
+                self._frame_interval + self.smoothing * (interval - self._frame_interval)
+        self._last_seq = seq
+        self._last_captured_at = captured_at
+        return True
+
+    def sent(self, seconds):
+        """Report how long handing the last chunk to the client took"""
+        self._send_time = seconds if self._send_time is None else \
+            self._send_time + self.smoothing * (seconds - self._send_time)
+        if self._frame_interval is None:
+            return
+        # Back off while a send takes longer than the N frames it stands for,
+        # come back once it would comfortably fit into N - 1
+        if self._send_time > self.nth * self._frame_interval and self.nth < self.max_nth:
+            self.nth += 1
+        elif self.nth > self.min_nth and self._send_time < 0.5 * (self.nth - 1) * self._frame_interval:
+            self.nth -= 1
+
+    def snapshot(self):
+        return {
+            "quality": self.quality,
+            "width": self.width,
+            "every_nth": self.nth,
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "bytes": self.bytes,
+            "avg_frame_bytes": round(self.bytes / self.frames) if self.frames else 0,
+        }
@@ -0,0 +1,254 @@
+import itertools
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from utils.angle_utils import landmarks_to_array
+from utils.capture import StageTimer
+from utils.video_pipeline import AdaptiveScheduler
+
+
+# ===== MULTI-PERSON TRACKING =====
+# MediaPipe's Pose finds one person per image, so several athletes in front of
+# one camera are handled by cropping: every tracked person gets a box, each
+# sampled frame is cut into one crop per track, and the crops go through the
+# shared PosePool together (on all its workers at once). Landmarks are mapped
+# back to full-frame coordinates, so drawing and the exercise logic see them
+# exactly as in the single-person pipeline, and every track has its own
+# ExerciseState. Capture, inference scheduling, overlay and MJPEG encoding are
+# shared by the whole group: one stream, not one per athlete.
+#
+# Boxes come either from fixed zones (one per station in a group class, e.g.
+# column_zones(3)) or from a person detector run every detect_interval
+# seconds; between detections a track's box follows its own landmarks.
+
+BOX_MATCH_IOU = 0.3        # Detection overlapping a track this much is that track
+LANDMARK_VISIBILITY = 0.5  # Landmarks used to re-center a track's box
+
+
+def column_zones(count):
+    """count equal side-by-side boxes covering the frame, as (x0, y0, x1, y1) fractions"""
+    edges = np.linspace(0.0, 1.0, count + 1)
+    return [(float(x0), 0.0, float(x1), 1.0) for x0, x1 in zip(edges[:-1], edges[1:])]
+
+
+def box_iou(a, b):
+    x0, y0 = max(a[0], b[0]), max(a[1], b[1])
+    x1, y1 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x1 - x0) * max(0.0, y1 - y0)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def expand_box(box, margin):
+    """Grow a box by margin of its size on every side, clipped to the frame"""
+    x0, y0, x1, y1 = box
+    dx, dy = (x1 - x0) * margin, (y1 - y0) * margin
+    return (max(0.0, x0 - dx), max(0.0, y0 - dy), min(1.0, x1 + dx), min(1.0, y1 + dy))
+
+
+class PersonDetector:
+    """OpenCV's HOG people detector (ships with OpenCV, no model files)"""
+
+    def __init__(self, width=320, min_score=0.3):
+        """
+        width:     frames are downscaled to this width before detecting
+        min_score: lowest SVM score a detection needs
+        """
+        self.width = width
+        self.min_score = min_score
+        self._hog = cv2.HOGDescriptor()
+        self._hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+
+    def detect(self, frame):
+        """People in a BGR frame as (x0, y0, x1, y1) fractions, most confident first"""
+        height, width = frame.shape[:2]
+        if width > self.width:
+            frame = cv2.resize(frame, (self.width, max(1, round(height * self.width / width))),
+                               interpolation=cv2.INTER_AREA)
+            height, width = frame.shape[:2]
+        rects, scores = self._hog.detectMultiScale(frame, winStride=(8, 8), padding=(8, 8), scale=1.05)
+        found = sorted(zip(np.ravel(scores).tolist(), np.reshape(rects, (-1, 4)).tolist()), reverse=True)
+        return [(x / width, y / height, (x + w) / width, (y + h) / height)
+                for score, (x, y, w, h) in found if score >= self.min_score]
+
+
+class Track:
+    __slots__ = ("id", "box", "state", "points", "misses", "fixed")
+
+    def __init__(self, track_id, box, state, fixed=False):
+        self.id = track_id
+        self.box = box         # (x0, y0, x1, y1) fractions of the frame
+        self.state = state     # This person's ExerciseState
+        self.points = None     # Landmarks of the last sample, (33, 4) in full-frame coordinates
+        self.misses = 0        # Sampled frames in a row without landmarks
+        self.fixed = fixed     # Zones keep their box
+
+
+class MultiPersonStage:
+    def __init__(self, ring, pose_pool, stream_id, on_landmarks, state_factory, scheduler=None,
+                 zones=None, detector=None, detect_interval=1.0, max_tracks=6, max_misses=15,
+                 margin=0.15, frame_timeout=1.0, stage_histogram=None, metric_labels=None):
+        """
+        ring:            FrameRing filled by the camera's CaptureThread
+        pose_pool:       shared PosePool; track t of this stream is pool stream "<stream_id>#t"
+        on_landmarks:    callback(track, points, timestamp) running the exercise logic on track.state
+        state_factory:   new ExerciseState for a new track
+        zones:           fixed boxes, one track each (no detection); default: detect people
+        detector:        PersonDetector used without zones (default: a new one)
+        detect_interval: seconds between person detections
+        max_tracks:      most people followed at once
+        max_misses:      sampled frames without landmarks before a detected track is dropped
+        margin:          crop padding around a track's box, as a fraction of its size
+        stage_histogram, metric_labels: as for InferenceStage
+        """
+        self.ring = ring
+        self.pose_pool = pose_pool
+        self.stream_id = stream_id
+        self.on_landmarks = on_landmarks
+        self.state_factory = state_factory
+        self.scheduler = scheduler or AdaptiveScheduler()
+        self.detector = None if zones else (detector or PersonDetector())
+        self.detect_interval = detect_interval
+        self.max_tracks = max_tracks
+        self.max_misses = max_misses
+        self.margin = margin
+        self.frame_timeout = frame_timeout
+
+        self._ids = itertools.count(1)
+        self._tracks = [Track(next(self._ids), tuple(zone), state_factory(), fixed=True)
+                        for zone in (zones or [])]
+        self._last_detection = None
+        # Latest (track id, box, points, stats) per track, replaced whole after every frame
+        self.published = ()
+
+        self.timers = {}
+        for stage in ("convert", "detect", "inference", "logic"):
+            histogram = None
+            if stage_histogram is not None:
+                histogram = stage_histogram.labels(stage=stage, **(metric_labels or {}))
+            self.timers[stage] = StageTimer(histogram=histogram)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"multi-person-{self.stream_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        for track in self._tracks:
+            self.pose_pool.close_stream(self._pool_stream(track))
+
+    def stats(self):
+        """Per-track stats for the API"""
+        return [{"track": track_id, "box": [round(v, 3) for v in box], **stats}
+                for track_id, box, _, stats in self.published]
+
+    def _pool_stream(self, track):
+        return f"{self.stream_id}#{track.id}"
+
+    def _run(self):
+        last_seq = 0
+        frame = None
+        while not self._stop.is_set():
+            wait = self.scheduler.wait_time(time.time())
+            if wait > 0 and self._stop.wait(wait):
+                break
+
+            latest = self.ring.latest(frame, after_seq=last_seq, timeout=self.frame_timeout)
+            if latest is None:
+                if self.ring.closed:
+                    break
+                continue
+            last_seq, captured_at, frame = latest
+
+            sampled_at = time.time()
+            sample_start = time.perf_counter()
+            self.step(self.scheduler.prepare(frame), captured_at)
+            self.scheduler.observe(sampled_at, time.perf_counter() - sample_start)
+
+    def step(self, frame, captured_at):
+        """Track and evaluate everyone in one BGR frame"""
+        if self.detector is not None and (self._last_detection is None or
+                                          captured_at - self._last_detection >= self.detect_interval):
+            start = time.perf_counter()
+            self._update_tracks(self.detector.detect(frame))
+            self._last_detection = captured_at
+            self.timers["detect"].record(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        height, width = frame.shape[:2]
+        items, crops = [], []
+        for track in self._tracks:
+            x0, y0, x1, y1 = expand_box(track.box, self.margin)
+            left, top = int(x0 * width), int(y0 * height)
+            right, bottom = int(np.ceil(x1 * width)), int(np.ceil(y1 * height))
+            if right - left < 16 or bottom - top < 16:
+                continue
+            crop = cv2.cvtColor(frame[top:bottom, left:right], cv2.COLOR_BGR2RGB)
+            items.append((self._pool_stream(track), crop, captured_at))
+            crops.append((track, left / width, top / height, (right - left) / width, (bottom - top) / height))
+        self.timers["convert"].record(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        results = self.pose_pool.process_many(items, self.frame_timeout) if items else []
+        self.timers["inference"].record(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for (track, left, top, crop_width, crop_height), result in zip(crops, results):
+            if result is None or not result.pose_landmarks:
+                track.points = None  # Left or hidden: stop drawing the last skeleton
+                track.misses += 1
+                continue
+            points = landmarks_to_array(result.pose_landmarks.landmark, with_visibility=True)
+            # Crop-relative -> frame-relative (z is scaled like x)
+            points[:, 0] = left + points[:, 0] * crop_width
+            points[:, 1] = top + points[:, 1] * crop_height
+            points[:, 2] *= crop_width
+            track.points = points
+            track.misses = 0
+            if not track.fixed:
+                self._follow(track, points)
+            self.on_landmarks(track, points, captured_at)
+        self._drop_lost_tracks()
+        self.published = tuple((track.id, track.box, track.points, track.state.snapshot())
+                               for track in self._tracks)
+        self.timers["logic"].record(time.perf_counter() - start)
+
+    def _follow(self, track, points):
+        """Re-center a detected track's box on its visible landmarks"""
+        visible = points[points[:, 3] >= LANDMARK_VISIBILITY, :2]
+        if len(visible) < 4:
+            return
+        x0, y0 = np.clip(visible.min(axis=0), 0.0, 1.0).tolist()
+        x1, y1 = np.clip(visible.max(axis=0), 0.0, 1.0).tolist()
+        if x1 > x0 and y1 > y0:
+            track.box = expand_box((x0, y0, x1, y1), self.margin)
+
+    def _update_tracks(self, detections):
+        """Match detections to tracks by overlap; unmatched detections become new tracks"""
+        unmatched = [track for track in self._tracks if not track.fixed]
+        for box in detections:
+            best = max(unmatched, key=lambda track: box_iou(track.box, box), default=None)
+            if best is not None and box_iou(best.box, box) >= BOX_MATCH_IOU:
+                unmatched.remove(best)
+                if best.misses:
+                    best.box = box  # Lost its landmarks; take the detector's word for it
+            elif len(self._tracks) < self.max_tracks:
+                self._tracks.append(Track(next(self._ids), box, self.state_factory()))
+        for track in unmatched:
+            track.misses += 1
+
+    def _drop_lost_tracks(self):
+        kept = []
+        for track in self._tracks:
+            if track.fixed or track.misses <= self.max_misses:
+                kept.append(track)
+            else:
+                self.pose_pool.close_stream(self._pool_stream(track))
+        self._tracks = kept
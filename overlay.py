@@ -0,0 +1,139 @@
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from utils.pose_landmarks import POSE_CONNECTIONS
+
+
+# ===== OVERLAY RENDERER =====
+# Draws the skeleton and the stats HUD onto outgoing frames. Colors, fonts
+# and the connection table are set up once; all bones are drawn by a single
+# polylines call from one vectorized visibility / pixel pass (joints are two
+# small circles each, like mediapipe's); text is rendered once per distinct string
+# into a sprite and then blitted with one masked copy, since the feedback
+# strings come from a small fixed set and reps / time change once a second.
+
+FEEDBACK_COLORS = {
+    "correct": (0, 255, 0),
+    "warning": (0, 165, 255),
+    "error": (0, 0, 255),
+}
+DEFAULT_FEEDBACK_COLOR = (255, 255, 255)
+
+JOINT_BORDER_COLOR = (224, 224, 224)  # mediapipe's "white"
+STATS_COLOR = (0, 255, 0)
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+VISIBILITY_THRESHOLD = 0.5  # Same cut-off as mediapipe's draw_landmarks
+
+_CONNECTIONS = np.array(POSE_CONNECTIONS, dtype=np.intp)
+
+
+def hard_edged_text():
+    """Whether putText draws without antialiasing (OpenCV 4 does, OpenCV 5 doesn't)"""
+    probe = np.zeros((40, 40), dtype=np.uint8)
+    cv2.putText(probe, "A", (5, 30), FONT, 1.0, 255, 2)
+    return not np.count_nonzero((probe != 0) & (probe != 255))
+
+
+class TextSprite:
+    """A string rendered once: its pixels, a mask, and its offset from the baseline origin"""
+    __slots__ = ("image", "mask", "dx", "dy")
+
+    def __init__(self, text, scale, color, thickness):
+        (width, height), baseline = cv2.getTextSize(text, FONT, scale, thickness)
+        pad = thickness
+        self.mask = np.zeros((height + baseline + 2 * pad, width + 2 * pad), dtype=np.uint8)
+        cv2.putText(self.mask, text, (pad, pad + height), FONT, scale, 255, thickness)
+        self.image = np.empty(self.mask.shape + (3,), dtype=np.uint8)
+        self.image[:] = color
+        self.dx = -pad
+        self.dy = -(pad + height)
+
+    def draw(self, frame, origin):
+        x, y = origin[0] + self.dx, origin[1] + self.dy
+        # Clip to the frame
+        x0, y0 = max(x, 0), max(y, 0)
+        x1 = min(x + self.mask.shape[1], frame.shape[1])
+        y1 = min(y + self.mask.shape[0], frame.shape[0])
+        if x0 >= x1 or y0 >= y1:
+            return
+        sx, sy = slice(x0 - x, x1 - x), slice(y0 - y, y1 - y)
+        cv2.copyTo(self.image[sy, sx], self.mask[sy, sx], frame[y0:y1, x0:x1])
+
+
+class OverlayRenderer:
+    def __init__(self, bone_color=(245, 66, 230), joint_color=(245, 117, 66), thickness=2,
+                 joint_radius=2, cache_size=256):
+        self.bone_color = bone_color
+        self.joint_color = joint_color
+        self.thickness = thickness
+        self.joint_radius = joint_radius
+        self.joint_border_radius = max(joint_radius + 1, int(joint_radius * 1.2))
+        self.cache_size = cache_size
+        self._sprites = OrderedDict()
+        self._lock = threading.Lock()  # Renderers are shared between streams
+        # A masked copy only reproduces hard-edged text; blending antialiased
+        # sprites back in costs more than putText itself
+        self.use_sprites = hard_edged_text()
+
+    def sprite(self, text, scale, color, thickness):
+        key = (text, scale, color, thickness)
+        with self._lock:
+            sprite = self._sprites.get(key)
+            if sprite is not None:
+                self._sprites.move_to_end(key)
+                return sprite
+        sprite = TextSprite(text, scale, color, thickness)
+        with self._lock:
+            self._sprites[key] = sprite
+            if len(self._sprites) > self.cache_size:
+                self._sprites.popitem(last=False)
+        return sprite
+
+    def draw_text(self, frame, text, origin, scale, color, thickness=2):
+        if self.use_sprites:
+            self.sprite(text, scale, color, thickness).draw(frame, origin)
+        else:
+            cv2.putText(frame, text, origin, FONT, scale, color, thickness)
+
+    def draw_skeleton(self, frame, points):
+        """points: (33, 4) normalized x, y, z, visibility as packed by landmarks_to_array"""
+        height, width = frame.shape[:2]
+        xy = points[:, :2]
+        visible = (points[:, 3] >= VISIBILITY_THRESHOLD) & np.all((xy >= 0) & (xy <= 1), axis=1)
+        pixels = np.minimum(np.floor(xy * (width, height)), (width - 1, height - 1)).astype(np.int32)
+
+        bones = _CONNECTIONS[visible[_CONNECTIONS].all(axis=1)]
+        if len(bones):
+            cv2.polylines(frame, list(pixels[bones]), False, self.bone_color, self.thickness)
+
+        for joint in pixels[visible].tolist():
+            joint = tuple(joint)
+            cv2.circle(frame, joint, self.joint_border_radius, JOINT_BORDER_COLOR, self.thickness)
+            cv2.circle(frame, joint, self.joint_radius, self.joint_color, self.thickness)
+
+    def draw_stats(self, frame, stats):
+        self.draw_text(frame, f"Reps: {stats['reps']}", (10, 30), 0.8, STATS_COLOR)
+        self.draw_text(frame, f"Time: {int(stats['time'])}s", (10, 70), 0.8, STATS_COLOR)
+        color = FEEDBACK_COLORS.get(stats['feedback_class'], DEFAULT_FEEDBACK_COLOR)
+        self.draw_text(frame, stats['feedback'], (10, 110), 0.7, color)
+
+    def draw_tracks(self, frame, tracks):
+        """Skeleton and a "#id reps" label per person; tracks as in MultiPersonStage.published"""
+        height, width = frame.shape[:2]
+        for track_id, box, points, stats in tracks:
+            if points is not None:
+                self.draw_skeleton(frame, points)
+            color = FEEDBACK_COLORS.get(stats['feedback_class'], DEFAULT_FEEDBACK_COLOR)
+            origin = (int(box[0] * width) + 5, max(20, int(box[1] * height) + 20))
+            self.draw_text(frame, f"#{track_id}  {stats['reps']} reps", origin, 0.6, color)
+        return frame
+
+    def draw(self, frame, points, stats):
+        if points is not None:
+            self.draw_skeleton(frame, points)
+        self.draw_stats(frame, stats)
+        return frame
@@ -0,0 +1,56 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+# ===== PASSWORD HASHER =====
+# Password hashes are deliberately expensive (scrypt / pbkdf2 take tens of
+# milliseconds of CPU). Run on request threads, a burst of logins hashes on
+# every core at once and starves the video streams' inference. Here hashing
+# runs on a small fixed pool; requests wait for their result, and when more
+# than max_pending are already queued new ones are turned away (HasherBusy)
+# instead of piling up.
+
+class HasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self, max_workers=1, max_pending=32, timeout=10.0):
+        """
+        max_workers: hashes computed at the same time (0 = on the calling thread)
+        max_pending: hashes queued or running before new ones are refused
+        timeout:     seconds a request waits for its hash
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="password-hasher") \
+            if max_workers else None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.refused = 0
+
+    def _run(self, function, *args):
+        if self._executor is None:
+            return function(*args)
+        if not self._slots.acquire(blocking=False):
+            self.refused += 1
+            raise HasherBusy("Too many logins at once, please try again")
+        try:
+            future = self._executor.submit(function, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result(self.timeout)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
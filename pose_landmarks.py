@@ -0,0 +1,66 @@
+import re
+from enum import IntEnum
+
+
+# ===== POSE LANDMARK INDICES =====
+# Same names and indices as mediapipe's PoseLandmark, so the logic layer can
+# index landmark arrays without importing mediapipe.
+
+class PoseLandmark(IntEnum):
+    NOSE = 0
+    LEFT_EYE_INNER = 1
+    LEFT_EYE = 2
+    LEFT_EYE_OUTER = 3
+    RIGHT_EYE_INNER = 4
+    RIGHT_EYE = 5
+    RIGHT_EYE_OUTER = 6
+    LEFT_EAR = 7
+    RIGHT_EAR = 8
+    MOUTH_LEFT = 9
+    MOUTH_RIGHT = 10
+    LEFT_SHOULDER = 11
+    RIGHT_SHOULDER = 12
+    LEFT_ELBOW = 13
+    RIGHT_ELBOW = 14
+    LEFT_WRIST = 15
+    RIGHT_WRIST = 16
+    LEFT_PINKY = 17
+    RIGHT_PINKY = 18
+    LEFT_INDEX = 19
+    RIGHT_INDEX = 20
+    LEFT_THUMB = 21
+    RIGHT_THUMB = 22
+    LEFT_HIP = 23
+    RIGHT_HIP = 24
+    LEFT_KNEE = 25
+    RIGHT_KNEE = 26
+    LEFT_ANKLE = 27
+    RIGHT_ANKLE = 28
+    LEFT_HEEL = 29
+    RIGHT_HEEL = 30
+    LEFT_FOOT_INDEX = 31
+    RIGHT_FOOT_INDEX = 32
+
+
+NUM_LANDMARKS = len(PoseLandmark)
+
+_SIDE = re.compile(r"left|right|LEFT|RIGHT")
+_OTHER_SIDE = {"left": "right", "right": "left", "LEFT": "RIGHT", "RIGHT": "LEFT"}
+
+
+def mirror_name(name):
+    """The same body part on the other side: LEFT_KNEE <-> RIGHT_KNEE, left_elbow <-> right_elbow"""
+    return _SIDE.sub(lambda match: _OTHER_SIDE[match.group()], name)
+
+
+# MIRRORED[i] is landmark i's counterpart on the other side of the body (NOSE stays NOSE)
+MIRRORED = tuple(PoseLandmark[mirror_name(landmark.name)] for landmark in PoseLandmark)
+
+# Skeleton edges, same as mediapipe's POSE_CONNECTIONS
+POSE_CONNECTIONS = (
+    (0, 1), (0, 4), (1, 2), (2, 3), (3, 7), (4, 5), (5, 6), (6, 8), (9, 10),
+    (11, 12), (11, 13), (11, 23), (12, 14), (12, 24), (13, 15), (14, 16),
+    (15, 17), (15, 19), (15, 21), (16, 18), (16, 20), (16, 22), (17, 19),
+    (18, 20), (23, 24), (23, 25), (24, 26), (25, 27), (26, 28), (27, 29),
+    (27, 31), (28, 30), (28, 32), (29, 31), (30, 32),
+)
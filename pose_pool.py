@@ -0,0 +1,317 @@
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+# ===== SHARED POSE WORKER POOL =====
+# A fixed number of worker threads serve every stream. Streams submit frames
+# into their own short queue and pick up the newest result, so CPU use is
+# bounded by the pool size instead of growing with the number of viewers.
+#
+# Each stream sticks to one worker, which keeps a Pose model for it in
+# tracking mode: after the first detection the model follows the person from
+# frame to frame instead of running the detector on every frame, which is
+# cheaper and steadier. A stream only moves to another worker when its own is
+# backed up and the other has room; the move costs it one fresh detection.
+# mediapipe is imported by the workers, not with this module.
+
+WARM_UP_FRAME_SHAPE = (256, 256, 3)  # Blank frame each worker runs once when it starts
+
+class _StreamQueue:
+    def __init__(self, maxlen):
+        self.frames = deque(maxlen=maxlen)  # Full queue drops the oldest frame
+        self.scheduled = False              # Waiting in the ready list or being processed
+        self.closed = False
+        self.seq = 0
+        self.result = None
+        self.timestamp = None
+        self.complexity = None
+        self.dropped = 0
+        self.worker = None                  # Index of the worker that serves it
+
+
+class PosePool:
+    def __init__(self, num_workers=None, model_complexity=1, fallback_complexity=0,
+                 queue_size=2, saturation_backlog=None, static_image_mode=False):
+        """
+        num_workers:         Pose models / worker threads (default: one per spare core)
+        model_complexity:    model used while the pool keeps up
+        fallback_complexity: lighter model used while the pool is saturated
+        queue_size:          frames buffered per stream before the oldest is dropped
+        saturation_backlog:  streams waiting for a worker before falling back (default: num_workers)
+        static_image_mode:   run the detector on every frame instead of tracking; a worker
+                             then shares one model between its streams instead of keeping
+                             one per stream
+        """
+        self.num_workers = num_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.model_complexity = model_complexity
+        self.fallback_complexity = fallback_complexity
+        self.queue_size = queue_size
+        self.saturation_backlog = saturation_backlog or self.num_workers
+        self.static_image_mode = static_image_mode
+
+        self._lock = threading.Lock()
+        self._result_ready = threading.Condition(self._lock)
+        self._streams = {}
+        # Per worker: streams ready for it, its wake-up, whether it is running a
+        # frame, how many streams it serves and streams whose models it should close
+        self._ready = [deque() for _ in range(self.num_workers)]
+        self._work_ready = [threading.Condition(self._lock) for _ in range(self.num_workers)]
+        self._busy = [False] * self.num_workers
+        self._assigned = [0] * self.num_workers
+        self._retired = [[] for _ in range(self.num_workers)]
+        self._moves = 0
+        self._workers = []
+        self._running = False
+        self._warmed = threading.Condition(self._lock)
+        self._warm_workers = 0
+
+    def start(self):
+        """Start the worker threads (called automatically on first submit)"""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._warm_workers = 0
+            for i in range(self.num_workers):
+                worker = threading.Thread(target=self._work, args=(i,), name=f"pose-worker-{i}",
+                                          daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def warm_up(self, timeout=None):
+        """Start the workers and wait until each has loaded its model and run it once.
+
+        Returns False if that took longer than timeout.
+        """
+        self.start()
+        with self._lock:
+            return self._warmed.wait_for(lambda: self._warm_workers >= self.num_workers, timeout)
+
+    def submit(self, stream_id, frame_rgb, timestamp=None):
+        """Queue an RGB frame for stream_id, dropping its oldest queued frame when full"""
+        if not self._running:
+            self.start()
+        with self._lock:
+            stream = self._streams.get(stream_id)
+            if stream is None:
+                stream = self._streams[stream_id] = _StreamQueue(self.queue_size)
+                stream.worker = min(range(self.num_workers), key=self._assigned.__getitem__)
+                self._assigned[stream.worker] += 1
+            if len(stream.frames) == stream.frames.maxlen:
+                stream.dropped += 1
+            stream.frames.append((frame_rgb, timestamp))
+            if not stream.scheduled:
+                stream.scheduled = True
+                self._schedule(stream)
+
+    def wait_result(self, stream_id, after_seq=0, timeout=None):
+        """Wait for a result newer than after_seq.
+
+        Returns (seq, results, timestamp) or None on timeout / closed stream.
+        """
+        with self._lock:
+            stream = self._streams.get(stream_id)
+            if stream is None:
+                return None
+            if not self._result_ready.wait_for(
+                    lambda: stream.closed or stream.seq > after_seq, timeout):
+                return None
+            if stream.seq <= after_seq:
+                return None
+            return stream.seq, stream.result, stream.timestamp
+
+    def process(self, stream_id, frame_rgb, timestamp=None, timeout=1.0):
+        """Submit a frame and wait for the stream's next result (None on timeout)"""
+        with self._lock:
+            stream = self._streams.get(stream_id)
+            after_seq = stream.seq if stream else 0
+        self.submit(stream_id, frame_rgb, timestamp)
+        result = self.wait_result(stream_id, after_seq, timeout)
+        return result[1] if result else None
+
+    def process_many(self, items, timeout=1.0):
+        """process() for several streams at once: [(stream_id, frame_rgb, timestamp)] -> results.
+
+        Every frame is queued before waiting, so they run on all workers in parallel.
+        """
+        with self._lock:
+            after = [self._streams[stream_id].seq if stream_id in self._streams else 0
+                     for stream_id, _, _ in items]
+        for stream_id, frame_rgb, timestamp in items:
+            self.submit(stream_id, frame_rgb, timestamp)
+        deadline = time.monotonic() + timeout
+        results = []
+        for (stream_id, _, _), after_seq in zip(items, after):
+            result = self.wait_result(stream_id, after_seq, max(0.0, deadline - time.monotonic()))
+            results.append(result[1] if result else None)
+        return results
+
+    def close_stream(self, stream_id):
+        """Forget a stream and wake anything waiting on it"""
+        with self._lock:
+            stream = self._streams.pop(stream_id, None)
+            if stream is not None:
+                stream.closed = True
+                stream.frames.clear()
+                self._assigned[stream.worker] -= 1
+                self._retire(stream)
+                self._result_ready.notify_all()
+
+    def is_saturated(self):
+        """True while more streams are waiting than the pool can serve"""
+        return sum(map(len, self._ready)) >= self.saturation_backlog
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.num_workers,
+                "streams": len(self._streams),
+                "streams_per_worker": list(self._assigned),
+                "backlog": sum(map(len, self._ready)),
+                "moves": self._moves,
+                "dropped": sum(s.dropped for s in self._streams.values()),
+            }
+
+    def shutdown(self):
+        with self._lock:
+            self._running = False
+            for work_ready in self._work_ready:
+                work_ready.notify_all()
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.join(timeout=5)
+
+    def _load(self, worker):
+        return len(self._ready[worker]) + self._busy[worker]
+
+    def _schedule(self, stream):
+        """Queue a stream for its worker (lock held).
+
+        A worker with a frame running and another waiting is backed up; the
+        stream then moves to the least loaded worker if that one is at least
+        two frames better off, so streams don't bounce between equal workers.
+        """
+        worker = stream.worker
+        load = self._load(worker)
+        if load >= 2:
+            other = min(range(self.num_workers), key=self._load)
+            if self._load(other) <= load - 2:
+                self._retire(stream)  # Its tracking model stays behind
+                self._assigned[worker] -= 1
+                self._assigned[other] += 1
+                self._moves += 1
+                stream.worker = worker = other
+        self._ready[worker].append(stream)
+        self._work_ready[worker].notify()
+
+    def _retire(self, stream):
+        """Have the stream's worker close the models it keeps for it (lock held)"""
+        if not self.static_image_mode:
+            self._retired[stream.worker].append(stream)
+            self._work_ready[stream.worker].notify()
+
+    def _model(self, models, stream, complexity):
+        """A worker's model for a stream, loaded on first use"""
+        key = (None if self.static_image_mode else stream, complexity)
+        model = models.get(key)
+        if model is None:
+            # A tracking stream takes over the worker's warmed-up model while it is unclaimed
+            model = models.pop((None, complexity), None) if key[0] is not None else None
+            model = models[key] = model or self._new_model(complexity)
+        return model
+
+    def _new_model(self, complexity):
+        import mediapipe as mp
+        return mp.solutions.pose.Pose(static_image_mode=self.static_image_mode,
+                            model_complexity=complexity)
+
+    def _drop_fallback(self, complexity, error):
+        with self._lock:
+            if self.fallback_complexity != complexity:
+                return  # Another worker got here first
+            self.fallback_complexity = self.model_complexity
+        print(f"❌ Fallback pose model failed to load (complexity {complexity}), "
+              f"saturated streams stay on complexity {self.model_complexity}: {error}")
+
+    def _work(self, index):
+        ready, work_ready, retired = self._ready[index], self._work_ready[index], self._retired[index]
+        models = {}  # (stream, or None when shared, complexity) -> Pose
+        try:
+            # Load the main model and run it once up front, so the first stream
+            # doesn't wait for the model files to load and the graph to start
+            try:
+                model = models[None, self.model_complexity] = self._new_model(self.model_complexity)
+                model.process(np.zeros(WARM_UP_FRAME_SHAPE, dtype=np.uint8))
+            except Exception as e:
+                print(f"❌ Pose model failed to load (complexity {self.model_complexity}): {e}")
+            with self._lock:
+                self._warm_workers += 1
+                self._warmed.notify_all()
+
+            while True:
+                with self._lock:
+                    while self._running and not ready and not retired:
+                        work_ready.wait()
+                    if not self._running:
+                        return
+                    done, retired[:] = retired[:], []
+                    stream = None
+                    if not done:
+                        stream = ready.popleft()
+                        if stream.closed or not stream.frames:
+                            stream.scheduled = False
+                            continue
+                        frame_rgb, timestamp = stream.frames.popleft()
+                        self._busy[index] = True
+                        if self.is_saturated():
+                            complexity = self.fallback_complexity
+                        else:
+                            complexity = self.model_complexity
+
+                if done:
+                    # Closed or moved streams: their tracking state is of no further use
+                    for key in [key for key in models if key[0] in done]:
+                        models.pop(key).close()
+                    continue
+
+                try:
+                    model = self._model(models, stream, complexity)
+                except Exception as e:
+                    model = None
+                    if complexity == self.model_complexity:
+                        print(f"❌ Pose model failed to load (complexity {complexity}): {e}")
+                    else:
+                        # Fallback model unavailable, keep serving with the main one
+                        self._drop_fallback(complexity, e)
+                        complexity = self.model_complexity
+                        try:
+                            model = self._model(models, stream, complexity)
+                        except Exception as e:
+                            print(f"❌ Pose model failed to load (complexity {complexity}): {e}")
+                try:
+                    # A frame that fails (e.g. a corrupt one) only costs that frame
+                    results = model.process(frame_rgb) if model is not None else None
+                except Exception as e:
+                    print(f"❌ Pose inference failed (complexity {complexity}): {e}")
+                    results = None
+
+                with self._lock:
+                    self._busy[index] = False
+                    stream.seq += 1
+                    stream.result = results
+                    stream.timestamp = timestamp
+                    stream.complexity = complexity
+                    # One worker per stream at a time keeps its frames in order;
+                    # requeue at the back so busy streams don't starve the others
+                    if stream.frames and not stream.closed:
+                        self._schedule(stream)
+                    else:
+                        stream.scheduled = False
+                    self._result_ready.notify_all()
+        finally:
+            for model in models.values():
+                model.close()
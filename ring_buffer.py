@@ -0,0 +1,60 @@
+import numpy as np
+
+
+# ===== RING BUFFER =====
+# The last `capacity` timestamped samples, kept in arrays allocated once up
+# front: appending overwrites the oldest sample, so a session's history costs
+# the same memory after ten seconds as after ten hours.
+
+class RingBuffer:
+    __slots__ = ("timestamps", "values", "count")
+
+    def __init__(self, capacity, width=0, dtype=np.float32):
+        """
+        capacity: samples kept
+        width:    values per sample (0 = timestamps only)
+        """
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros((capacity, width), dtype=dtype)
+        self.count = 0  # Samples appended since the last clear, including overwritten ones
+
+    @property
+    def capacity(self):
+        return len(self.timestamps)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, timestamp, values=None):
+        i = self.count % self.capacity
+        self.timestamps[i] = timestamp
+        if values is not None:
+            self.values[i] = values
+        self.count += 1
+
+    def clear(self):
+        self.count = 0
+
+    def arrays(self):
+        """(timestamps, values) oldest first, as copies"""
+        if self.count <= self.capacity:
+            return self.timestamps[:self.count].copy(), self.values[:self.count].copy()
+        i = self.count % self.capacity
+        return (np.concatenate((self.timestamps[i:], self.timestamps[:i])),
+                np.concatenate((self.values[i:], self.values[:i])))
+
+    def to_dict(self):
+        timestamps, values = self.arrays()
+        data = {"timestamps": timestamps.tolist()}
+        if self.values.shape[1]:
+            data["values"] = values.tolist()
+        return data
+
+    def load(self, data):
+        """Refill from to_dict() output (keeps the newest samples that fit)"""
+        timestamps = np.asarray(data["timestamps"], dtype=np.float64)[-self.capacity:]
+        n = len(timestamps)
+        self.timestamps[:n] = timestamps
+        if "values" in data and n:
+            self.values[:n] = np.asarray(data["values"])[-n:]
+        self.count = n
@@ -0,0 +1,339 @@
+import math
+import re
+import time
+
+import numpy as np
+
+from utils.pose_landmarks import MIRRORED, mirror_name
+from utils.smoothing import OneEuroFilter
+
+
+# ===== EXERCISE RULE ENGINE =====
+# Exercises are data: which joint angles and landmark coordinates they read,
+# when the user counts as active, and ordered phases of rules. Within a phase
+# the first rule whose conditions all hold wins (an if / elif chain); a rule
+# can set the feedback, set or require the rep direction and count a rep.
+#
+# Every threshold condition of every rule is compiled once into flat tables
+# (left slot, right slot, strict / non-strict) over a feature vector that
+# also holds the constants, so a frame is evaluated by gathering its features
+# into one vector and comparing all conditions in a single vectorized step. Only the rep
+# direction, which earlier phases may change mid-frame, is checked per rule.
+#
+# Condition syntax: "knee > 160", "80 <= knee <= 100", "elbow_x > shoulder_x + 0.05"
+# Features that are missing (a None memory value) are NaN, so every
+# comparison involving them is false.
+#
+# Per session, angles can run through a One-Euro filter ("smoothing") and
+# conditions on noisy features can latch ("hysteresis": {feature: band}): a
+# condition that held on the previous frame keeps holding until the feature
+# is more than band past its threshold, so one noisy frame around a threshold
+# can't flip the rep direction back and forth.
+#
+# Specs are written for the left side of the body. With "sides" set, every
+# angle and point is also read from the mirrored right side (x coordinates
+# flipped, so "forward" means the same thing facing either way) in the same
+# vectorized gather, and each frame uses the side whose landmarks MediaPipe
+# sees best, or a visibility-weighted blend of both when both are clearly
+# visible and the spec allows it ("blend_sides"). Frames where neither side
+# is visible enough are skipped before any rule is evaluated.
+
+_COMPARISON = re.compile(r"\s*(<=|>=|<|>)\s*")
+_OPERAND = re.compile(r"^(?:([A-Za-z_]\w*)(?:\s*([+-])\s*(\d+(?:\.\d*)?))?|(-?\d+(?:\.\d*)?))$")
+_AXES = {"x": 0, "y": 1, "z": 2}
+
+
+class RuleError(ValueError):
+    pass
+
+
+class RuleState:
+    """Per-session working state of a CompiledExercise (latches, angle filter, side)"""
+    __slots__ = ("exercise", "latched", "smoother", "side", "skipped")
+
+    def __init__(self, exercise):
+        self.exercise = exercise
+        self.latched = None
+        self.side = 0      # 0 = left, 1 = right (mirrored)
+        self.skipped = 0   # Frames dropped for low landmark visibility
+        smoothing = exercise.spec.get("smoothing")
+        self.smoother = OneEuroFilter(**smoothing) if smoothing else None
+
+
+class CompiledExercise:
+    """An exercise spec compiled to threshold tables; called like a logic function"""
+
+    def __init__(self, name, spec, compute_angles, angle_index, angle_landmarks=None):
+        """
+        spec:            the exercise's rules (see EXERCISE_SPECS in exercise_logic)
+        compute_angles:  (landmarks, columns) -> (points, angles for just those columns)
+        angle_index:     angle name -> column
+        angle_landmarks: angle name -> landmarks it is measured from (needed for "sides")
+        """
+        self.name = name
+        self.spec = spec
+        self.compute_angles = compute_angles
+
+        angles = spec.get("angles", {})
+        points = spec.get("points", {})
+        self.memory = list(spec.get("memory", {}).items())  # (state attribute, feature)
+        self.seed_memory = spec.get("seed_memory", False)
+
+        names = list(angles) + list(points) + [attr for attr, _ in self.memory]
+        self.slots = {feature: i for i, feature in enumerate(names)}
+        if len(self.slots) != len(names):
+            raise RuleError(f"{name}: feature names must be unique")
+        # Constants and "feature + offset" operands get slots after the features
+        self._constants = {}  # value -> slot
+        self._derived = {}    # (slot, offset) -> slot
+        self._size = len(names)
+
+        # One row per side: [left] or [left, right]
+        self._sides = spec.get("sides")
+        angle_names = [list(angles.values())]
+        point_rows = [[int(landmark) for landmark, _ in points.values()]]
+        if self._sides:
+            angle_names.append([mirror_name(angle) for angle in angle_names[0]])
+            point_rows.append([int(MIRRORED[row]) for row in point_rows[0]])
+        try:
+            self._angle_columns = np.array([[angle_index[a] for a in names] for names in angle_names],
+                                           dtype=np.intp).reshape(len(angle_names), len(angles))
+        except KeyError as e:
+            raise RuleError(f"{name}: unknown angle {e}") from None
+        # Each frame computes only the columns this exercise reads (both sides)
+        self.angle_columns = np.unique(self._angle_columns)
+        self._angle_columns = np.searchsorted(self.angle_columns, self._angle_columns)
+        self._point_rows = np.array(point_rows, dtype=np.intp).reshape(len(point_rows), len(points))
+        self._point_axes = np.array([_AXES[axis] for _, axis in points.values()], dtype=np.intp)
+        # x on the mirrored side is read as 1 - x
+        flip = np.array([[side == 1 and axis == "x" for _, axis in points.values()]
+                         for side in range(len(point_rows))], dtype=bool).reshape(self._point_rows.shape)
+        self._point_scale = np.where(flip, -1.0, 1.0)
+        self._point_shift = np.where(flip, 1.0, 0.0)
+        self._one_side = np.eye(len(point_rows))
+        self._blend = bool(spec.get("blend_sides"))
+        if self._sides:
+            if angle_landmarks is None:
+                raise RuleError(f"{name}: \"sides\" needs the landmarks of every angle")
+            rows = {int(landmark) for angle in angles.values() for landmark in angle_landmarks[angle]}
+            rows.update(point_rows[0])
+            rows = sorted(rows)
+            # Landmarks whose mean visibility decides between the sides
+            self._visibility_rows = np.array([rows, [int(MIRRORED[row]) for row in rows]], dtype=np.intp)
+            self._visibility_mean = np.full(len(rows), 1.0 / len(rows), dtype=np.float32)
+        n_angles, n_points = len(angles), len(points)
+        self._angle_slots = slice(0, n_angles)
+        self._point_slots = slice(n_angles, n_angles + n_points)
+        self._memory_slots = range(n_angles + n_points, len(names))
+        self._memory_sources = [self.slots[feature] for _, feature in self.memory]
+
+        hysteresis = spec.get("hysteresis", {})
+        for feature in hysteresis:
+            if feature not in self.slots:
+                raise RuleError(f"{name}: unknown feature {feature!r} in hysteresis")
+        self._slot_bands = {self.slots[feature]: float(band) for feature, band in hysteresis.items()}
+
+        # Conditions, deduplicated, strict (<) ones first then non-strict (<=)
+        strict, loose = {}, {}
+        rules = []  # (atom keys, required direction, action)
+        for conditions in spec.get("active", []):
+            rules.append((self._parse_all(conditions, strict, loose), None, None))
+        self._active = list(range(len(rules)))
+
+        self._phases = []
+        for phase in spec.get("phases", []):
+            compiled = []
+            for rule in phase:
+                compiled.append(len(rules))
+                action = (rule.get("feedback"), "set_direction" in rule, rule.get("set_direction"),
+                          1 if rule.get("count_rep") else 0)
+                rules.append((self._parse_all(rule.get("when", []), strict, loose),
+                              rule.get("direction"), action))
+            self._phases.append(compiled)
+
+        atoms = list(strict) + list(loose)
+        self._n_strict = len(strict)
+        self._n_atoms = len(atoms)
+        atom_index = {atom: i for i, atom in enumerate(atoms)}
+        self._left = np.array([a[0] for a in atoms], dtype=np.intp)
+        self._right = np.array([a[1] for a in atoms], dtype=np.intp)
+        # Band a condition that held last frame is widened by (right side gets + band)
+        bands = [max(self._slot_bands.get(slot, 0.0) for slot in atom[:2]) for atom in atoms]
+        self._bands = np.array(bands, dtype=np.float64) if any(bands) else None
+
+        self._template = np.zeros(self._size)
+        for value, slot in self._constants.items():
+            self._template[slot] = value
+        self._derived_slots = np.array(list(self._derived.values()), dtype=np.intp)
+        self._derived_sources = np.array([source for source, _ in self._derived], dtype=np.intp)
+        self._derived_offsets = np.array([offset for _, offset in self._derived], dtype=np.float64)
+
+        # rule x condition table; padding points at an always-true slot
+        width = max([len(keys) for keys, _, _ in rules] + [1])
+        self._rule_atoms = np.full((len(rules), width), self._n_atoms, dtype=np.intp)
+        for i, (keys, _, _) in enumerate(rules):
+            self._rule_atoms[i, :len(keys)] = [atom_index[key] for key in keys]
+        self._rules = [(direction, action) for _, direction, action in rules]
+
+        hold = spec.get("hold_timer")
+        self._hold = tuple(hold) if hold else None
+
+    def _slot(self, table, key):
+        if key not in table:
+            table[key] = self._size
+            self._size += 1
+        return table[key]
+
+    def _operand(self, text, condition):
+        """The feature vector slot holding an operand's value"""
+        match = _OPERAND.match(text.strip())
+        if not match:
+            raise RuleError(f"{self.name}: can't parse {text!r} in {condition!r}")
+        feature, sign, offset, constant = match.groups()
+        if constant is not None:
+            return self._slot(self._constants, float(constant))
+        if feature not in self.slots:
+            raise RuleError(f"{self.name}: unknown feature {feature!r} in {condition!r}")
+        if not offset:
+            return self.slots[feature]
+        value = float(offset)
+        source = self.slots[feature]
+        slot = self._slot(self._derived, (source, -value if sign == "-" else value))
+        if source in self._slot_bands:
+            self._slot_bands[slot] = self._slot_bands[source]
+        return slot
+
+    def _parse_all(self, conditions, strict, loose):
+        keys = []
+        for condition in conditions:
+            parts = _COMPARISON.split(condition.strip())
+            if len(parts) < 3 or len(parts) % 2 == 0:
+                raise RuleError(f"{self.name}: can't parse condition {condition!r}")
+            operands = [self._operand(part, condition) for part in parts[::2]]
+            for left, op, right in zip(operands, parts[1::2], operands[1:]):
+                # Everything becomes left < right or left <= right
+                if op in (">", ">="):
+                    left, right = right, left
+                is_strict = op in ("<", ">")
+                key = (left, right, is_strict)
+                (strict if is_strict else loose).setdefault(key, None)
+                keys.append(key)
+        return keys
+
+    def side_weights(self, points, rule_state):
+        """How much each side contributes to this frame, or None to skip the frame.
+
+        Switching sides takes a visibility lead of switch_margin, so a user
+        turned square to the camera doesn't flip between sides every frame.
+        """
+        if not self._sides or points.shape[-1] < 4:
+            return self._one_side[rule_state.side]  # No visibility to go on
+        visibility = (points[self._visibility_rows, 3] @ self._visibility_mean).tolist()
+        best = 0 if visibility[0] >= visibility[1] else 1
+        if visibility[best] < self._sides["min_visibility"]:
+            return None
+        if best != rule_state.side and visibility[best] - visibility[rule_state.side] > self._sides["switch_margin"]:
+            rule_state.side = best
+            if rule_state.smoother is not None:
+                rule_state.smoother.reset()  # The other side's angles are a different signal
+        if self._blend and min(visibility) >= self._sides["blend_visibility"]:
+            total = visibility[0] + visibility[1]
+            return np.array([visibility[0] / total, visibility[1] / total])
+        return self._one_side[rule_state.side]
+
+    def features(self, points, angles, state, smoother=None, weights=None):
+        """The frame's feature vector: angles, coordinates, remembered values, constants
+
+        weights: per side, from side_weights (default: the left side only)
+        """
+        if weights is None:
+            weights = self._one_side[0]
+        features = self._template.copy()
+        side_angles = weights @ angles[self._angle_columns]
+        if smoother is None:
+            features[self._angle_slots] = side_angles
+        else:
+            timestamp = state.frame_time if state.frame_time is not None else time.time()
+            features[self._angle_slots] = smoother(side_angles, timestamp)
+        coords = points[self._point_rows, self._point_axes] * self._point_scale + self._point_shift
+        features[self._point_slots] = weights @ coords
+        for slot, (attr, _), source in zip(self._memory_slots, self.memory, self._memory_sources):
+            value = getattr(state, attr)
+            if value is None and self.seed_memory:
+                # A fresh state remembers the current frame as its previous one
+                value = float(features[source])
+                setattr(state, attr, value)
+            features[slot] = math.nan if value is None else value
+        if len(self._derived_slots):
+            features[self._derived_slots] = features[self._derived_sources] + self._derived_offsets
+        return features
+
+    def match(self, features, latched=None):
+        """Which rules' conditions hold for a feature vector.
+
+        latched: which conditions held on the previous frame (for hysteresis)
+        Returns (list of bools per rule, array of bools per condition).
+        """
+        left = features[self._left]
+        right = features[self._right]
+        if self._bands is not None and latched is not None:
+            right = right + self._bands * latched
+        holds = np.empty(self._n_atoms + 1, dtype=bool)
+        k = self._n_strict
+        np.less(left[:k], right[:k], out=holds[:k])
+        np.less_equal(left[k:], right[k:], out=holds[k:-1])
+        holds[-1] = True
+        return holds[self._rule_atoms].all(axis=1).tolist(), holds[:-1]
+
+    def __call__(self, landmarks, state):
+        rule_state = state.rule_state
+        if rule_state is None or rule_state.exercise is not self:
+            rule_state = state.rule_state = RuleState(self)
+
+        points, angles = self.compute_angles(landmarks, self.angle_columns)
+        weights = self.side_weights(points, rule_state)
+        if weights is None:
+            # Neither side is visible enough; the angles would be noise
+            rule_state.skipped += 1
+            return state
+        features = self.features(points, angles, state, rule_state.smoother, weights)
+        matched, rule_state.latched = self.match(features, rule_state.latched)
+        is_active = False
+        for i in self._active:
+            if matched[i]:
+                is_active = True
+                break
+        state.update_time(is_active)
+
+        rules = self._rules
+        for phase in self._phases:
+            for i in phase:
+                direction, action = rules[i]
+                if not matched[i] or (direction is not None and state.direction != direction):
+                    continue
+                feedback, sets_direction, new_direction, reps = action
+                if feedback is not None:
+                    state.feedback, state.feedback_class = feedback
+                if sets_direction:
+                    state.direction = new_direction
+                state.reps += reps
+                break
+
+        if self._hold is not None:
+            attr, feedback_class = self._hold
+            if state.feedback_class == feedback_class:
+                setattr(state, attr, getattr(state, attr) + state.frame_dt)
+            else:
+                setattr(state, attr, max(0, getattr(state, attr) - state.frame_dt))  # Penalize breaks
+
+        for (attr, _), source in zip(self.memory, self._memory_sources):
+            setattr(state, attr, float(features[source]))
+        state.record(angles, self.angle_columns)
+        return state
+
+
+def compile_exercises(specs, compute_angles, angle_index, defaults=None, angle_landmarks=None):
+    """{name: spec} -> {name: CompiledExercise}; defaults fill keys a spec leaves out"""
+    return {name: CompiledExercise(name, {**(defaults or {}), **spec}, compute_angles, angle_index,
+                                   angle_landmarks)
+            for name, spec in specs.items()}
@@ -0,0 +1,197 @@
+"""Production entry point: several app worker processes behind one proxy.
+
+Each worker is a separate Python process (its own GIL, pose models and
+session cache) serving the app on a local port. The proxy in this process
+accepts every connection on --port and hands it to a worker chosen by the
+session id, so a session's stream, /get_stats, SSE and landmark uploads all
+reach the process holding its state:
+  - /video_feed/<exercise>/<session_id>: the session id in the path
+  - everything else: the pose_affinity cookie set at login
+  - no session yet (home, login, static pages): round robin
+Session state is also written to a shared store (SESSION_STORE, by default
+an SQLite file next to the app), so any worker can still answer for a
+session whose worker was restarted. Dead workers are restarted.
+
+    python serve.py --workers 4 --port 8000
+    SECRET_KEY=... python serve.py          # keep logins valid across restarts
+    POSE_WARMUP=1 python serve.py           # load the pose models at boot, not on the first stream
+
+Workers answer HTTP/1.1 but with `Connection: close` (werkzeug's server has
+no keep-alive), so every connection carries one request and the proxy can
+route per connection and then only copy bytes, which keeps MJPEG, SSE and
+WebSocket streams working unchanged. Session routing depends on this: a
+worker that kept connections alive would receive the next request on the
+connection whichever session it belongs to. A webcam can only be opened
+by one process: with CAMERA_SOURCE unset, run a single worker.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import threading
+import zlib
+from http.cookies import SimpleCookie
+
+from utils.session_store import AFFINITY_COOKIE
+
+MAX_HEAD_BYTES = 64 * 1024
+WORKER_CONNECT_TIMEOUT = 10.0  # Seconds to wait for a worker that is (re)starting
+
+
+def affinity_key(head):
+    """Session id a request head belongs to, or None"""
+    lines = head.decode("latin-1").split("\r\n")
+    parts = lines[0].split(" ")
+    path = parts[1].split("?", 1)[0] if len(parts) > 1 else ""
+    if path.startswith("/video_feed/"):
+        return path.rstrip("/").rsplit("/", 1)[-1]
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        if name.strip().lower() == "cookie":
+            cookie = SimpleCookie()
+            try:
+                cookie.load(value.strip())
+            except Exception:
+                continue
+            if AFFINITY_COOKIE in cookie:
+                return cookie[AFFINITY_COOKIE].value
+    return None
+
+
+def worker_for(key, count):
+    return zlib.crc32(key.encode()) % count
+
+
+class AffinityProxy:
+    def __init__(self, worker_ports, host="127.0.0.1"):
+        self.worker_ports = worker_ports
+        self.host = host
+        self._round_robin = itertools.count()
+
+    def pick(self, head):
+        key = affinity_key(head)
+        if key:
+            return self.worker_ports[worker_for(key, len(self.worker_ports))]
+        return self.worker_ports[next(self._round_robin) % len(self.worker_ports)]
+
+    async def _pipe(self, reader, writer):
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+            if writer.can_write_eof():
+                writer.write_eof()  # Half-close: the other direction may still be sending
+        except (ConnectionError, asyncio.CancelledError):
+            writer.close()
+
+    async def _connect(self, port):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + WORKER_CONNECT_TIMEOUT
+        while True:
+            try:
+                return await asyncio.open_connection(self.host, port)
+            except OSError:
+                if loop.time() > deadline:
+                    print(f"❌ Worker on port {port} is not accepting connections")
+                    return None
+                await asyncio.sleep(0.1)
+
+    async def handle(self, client_reader, client_writer):
+        try:
+            head = await client_reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            client_writer.close()
+            return
+        port = self.pick(head)
+        connection = await self._connect(port)
+        if connection is None:
+            client_writer.write(b"HTTP/1.0 502 Bad Gateway\r\nContent-Length: 0\r\n\r\n")
+            client_writer.close()
+            return
+        worker_reader, worker_writer = connection
+        worker_writer.write(head)
+        upstream = asyncio.ensure_future(self._pipe(client_reader, worker_writer))
+        try:
+            await self._pipe(worker_reader, client_writer)  # Until the worker closes (Connection: close)
+        finally:
+            upstream.cancel()
+            worker_writer.close()
+            client_writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_HEAD_BYTES)
+        async with server:
+            await server.serve_forever()
+
+
+def run_worker(host, port):
+    from werkzeug.serving import make_server
+    from app import app
+    # Exit normally on terminate so queued workouts are still written (atexit)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"✅ Worker {os.getpid()} serving on {host}:{port}")
+    make_server(host, port, app, threaded=True).serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--worker-port", type=int, default=None,
+                        help="first local port for the workers (default: --port + 1)")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker("127.0.0.1", args.port)
+        return
+
+    env = dict(os.environ)
+    env.setdefault("SECRET_KEY", secrets.token_hex(32))  # Shared, or sessions break between workers
+    env.setdefault("SESSION_STORE", "sqlite:sessions.db")
+    env.setdefault("POSE_WORKERS", "1")  # One pose model per process; the processes are the parallelism
+    first_port = args.worker_port or args.port + 1
+    ports = [first_port + i for i in range(args.workers)]
+
+    def spawn(port):
+        return subprocess.Popen([sys.executable, os.path.abspath(__file__), "--worker", "--port", str(port)],
+                                env=env)
+
+    workers = {port: spawn(port) for port in ports}
+    stopping = threading.Event()
+
+    def supervise():
+        while not stopping.wait(1.0):
+            for port, process in list(workers.items()):
+                if process.poll() is not None:
+                    print(f"❌ Worker on port {port} exited with {process.returncode}, restarting")
+                    workers[port] = spawn(port)
+
+    threading.Thread(target=supervise, name="worker-supervisor", daemon=True).start()
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # Take the workers down with us
+    print(f"✅ Proxy on {args.host}:{args.port} -> {args.workers} workers on ports {ports[0]}-{ports[-1]}")
+    try:
+        asyncio.run(AffinityProxy(ports).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stopping.set()
+        for process in workers.values():
+            process.terminate()
+        for process in workers.values():
+            try:
+                process.wait(5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+import json
+import threading
+import time
+
+from utils.db import Database
+
+
+# ===== SESSION STATE STORE =====
+# Exercise state sharded per session: each session has its own lock, so one
+# session's logic never waits on another's. After every update the writer
+# publishes an immutable stats snapshot; readers such as /get_stats just read
+# the latest snapshot reference and take no lock at all. Sessions nobody has
+# touched for `ttl` seconds (no stream, no stats polling) are evicted.
+#
+# The entries are always this process's working copies. A backend decides
+# whether they are also shared with other processes: MemoryBackend keeps
+# nothing outside the process; SQLiteBackend saves each session's state
+# whenever its stats visibly change (about once a second, not per frame), so
+# with several worker processes any of them can answer for a
+# session, or pick it up after the process that ran it died. Session-affinity
+# routing (see serve.py) keeps a session's requests on one process, so the
+# shared copy is a fallback rather than a lock everyone contends on. Saves
+# are written behind by one thread, never under a session's lock, so a busy
+# database slows the shared copy down, not the exercise logic. A copy
+# adopted from another process is refreshed from the backend whenever that
+# process has saved a newer one, until this process publishes to it itself.
+
+# Cookie holding the session id, for routing (serve.py); it is not a credential
+AFFINITY_COOKIE = "pose_affinity"
+
+def snapshot_delta(old, new):
+    """Fields of new that visibly differ from old (time counts in whole seconds)"""
+    delta = {key: new[key] for key in ("reps", "feedback", "feedback_class") if old[key] != new[key]}
+    if int(old["time"]) != int(new["time"]):
+        delta["time"] = new["time"]
+    return delta
+
+
+class MemoryBackend:
+    """Sessions live only in this process (single-process deployments)"""
+    shared = False
+
+    def load(self, session_id):
+        return None
+
+    def snapshot(self, session_id):
+        return None
+
+    def save(self, session_id, state, snapshot):
+        pass
+
+    def delete(self, session_id):
+        pass
+
+    def touch(self, session_ids):
+        pass
+
+    def evict(self, max_age):
+        return 0
+
+    def close(self, timeout=5.0):
+        pass
+
+
+class SQLiteBackend:
+    """Sessions shared by every worker process on the host through one SQLite file"""
+    shared = True
+
+    def __init__(self, path, retry_interval=1.0):
+        """
+        path:           SQLite file shared by the worker processes
+        retry_interval: seconds before the writer retries after a failed write
+        """
+        self.db = Database(path)
+        self.retry_interval = retry_interval
+        # session_id -> (state json, snapshot json, saved at), or None to delete; latest wins
+        self._pending = {}
+        self._writing = {}  # The batch the writer thread is writing right now
+        self._lock = threading.Lock()
+        self._work_ready = threading.Condition(self._lock)
+        self._idle = threading.Condition(self._lock)
+        self._thread = None
+        self._closed = False
+        self.failed = 0
+        with self.db.connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS session_states (
+                    session_id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    snapshot TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    last_seen REAL NOT NULL
+                )
+            ''')
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(session_states)")}
+            if "last_seen" not in columns:  # Store files from before last_seen
+                conn.execute("ALTER TABLE session_states ADD COLUMN last_seen REAL NOT NULL DEFAULT 0")
+                conn.execute("UPDATE session_states SET last_seen = updated_at")
+
+    def _unwritten(self, session_id):
+        """(True, row or None) for a save / delete still queued, else (False, None)"""
+        with self._lock:
+            for batch in (self._pending, self._writing):
+                if session_id in batch:
+                    return True, batch[session_id]
+        return False, None
+
+    def load(self, session_id):
+        """(the state's to_dict(), time it was saved) as last saved, or None"""
+        queued, row = self._unwritten(session_id)
+        if queued:
+            return (json.loads(row[0]), row[2]) if row else None
+        with self.db.connection() as conn:
+            row = conn.execute("SELECT state, updated_at FROM session_states WHERE session_id = ?",
+                               (session_id,)).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def snapshot(self, session_id):
+        queued, row = self._unwritten(session_id)
+        if queued:
+            return json.loads(row[1]) if row else None
+        with self.db.connection() as conn:
+            row = conn.execute("SELECT snapshot FROM session_states WHERE session_id = ?",
+                               (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, session_id, state, snapshot):
+        """Queue the state for the writer thread; never waits on the database"""
+        # History buffers stay in the owning process; the shared copy is the stats and counters
+        self._queue(session_id, (json.dumps(state.to_dict(history=False)), json.dumps(snapshot), time.time()))
+
+    def delete(self, session_id):
+        self._queue(session_id, None)  # In order with the session's saves
+
+    def _queue(self, session_id, row):
+        with self._lock:
+            self._pending[session_id] = row
+            self._work_ready.notify()
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._write, name="session-writer", daemon=True)
+                self._thread.start()
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far is written; False on timeout"""
+        with self._lock:
+            return self._idle.wait_for(lambda: not self._pending and not self._writing, timeout)
+
+    def close(self, timeout=5.0):
+        """Write what is queued and stop the writer thread"""
+        self.flush(timeout)
+        with self._lock:
+            self._closed = True
+            self._work_ready.notify()
+
+    def _write(self):
+        while True:
+            with self._lock:
+                while not self._pending and not self._closed:
+                    self._work_ready.wait()
+                if not self._pending:
+                    return
+                self._writing, self._pending = self._pending, {}
+                batch = self._writing
+            try:
+                with self.db.connection() as conn:
+                    for session_id, row in batch.items():
+                        if row is None:
+                            conn.execute("DELETE FROM session_states WHERE session_id = ?", (session_id,))
+                        else:
+                            conn.execute("INSERT OR REPLACE INTO session_states VALUES (?, ?, ?, ?, ?)",
+                                         (session_id, *row, row[2]))
+                written = True
+            except Exception as e:
+                written = False
+                print(f"❌ Failed to write {len(batch)} session(s) to the shared store: {e}")
+            with self._lock:
+                if not written:
+                    self.failed += 1
+                    for session_id, row in batch.items():
+                        self._pending.setdefault(session_id, row)  # Unless a newer one came in
+                self._writing = {}
+                if not self._pending:
+                    self._idle.notify_all()
+            if not written:
+                if self._closed:
+                    return  # Shutting down; the sessions stay in the owning process only
+                time.sleep(self.retry_interval)
+
+    def touch(self, session_ids):
+        """Mark sessions as still in use (idle ones publish nothing, so updated_at stands still)"""
+        now = time.time()
+        with self.db.connection() as conn:
+            conn.executemany("UPDATE session_states SET last_seen = ? WHERE session_id = ?",
+                             [(now, session_id) for session_id in session_ids])
+
+    def evict(self, max_age):
+        with self.db.connection() as conn:
+            return conn.execute("DELETE FROM session_states WHERE last_seen < ?",
+                                (time.time() - max_age,)).rowcount
+
+
+def make_backend(spec):
+    """Backend from a SESSION_STORE setting: "memory" or "sqlite:<path>" """
+    kind, _, path = (spec or "memory").partition(":")
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "sqlite":
+        return SQLiteBackend(path or "sessions.db")
+    raise ValueError(f"unknown session store {spec!r} (use memory or sqlite:<path>)")
+
+
+class SessionEntry:
+    __slots__ = ("session_id", "state", "lock", "changed", "snapshot", "version", "last_seen", "backend",
+                 "listeners", "adopted_at")
+
+    def __init__(self, session_id, state, backend=None, adopted_at=None):
+        self.session_id = session_id
+        self.state = state
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)  # Notified on visible changes
+        self.snapshot = state.snapshot()  # Never mutated, only replaced
+        self.version = 0
+        self.last_seen = time.monotonic()
+        self.listeners = []  # Callables run on visible changes, for waiters that can't block a thread
+        # Save time of the backend copy this entry was loaded from; None once this process owns it
+        self.adopted_at = adopted_at
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def publish(self):
+        """Publish the state's current stats (call while holding self.lock)
+
+        Subscribers waiting on `changed` are only woken when something they
+        display changed, so per-frame updates with the same reps / feedback
+        within the same second cost them nothing.
+        """
+        snapshot = self.state.snapshot()
+        changed = snapshot_delta(self.snapshot, snapshot)
+        self.snapshot = snapshot  # Before waking anyone, so they read the new one
+        self.last_seen = time.monotonic()
+        if changed:
+            self._changed()
+            if self.backend is not None:
+                # Only queued here; the backend writes it on its own thread, outside this lock
+                self.backend.save(self.session_id, self.state, snapshot)
+                self.adopted_at = None
+
+    def listen(self, listener):
+        with self.lock:
+            self.listeners.append(listener)
+
+    def unlisten(self, listener):
+        with self.lock:
+            if listener in self.listeners:
+                self.listeners.remove(listener)
+
+    def refresh(self, state, saved_at):
+        """Replace an adopted entry's state with a newer copy from the backend"""
+        with self.lock:
+            if self.adopted_at is None or saved_at <= self.adopted_at:
+                return
+            self.state = state
+            self.adopted_at = saved_at
+            snapshot = state.snapshot()
+            changed = snapshot_delta(self.snapshot, snapshot)
+            self.snapshot = snapshot
+            if changed:
+                self._changed()
+
+    def _changed(self):
+        # Under self.lock
+        self.version += 1
+        self.changed.notify_all()
+        for listener in self.listeners:
+            listener()  # Runs under the lock; must only hand off (e.g. call_soon_threadsafe)
+
+    def wait_for_change(self, version, timeout=None):
+        """Wait until the published version differs from version.
+
+        Returns (version, snapshot); the version is unchanged on timeout.
+        """
+        with self.lock:
+            self.changed.wait_for(lambda: self.version != version, timeout)
+            return self.version, self.snapshot
+
+
+class SessionStore:
+    def __init__(self, state_factory, ttl=1800.0, sweep_interval=60.0, backend=None):
+        """
+        state_factory:  callable() -> new ExerciseState (with a from_dict() for shared backends)
+        ttl:            seconds of inactivity before a session's state is evicted
+        sweep_interval: how often the background sweeper looks for expired sessions
+        backend:        MemoryBackend (default) or a shared backend such as SQLiteBackend
+        """
+        self.state_factory = state_factory
+        self.backend = backend or MemoryBackend()
+        self._shared = self.backend if self.backend.shared else None
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._entries = {}
+        self._lock = threading.Lock()  # Only guards adding / removing entries
+        self._sweeper = None
+
+    def create(self, session_id):
+        """Start a fresh state for session_id, replacing any previous one"""
+        state = self.state_factory()
+        state.start_time = time.time()
+        entry = SessionEntry(session_id, state, self._shared)
+        with self._lock:
+            self._entries[session_id] = entry
+        if self._shared is not None:
+            self._shared.save(session_id, state, entry.snapshot)
+        self._start_sweeper()
+        return entry
+
+    def get(self, session_id):
+        entry = self._entries.get(session_id) if session_id else None
+        if session_id and self._shared is not None and (entry is None or entry.adopted_at is not None):
+            entry = self._load(session_id, entry)
+        if entry is not None:
+            entry.last_seen = time.monotonic()
+        return entry
+
+    def _load(self, session_id, entry=None):
+        """Adopt a session another process saved to the shared backend, or refresh an adopted one"""
+        saved = self._shared.load(session_id)
+        if saved is None:
+            if entry is not None:  # Finished or evicted by its owner
+                with self._lock:
+                    if self._entries.get(session_id) is entry:
+                        del self._entries[session_id]
+            return None
+        data, saved_at = saved
+        if entry is not None:
+            if entry.adopted_at is not None and saved_at > entry.adopted_at:
+                entry.refresh(self.state_factory.from_dict(data), saved_at)
+            return entry
+        entry = SessionEntry(session_id, self.state_factory.from_dict(data), self._shared, adopted_at=saved_at)
+        with self._lock:
+            entry = self._entries.setdefault(session_id, entry)
+        self._start_sweeper()
+        return entry
+
+    def get_or_create(self, session_id):
+        return self.get(session_id) or self.create(session_id)
+
+    def pop(self, session_id):
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+        if self._shared is not None and session_id:
+            if entry is None or entry.adopted_at is not None:
+                saved = self._shared.load(session_id)
+                if saved is not None:
+                    entry = SessionEntry(session_id, self.state_factory.from_dict(saved[0]))
+            self._shared.delete(session_id)
+        return entry
+
+    def snapshot(self, session_id):
+        """Latest published stats for session_id, or None (lock-free in this process)"""
+        entry = self._entries.get(session_id) if session_id else None
+        if entry is not None:
+            entry.last_seen = time.monotonic()
+            if entry.adopted_at is None:
+                return entry.snapshot
+        if session_id and self._shared is not None:
+            return self._shared.snapshot(session_id)  # Read through: its owner may have moved on
+        return None
+
+    def __contains__(self, session_id):
+        return session_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def evict_expired(self, now=None):
+        """Drop sessions idle for longer than ttl; returns how many were evicted"""
+        cutoff = (time.monotonic() if now is None else now) - self.ttl
+        with self._lock:
+            expired = [sid for sid, entry in self._entries.items() if entry.last_seen < cutoff]
+            for sid in expired:
+                del self._entries[sid]
+            live = list(self._entries)
+        if self._shared is not None:
+            # Sessions still used here (a plank hold publishes nothing for a while) must outlive the sweep
+            self._shared.touch(live)
+            self._shared.evict(self.ttl)
+        return len(expired)
+
+    def _start_sweeper(self):
+        if self._sweeper is not None:
+            return
+        with self._lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep, name="session-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def _sweep(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                evicted = self.evict_expired()
+                if evicted:
+                    print(f"🧹 Evicted {evicted} abandoned exercise session(s)")
+            except Exception as e:
+                print(f"❌ Error evicting sessions: {e}")
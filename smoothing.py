@@ -0,0 +1,55 @@
+import math
+
+import numpy as np
+
+
+# ===== ONE-EURO FILTER =====
+# Streaming low-pass filter for noisy joint angles (Casiez et al., "1€ Filter").
+# It is an exponential moving average whose cutoff frequency rises with the
+# signal's speed: slow / still angles get smoothed hard (no jitter), fast
+# movements pass with little lag. Every update is O(1) and uses the real time
+# between samples, so dropped frames and lower inference rates don't change
+# how much smoothing is applied. Works on a whole vector of angles at once.
+
+def _alpha(dt, cutoff):
+    tau = 1.0 / (2 * math.pi * cutoff)
+    return 1.0 / (1.0 + tau / dt)
+
+
+class OneEuroFilter:
+    def __init__(self, min_cutoff=1.0, beta=0.0, d_cutoff=1.0, max_gap=1.0):
+        """
+        min_cutoff: cutoff (Hz) while the signal is still; lower = smoother
+        beta:       how fast the cutoff rises with speed (per unit/s); higher = less lag
+        d_cutoff:   cutoff (Hz) for the speed estimate itself
+        max_gap:    seconds without samples after which the filter starts over
+        """
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.max_gap = max_gap
+        self.reset()
+
+    def reset(self):
+        self._value = None
+        self._speed = None
+        self._timestamp = None
+
+    def __call__(self, values, timestamp):
+        """Filter one sample (a float or an array) taken at timestamp (seconds)"""
+        values = np.asarray(values, dtype=np.float64)
+        dt = None if self._timestamp is None else timestamp - self._timestamp
+        if dt is None or (self.max_gap is not None and dt > self.max_gap) or not np.isfinite(self._value).all():
+            self._value = values.copy()
+            self._speed = np.zeros_like(values)
+            self._timestamp = timestamp
+            return values
+        if dt <= 0:
+            return self._value.copy()  # Same or out-of-order timestamp
+
+        speed = (values - self._value) / dt
+        self._speed += _alpha(dt, self.d_cutoff) * (speed - self._speed)
+        cutoff = self.min_cutoff + self.beta * np.abs(self._speed)
+        self._value += _alpha(dt, cutoff) * (values - self._value)
+        self._timestamp = timestamp
+        return self._value.copy()
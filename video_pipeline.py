@@ -0,0 +1,164 @@
+import threading
+import time
+
+import cv2
+
+from utils.angle_utils import landmarks_to_array
+from utils.capture import StageTimer
+
+
+# ===== ADAPTIVE SCHEDULER =====
+# Rep counting only needs ~10-15 angle samples a second, so inference runs on a
+# sampled, downscaled subset of the camera frames. The sample rate and the
+# inference resolution back off when inference can't keep up and recover when
+# it has headroom.
+
+class AdaptiveScheduler:
+    def __init__(self, target_hz=15.0, min_hz=8.0, max_width=640, min_width=320,
+                 smoothing=0.2):
+        """
+        target_hz: angle samples per second to aim for
+        min_hz:    lowest sample rate before giving up on resolution instead
+        max_width: inference frame width when there is headroom
+        min_width: smallest inference frame width
+        """
+        self.target_hz = target_hz
+        self.min_hz = min_hz
+        self.max_width = max_width
+        self.min_width = min_width
+        self.smoothing = smoothing
+
+        self.sample_hz = target_hz
+        self.width = max_width
+        self.latency = None  # Smoothed per-sample cost (seconds)
+        self._last_sample_at = None
+
+    @property
+    def interval(self):
+        return 1.0 / self.sample_hz
+
+    def wait_time(self, now):
+        """Seconds until the next frame is due for inference"""
+        if self._last_sample_at is None:
+            return 0.0
+        return max(0.0, self._last_sample_at + self.interval - now)
+
+    def prepare(self, frame):
+        """Downscale a frame to the current inference width (landmarks are normalized)"""
+        height, width = frame.shape[:2]
+        if width <= self.width:
+            return frame
+        scaled_height = max(1, round(height * self.width / width))
+        return cv2.resize(frame, (self.width, scaled_height), interpolation=cv2.INTER_AREA)
+
+    def observe(self, sampled_at, latency):
+        """Record a finished sample (started at sampled_at) and adapt to its cost"""
+        self._last_sample_at = sampled_at
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.smoothing * (latency - self.latency)
+
+        budget = 1.0 / self.target_hz
+        if self.latency > budget:
+            # Too slow: shed resolution first, then sample less often
+            if self.width > self.min_width:
+                self.width = max(self.min_width, int(self.width * 0.8))
+            else:
+                self.sample_hz = max(self.min_hz, self.sample_hz * 0.9)
+        elif self.latency < 0.6 * budget:
+            # Headroom: restore the sample rate first, then resolution
+            if self.sample_hz < self.target_hz:
+                self.sample_hz = min(self.target_hz, self.sample_hz * 1.1)
+            elif self.width < self.max_width:
+                self.width = min(self.max_width, int(self.width * 1.25))
+
+    def snapshot(self):
+        return {
+            "sample_hz": round(self.sample_hz, 2),
+            "width": self.width,
+            "latency_ms": round((self.latency or 0) * 1000, 3),
+        }
+
+
+# ===== INFERENCE STAGE =====
+# Runs pose inference and the exercise logic on the newest camera frame on its
+# own thread, independent of how fast the MJPEG encoder / HTTP client go.
+
+class InferenceStage:
+    def __init__(self, ring, pose_pool, stream_id, on_landmarks, scheduler=None,
+                 frame_timeout=1.0, stage_histogram=None, metric_labels=None):
+        """
+        ring:         FrameRing filled by the camera's CaptureThread
+        pose_pool:    shared PosePool
+        stream_id:    this stream's queue in the pool
+        on_landmarks: callback(points, timestamp) running the exercise logic, points
+                      is the (33, 4) array from landmarks_to_array(..., with_visibility=True)
+        scheduler:    AdaptiveScheduler picking which frames to sample (default: new one)
+        stage_histogram, metric_labels: optional metrics Histogram (labelled by
+                      stage + metric_labels) that every stage timing is observed on
+        """
+        self.ring = ring
+        self.scheduler = scheduler or AdaptiveScheduler()
+        self.pose_pool = pose_pool
+        self.stream_id = stream_id
+        self.on_landmarks = on_landmarks
+        self.frame_timeout = frame_timeout
+
+        self.points = None  # Last sample's landmarks as a (33, 4) array, None without a pose; for drawing
+        self.timers = {}
+        for stage in ("convert", "inference", "logic", "capture_to_feedback"):
+            histogram = None
+            if stage_histogram is not None:
+                histogram = stage_histogram.labels(stage=stage, **(metric_labels or {}))
+            self.timers[stage] = StageTimer(histogram=histogram)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"inference-{self.stream_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def _run(self):
+        last_seq = 0
+        frame = None
+        while not self._stop.is_set():
+            # Frames between samples are skipped; the encoder keeps drawing
+            # the last known landmarks over them
+            wait = self.scheduler.wait_time(time.time())
+            if wait > 0 and self._stop.wait(wait):
+                break
+
+            latest = self.ring.latest(frame, after_seq=last_seq, timeout=self.frame_timeout)
+            if latest is None:
+                if self.ring.closed:
+                    break
+                continue
+            last_seq, captured_at, frame = latest
+
+            sampled_at = time.time()
+            sample_start = time.perf_counter()
+            frame_rgb = cv2.cvtColor(self.scheduler.prepare(frame), cv2.COLOR_BGR2RGB)
+            self.timers["convert"].record(time.perf_counter() - sample_start)
+
+            start = time.perf_counter()
+            results = self.pose_pool.process(self.stream_id, frame_rgb, captured_at)
+            self.timers["inference"].record(time.perf_counter() - start)
+            self.scheduler.observe(sampled_at, time.perf_counter() - sample_start)
+
+            if results is None or not results.pose_landmarks:
+                self.points = None  # Nobody in view: stop drawing the last skeleton
+                continue
+
+            start = time.perf_counter()
+            # Packed once here; drawing and the logic both use the array
+            points = landmarks_to_array(results.pose_landmarks.landmark, with_visibility=True)
+            self.points = points
+            self.on_landmarks(points, captured_at)
+            self.timers["logic"].record(time.perf_counter() - start)
+            self.timers["capture_to_feedback"].record(time.time() - captured_at)
@@ -0,0 +1,91 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+from utils.camera_registry import CameraRegistry, VideoFileSource
+from utils.mjpeg import MJPEGEncoder
+from utils.multi_person import MultiPersonStage, column_zones
+from utils.overlay import OverlayRenderer
+from utils.pose_pool import PosePool
+from utils.video_pipeline import AdaptiveScheduler, InferenceStage
+
+
+# ===== VIDEO STACK =====
+# Everything the video_feed path needs: OpenCV, the shared Pose models, the
+# cameras, the overlay renderer and the per-stream encoders / schedulers.
+# The app imports this module on the first video request (or right after
+# boot with POSE_WARMUP=1), so logins, the dashboard, the APIs and landmark
+# uploads are served without ever loading cv2 or mediapipe.
+
+class VideoStack:
+    def __init__(self, environ=os.environ):
+        self.environ = environ
+
+        # Shared Pose models for every video stream; POSE_STATIC_IMAGE_MODE=1
+        # runs the detector on every frame instead of tracking
+        self.pose_pool = PosePool(
+            num_workers=int(environ.get('POSE_WORKERS', 0)) or None,
+            model_complexity=int(environ.get('POSE_MODEL_COMPLEXITY', 1)),
+            fallback_complexity=int(environ.get('POSE_FALLBACK_COMPLEXITY', 0)),
+            queue_size=int(environ.get('POSE_QUEUE_SIZE', 2)),
+            static_image_mode=environ.get('POSE_STATIC_IMAGE_MODE', '0') == '1',
+        )
+
+        # One shared capture per camera; CAMERA_SOURCE=<video file> replaces the webcam
+        camera_source = environ.get('CAMERA_SOURCE')
+        self.camera_registry = CameraRegistry(
+            indices=[0] if camera_source else [0, 1, 2],
+            idle_timeout=float(environ.get('CAMERA_IDLE_TIMEOUT', 30)),
+            source_factory=(lambda index: VideoFileSource(camera_source)) if camera_source else None,
+        )
+
+        # Skeleton + stats HUD drawn onto streamed frames (text sprites are shared)
+        self.overlay_renderer = OverlayRenderer()
+
+    def make_encoder(self):
+        """MJPEG encoder for one stream; STREAM_WIDTH=0 keeps the camera's resolution"""
+        return MJPEGEncoder(
+            quality=int(self.environ.get('STREAM_JPEG_QUALITY', 80)),
+            width=int(self.environ.get('STREAM_WIDTH', 0)) or None,
+            every_nth=int(self.environ.get('STREAM_EVERY_NTH', 1)),
+            max_nth=int(self.environ.get('STREAM_MAX_NTH', 4)),
+        )
+
+    def inference_stage(self, ring, stream_id, on_landmarks, **kwargs):
+        """Inference stage for one stream, sampling the ring at the configured rate"""
+        return InferenceStage(ring, self.pose_pool, stream_id, on_landmarks, self._scheduler(), **kwargs)
+
+    def _scheduler(self):
+        return AdaptiveScheduler(
+            target_hz=float(self.environ.get('INFERENCE_HZ', 15)),
+            min_hz=float(self.environ.get('INFERENCE_MIN_HZ', 8)),
+            max_width=int(self.environ.get('INFERENCE_WIDTH', 640)),
+        )
+
+    def multi_person_stage(self, ring, stream_id, on_landmarks, state_factory, people='auto', **kwargs):
+        """Multi-person stage for one stream: people='auto' detects people, N splits the frame in N columns"""
+        zones = None if people == 'auto' else column_zones(int(people))
+        return MultiPersonStage(ring, self.pose_pool, stream_id, on_landmarks, state_factory,
+                                scheduler=self._scheduler(), zones=zones,
+                                detect_interval=float(self.environ.get('PERSON_DETECT_INTERVAL', 1.0)),
+                                **kwargs)
+
+    def error_frame(self, title, detail=None):
+        """Black 640x480 frame with an error message, for streams that can't start"""
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        cv2.putText(frame, title, (150, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+        if detail:
+            cv2.putText(frame, detail, (100, 280), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+        return frame
+
+    def warm_up(self, timeout=None):
+        """Load every pose worker's model and run it once; True when all are ready"""
+        start = time.perf_counter()
+        ready = self.pose_pool.warm_up(timeout)
+        if ready:
+            print(f"✅ Pose models ready in {time.perf_counter() - start:.1f}s")
+        else:
+            print(f"❌ Pose models not ready after {timeout}s")
+        return ready
@@ -0,0 +1,84 @@
+# ===== WORKOUT HISTORY QUERIES =====
+# Both queries are a single range scan of an index for one user, so they cost
+# O(log n + page size) however many workouts the table holds:
+#   history: workouts newest first, over idx_workouts_user_time
+#   trends:  per day / week totals, over workout_rollups' primary key
+# Pages are keyset-paginated: the response carries a cursor for the next page
+# instead of an OFFSET, which would have to skip the earlier rows one by one.
+
+HISTORY_PAGE_SIZE = 20
+MAX_HISTORY_PAGE_SIZE = 100
+TRENDS_PAGE_SIZE = 30
+MAX_TRENDS_PAGE_SIZE = 366
+TREND_PERIODS = ("day", "week")
+
+
+def _page_size(limit, default, maximum):
+    try:
+        limit = int(limit) if limit is not None else default
+    except ValueError:
+        raise ValueError("limit must be a number") from None
+    return min(max(limit, 1), maximum)
+
+
+def history_page(conn, user_id, limit=None, cursor=None):
+    """One page of a user's workouts, newest first.
+
+    cursor: next_cursor of the previous page ("<performed_at>|<id>"), None for the first
+    Returns {"workouts": [...], "next_cursor": str or None}.
+    """
+    limit = _page_size(limit, HISTORY_PAGE_SIZE, MAX_HISTORY_PAGE_SIZE)
+    if cursor:
+        performed_at, _, last_id = cursor.rpartition("|")
+        try:
+            last_id = int(last_id)
+        except ValueError:
+            raise ValueError("invalid cursor") from None
+        rows = conn.execute(
+            "SELECT id, exercise_type, duration_seconds, reps_completed, calories_burned, performed_at "
+            "FROM workouts WHERE user_id = ? AND (performed_at, id) < (?, ?) "
+            "ORDER BY performed_at DESC, id DESC LIMIT ?",
+            (user_id, performed_at, last_id, limit)).fetchall()
+    else:
+        rows = conn.execute(
+            "SELECT id, exercise_type, duration_seconds, reps_completed, calories_burned, performed_at "
+            "FROM workouts WHERE user_id = ? ORDER BY performed_at DESC, id DESC LIMIT ?",
+            (user_id, limit)).fetchall()
+
+    workouts = [{
+        "id": row[0],
+        "exercise": row[1],
+        "duration_seconds": row[2],
+        "reps": row[3],
+        "calories": round(row[4], 1) if row[4] is not None else None,
+        "performed_at": row[5],
+    } for row in rows]
+    next_cursor = f"{rows[-1][5]}|{rows[-1][0]}" if len(rows) == limit else None
+    return {"workouts": workouts, "next_cursor": next_cursor}
+
+
+def trends(conn, user_id, period="day", exercise="all", limit=None, before=None):
+    """A user's totals per period, newest first, from the rollup table.
+
+    exercise: an exercise type or "all"
+    before:   next_before of the previous page (a period start, YYYY-MM-DD)
+    Returns {"period": ..., "exercise": ..., "points": [...], "next_before": str or None}.
+    """
+    if period not in TREND_PERIODS:
+        raise ValueError(f"period must be one of {', '.join(TREND_PERIODS)}")
+    limit = _page_size(limit, TRENDS_PAGE_SIZE, MAX_TRENDS_PAGE_SIZE)
+    rows = conn.execute(
+        "SELECT period_start, workouts, reps, duration_seconds, calories FROM workout_rollups "
+        "WHERE user_id = ? AND period = ? AND exercise_type = ? AND period_start < ? "
+        "ORDER BY period_start DESC LIMIT ?",
+        (user_id, period, exercise, before or "9999-12-31", limit)).fetchall()
+
+    points = [{
+        "start": row[0],
+        "workouts": row[1],
+        "reps": row[2],
+        "duration_seconds": row[3],
+        "calories": round(row[4], 1),
+    } for row in rows]
+    next_before = rows[-1][0] if len(rows) == limit else None
+    return {"period": period, "exercise": exercise, "points": points, "next_before": next_before}
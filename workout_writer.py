@@ -0,0 +1,165 @@
+import queue
+import sqlite3
+import threading
+import time
+
+
+# ===== WORKOUT WRITER =====
+# Completed workouts are queued in memory and written by one background
+# thread over one long-lived connection, so finishing a workout never waits
+# on the disk. The thread takes everything queued (up to batch_size) and
+# inserts it with a single executemany in one transaction: a burst of users
+# finishing together costs one write lock and one fsync instead of one each.
+# The database runs in WAL mode, so these writes don't block readers.
+#
+# Calories are MET x body weight (kg) x hours. The weight is looked up by the
+# INSERT itself from users.weight (DEFAULT_WEIGHT_KG when the user left it
+# empty), so the request path doesn't query anything either.
+
+# Metabolic equivalents per exercise (Compendium of Physical Activities)
+EXERCISE_METS = {
+    "squat": 5.0,
+    "pushup": 8.0,
+    "plank": 3.8,
+    "bicep_curl": 3.5,
+    "lunges": 4.0,
+}
+DEFAULT_MET = 3.5
+DEFAULT_WEIGHT_KG = 70.0
+
+INSERT_WORKOUT = """
+    INSERT INTO workouts (user_id, exercise_type, duration_seconds, reps_completed,
+                          calories_burned, performed_at)
+    SELECT ?, ?, ?, ?,
+           ? * COALESCE((SELECT weight FROM users WHERE id = ?), ?) * ? / 3600.0, ?
+"""
+
+
+class WorkoutWriter:
+    def __init__(self, db_path, max_queue=1000, batch_size=200, busy_timeout=30.0):
+        """
+        db_path:      SQLite database with the users / workouts tables
+        max_queue:    workouts waiting to be written before new ones are dropped
+        batch_size:   most workouts inserted per transaction
+        busy_timeout: seconds to wait for another process's write lock
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.busy_timeout = busy_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+    def start(self):
+        """Start the writer thread (called automatically on first submit)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="workout-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, user_id, exercise_type, duration_seconds, reps_completed, performed_at=None):
+        """Queue a completed workout; returns False if the queue is full and it was dropped"""
+        if self._thread is None:
+            self.start()
+        performed_at = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(performed_at))  # Like CURRENT_TIMESTAMP
+        met = EXERCISE_METS.get(exercise_type, DEFAULT_MET)
+        row = (user_id, exercise_type, int(duration_seconds), int(reps_completed),
+               met, user_id, DEFAULT_WEIGHT_KG, float(duration_seconds), performed_at)
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            print(f"❌ Workout queue full, dropped {exercise_type} workout of user {user_id}")
+            return False
+        return True
+
+    def flush(self, timeout=None):
+        """Wait until everything submitted so far is written (or failed)"""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """Write what is queued and stop the thread"""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def backlog(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backlog": self._queue.qsize(),
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "batches": self.batches,
+            }
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")  # Safe with WAL; fsync per checkpoint, not per commit
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def _run(self):
+        conn = None
+        stopping = False
+        while not stopping:
+            batch, waiters = [], []
+            item = self._queue.get()
+            while True:
+                if item is None:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if batch:
+                try:
+                    if conn is None:
+                        conn = self._connect()
+                    with conn:  # One transaction per batch
+                        conn.executemany(INSERT_WORKOUT, batch)
+                    with self._lock:
+                        self.written += len(batch)
+                        self.batches += 1
+                except sqlite3.Error as e:
+                    with self._lock:
+                        self.failed += len(batch)
+                    print(f"❌ Failed to save {len(batch)} workouts: {e}")
+                    if conn is not None:
+                        conn.close()
+                        conn = None  # Reconnect for the next batch
+            for waiter in waiters:
+                waiter.set()
+
+        if conn is not None:
+            conn.close()
+        with self._lock:
+            self._thread = None